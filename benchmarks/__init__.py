@@ -0,0 +1,5 @@
+"""
+FatoorahBot - Micro-benchmarks
+
+Run from the project root, e.g. python -m benchmarks.invoice_workbook
+"""
@@ -0,0 +1,111 @@
+"""
+Invoice Model Benchmark
+Memory and serialization cost of the slotted invoice model against plain dataclasses
+
+Usage:
+    python -m benchmarks.invoice_model [--items 200] [--runs 200]
+"""
+import argparse
+import copy
+import dataclasses
+import pickle
+import time
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.invoice_workbook import make_invoice
+from models.invoice import InvoiceData, InvoiceItem
+
+
+def plain_class(cls: type, **types) -> type:
+    """The same fields as cls in a regular (__dict__-based) dataclass."""
+    specs = []
+    for f in dataclasses.fields(cls):
+        if f.default_factory is not dataclasses.MISSING:
+            specs.append((f.name, types.get(f.name, f.type), dataclasses.field(default_factory=f.default_factory)))
+        else:
+            specs.append((f.name, types.get(f.name, f.type), dataclasses.field(default=f.default)))
+    plain = dataclasses.make_dataclass(f"Plain{cls.__name__}", specs)
+    # Found by pickle as a global of this module
+    plain.__module__ = __name__
+    return plain
+
+
+PlainInvoiceItem = plain_class(InvoiceItem)
+PlainInvoiceData = plain_class(InvoiceData, items=List[PlainInvoiceItem])
+
+
+def rebuild(invoice: InvoiceData, data_class: type = PlainInvoiceData, item_class: type = PlainInvoiceItem):
+    """Copy of invoice built from the given classes, sharing the field values."""
+    values = {f.name: getattr(invoice, f.name) for f in dataclasses.fields(InvoiceData)}
+    # Positional arguments: a kwargs dict per item would linger in the dict free list and be counted
+    values["items"] = [
+        item_class(item.name, item.quantity, item.unit, item.unit_price, item.total)
+        for item in invoice.items
+    ]
+    return data_class(**values)
+
+
+def allocated(build: Callable[[], object]) -> int:
+    """Bytes still allocated by the object build() returns."""
+    # Warm up first, so one-off caches are not counted
+    build()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def median_us(func: Callable[[], object], runs: int) -> float:
+    """Median microseconds per call over runs calls."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoice model benchmark")
+    parser.add_argument("--items", type=int, default=200, help="Items on the invoice")
+    parser.add_argument("--runs", type=int, default=200, help="Timed calls per operation")
+    args = parser.parse_args()
+    
+    invoice = make_invoice(args.items)
+    plain = rebuild(invoice)
+    encoded = invoice.to_bytes()
+    
+    # Field values are shared, so only the model objects themselves are counted
+    slotted_bytes = allocated(lambda: rebuild(invoice, InvoiceData, InvoiceItem))
+    plain_bytes = allocated(lambda: rebuild(invoice))
+    
+    print(f"{args.items} items")
+    print("\nModel objects (tracemalloc)")
+    print(f"{'model':<10} {'total':>10} {'per item':>10}")
+    print(f"{'plain':<10} {plain_bytes:>10,} {plain_bytes / args.items:>10.0f}")
+    print(f"{'slotted':<10} {slotted_bytes:>10,} {slotted_bytes / args.items:>10.0f}")
+    print(f"Saved: {1 - slotted_bytes / plain_bytes:.0%}")
+    
+    print(f"\nDecoded draft, with its strings: {allocated(lambda: InvoiceData.from_bytes(encoded)):,} bytes")
+    print(f"Encoded sizes: to_bytes {len(encoded):,} bytes, pickle (plain) {len(pickle.dumps(plain)):,} bytes")
+    
+    print(f"\nOperations, {args.runs} runs each (median µs)")
+    print(f"{'operation':<12} {'plain':>10} {'slotted':>10}")
+    for name, plain_op, slotted_op in (
+        ("pickle", lambda: pickle.loads(pickle.dumps(plain)), lambda: pickle.loads(pickle.dumps(invoice))),
+        ("deepcopy", lambda: copy.deepcopy(plain), lambda: copy.deepcopy(invoice)),
+        ("to_bytes", None, invoice.to_bytes),
+        ("from_bytes", None, lambda: InvoiceData.from_bytes(encoded)),
+        ("to_dict", lambda: dataclasses.asdict(plain), invoice.to_dict),
+        ("from_dict", None, lambda: InvoiceData.from_dict(invoice.to_dict())),
+    ):
+        plain_us = f"{median_us(plain_op, args.runs):>10.0f}" if plain_op else f"{'-':>10}"
+        print(f"{name:<12} {plain_us} {median_us(slotted_op, args.runs):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Invoice Workbook Benchmark
+Compares the precompiled template with building the workbook through openpyxl
+
+Usage:
+    python -m benchmarks.invoice_workbook [--items 25] [--runs 200]
+"""
+import argparse
+import time
+from io import BytesIO
+from typing import Callable, List
+
+from openpyxl import load_workbook
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from services.excel_generator import excel_generator
+
+
+def make_invoice(item_count: int) -> InvoiceData:
+    """Invoice with item_count items and a validation note."""
+    items = [
+        InvoiceItem(
+            name=f"صنف تجريبي {i}", quantity=i % 7 + 1, unit="حبة",
+            unit_price=Money(1250 + i), total=Money((1250 + i) * (i % 7 + 1))
+        )
+        for i in range(item_count)
+    ]
+    subtotal = Money(sum(item.total for item in items))
+    return InvoiceData(
+        supplier_name="شركة المورد التجريبي", tax_number="300000000000003",
+        invoice_number="INV-2024-0001", invoice_date="2024-05-01",
+        items=items, subtotal=subtotal, discount=Money(0), tax_rate=15,
+        tax_amount=subtotal.percent(15), total_amount=subtotal + subtotal.percent(15),
+        validation_message="الإجمالي مطابق"
+    )
+
+
+def time_per_call(generate: Callable[[InvoiceData], BytesIO], invoice: InvoiceData, runs: int) -> List[float]:
+    """Milliseconds taken by each of runs calls."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        generate(invoice)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def sheet_cells(excel_file: BytesIO) -> list:
+    """(coordinate, value, style name) of every cell, plus the merged ranges."""
+    ws = load_workbook(excel_file).active
+    cells = [(cell.coordinate, cell.value, cell.style) for row in ws.iter_rows() for cell in row]
+    return cells + sorted(str(merged) for merged in ws.merged_cells.ranges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-invoice workbook benchmark")
+    parser.add_argument("--items", type=int, default=25, help="Items on the invoice")
+    parser.add_argument("--runs", type=int, default=200, help="Timed calls per renderer")
+    args = parser.parse_args()
+    
+    invoice = make_invoice(args.items)
+    
+    started = time.perf_counter()
+    excel_generator.prepare()
+    print(f"Template build (once): {(time.perf_counter() - started) * 1000:.1f} ms")
+    
+    template_file = excel_generator.generate(invoice)
+    openpyxl_file = excel_generator.generate_openpyxl(invoice)
+    identical = sheet_cells(template_file) == sheet_cells(openpyxl_file)
+    print(f"Same cells, values and styles: {'yes' if identical else 'NO'}")
+    
+    print(f"\n{args.items} items, {args.runs} runs each (ms per invoice)")
+    print(f"{'renderer':<10} {'median':>8} {'min':>8} {'max':>8}")
+    medians = {}
+    for name, generate in (("openpyxl", excel_generator.generate_openpyxl), ("template", excel_generator.generate)):
+        timings = sorted(time_per_call(generate, invoice, args.runs))
+        medians[name] = timings[len(timings) // 2]
+        print(f"{name:<10} {medians[name]:>8.2f} {timings[0]:>8.2f} {timings[-1]:>8.2f}")
+    
+    print(f"\nSpeed-up: {medians['openpyxl'] / medians['template']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
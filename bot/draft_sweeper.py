@@ -0,0 +1,106 @@
+"""
+Draft Sweeper
+Expires invoice drafts that were never saved or cancelled and clears their messages
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.fsm.storage.base import BaseStorage
+
+from bot.fsm_storage import ExpiredState
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# deleteMessages accepts up to 100 ids per call
+DELETE_BATCH_SIZE = 100
+
+
+def draft_message_ids(data: Dict) -> List[int]:
+    """
+    Bot messages belonging to a draft.
+    
+    The user's invoice photo is left in place so it can be sent again.
+    """
+    ids = [data.get("message_id"), data.get("prompt_message_id")]
+    ids.extend(data.get("confirmation_messages", []))
+    ids.extend(data.get("related_messages", []))
+    return [message_id for message_id in ids if message_id]
+
+
+class DraftSweeper:
+    """
+    Periodically removes stale FSM states.
+    
+    Works with storages that provide expire(older_than) and
+    draft_stats() (SQLiteStorage, TimedMemoryStorage); Redis expires
+    keys by itself.
+    """
+    
+    def __init__(self, ttl_seconds: float):
+        """
+        Args:
+            ttl_seconds: Age of the last change after which a draft is abandoned
+        """
+        self.ttl_seconds = ttl_seconds
+    
+    async def _delete_messages(self, bot: Bot, chat_id: int, message_ids: List[int]) -> None:
+        """Delete messages in batches; ones already gone or too old are skipped by Telegram."""
+        for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+            batch = message_ids[start:start + DELETE_BATCH_SIZE]
+            try:
+                await bot.delete_messages(chat_id, batch)
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                try:
+                    await bot.delete_messages(chat_id, batch)
+                except TelegramAPIError as retry_error:
+                    logger.warning(f"Failed to delete draft messages in chat {chat_id}: {retry_error}")
+            except TelegramAPIError as e:
+                logger.warning(f"Failed to delete draft messages in chat {chat_id}: {e}")
+    
+    async def run_once(self, bot: Bot, storage: BaseStorage) -> int:
+        """
+        Expire stale drafts and delete their messages.
+        
+        Returns:
+            Number of drafts expired
+        """
+        expired: List[ExpiredState] = await storage.expire(time.time() - self.ttl_seconds)
+        
+        messages: Dict[int, List[int]] = {}
+        for state in expired:
+            messages.setdefault(state.chat_id, []).extend(draft_message_ids(state.data))
+        
+        for chat_id, message_ids in messages.items():
+            if message_ids:
+                await self._delete_messages(bot, chat_id, sorted(set(message_ids)))
+        
+        count, size = await storage.draft_stats()
+        logger.info(
+            f"Draft sweep: expired {len(expired)}, "
+            f"live drafts {count} ({size / 1024:.1f} KB)"
+        )
+        return len(expired)
+    
+    async def run_forever(self, bot: Bot, storage: BaseStorage, interval_seconds: float):
+        """Sweep now and then every interval until cancelled."""
+        if not hasattr(storage, "expire"):
+            logger.info(f"{type(storage).__name__} expires drafts itself; sweeper not started")
+            return
+        
+        while True:
+            try:
+                await self.run_once(bot, storage)
+            except Exception as e:
+                logger.error(f"Draft sweep failed: {e}")
+            
+            await asyncio.sleep(interval_seconds)
+
+
+# Global instance
+draft_sweeper = DraftSweeper(ttl_seconds=settings.DRAFT_TTL_HOURS * 3600)
@@ -0,0 +1,363 @@
+"""
+Export Delivery
+Builds invoice/item exports and sends them, split into parts when too large for Telegram
+"""
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from typing import AsyncGenerator, BinaryIO, Callable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputFile, Message
+
+from config.settings import settings
+from services.database import KEYSET_COLUMNS, STREAM_CHUNK_SIZE, page_cursor
+from services.export_cache import CachedExport, export_cache
+from services.export_generator import ExportResult
+from services.render_pool import Rows, RowSpool, render_pool
+from services.storage import repository
+from services.tabular_export import tabular_exporter
+from utils.dates import iso_date
+
+logger = logging.getLogger(__name__)
+
+# Parts are sized for this fraction of the limit, since rows differ in width
+PART_SIZE_HEADROOM = 0.9
+
+# Bytes per row assumed until the first part of an export is rendered and measured,
+# on the high side: a short first part costs less than rendering an oversized one twice
+ROW_BYTES_ESTIMATE = {"xlsx": 60, "csv": 30, "parquet": 25}
+
+# Table name of the combined invoices + items workbook (Excel only, never split)
+COMBINED_EXPORT = "combined"
+
+
+def part_limit_bytes() -> int:
+    """Largest document sent in one piece."""
+    return int(settings.EXPORT_PART_MAX_MB * 1024 * 1024)
+
+
+class ExportCancelled(Exception):
+    """Raised inside a streaming export once its progress is marked cancelled."""
+
+
+class ExportTooLarge(Exception):
+    """Raised when a report over the part limit cannot be split into parts."""
+
+
+@dataclass
+class ExportProgress:
+    """Live state of one export, written by the export and read by whoever reports on it."""
+    stage: str = "query"  # query | render | upload | parts
+    rows: int = 0
+    part: int = 0
+    cancelled: bool = False
+
+
+class ReportInputFile(InputFile):
+    """Uploads an open report file chunk by chunk instead of reading it into memory."""
+    
+    def __init__(self, file: BinaryIO, filename: str):
+        super().__init__(filename=filename)
+        self.file = file
+    
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+async def render_rows(table: str, file_format: str, rows: Rows) -> ExportResult:
+    """Render fetched rows of "invoices" or "invoice_items" in the given format."""
+    if file_format == "xlsx":
+        if table == "invoices":
+            return await render_pool.invoices_report(rows)
+        return await render_pool.items_report(rows)
+    
+    if isinstance(rows, RowSpool):
+        rows = rows.read()
+    writer = tabular_exporter.write_csv if file_format == "csv" else tabular_exporter.write_parquet
+    return await asyncio.to_thread(writer, table, rows)
+
+
+async def build_combined_export(
+    user_id: int,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    progress: Optional[ExportProgress] = None
+) -> ExportResult:
+    """
+    Build the combined invoices + items workbook with its summary sheets.
+    
+    The joined lines go to a spool file page by page and the worker
+    pool renders the workbook from it.
+    """
+    progress = progress or ExportProgress()
+    
+    with RowSpool() as spool:
+        chunk = []
+        async for line in repository.iter_invoice_lines(user_id, start_date, end_date):
+            chunk.append(line)
+            if len(chunk) == STREAM_CHUNK_SIZE:
+                await spool.write(chunk)
+                chunk = []
+                progress.rows = spool.row_count
+        if chunk:
+            await spool.write(chunk)
+            progress.rows = spool.row_count
+        
+        monthly, suppliers = await asyncio.gather(
+            repository.get_monthly_summary(user_id, start_date, end_date),
+            repository.get_supplier_summary(user_id, start_date, end_date)
+        )
+        progress.stage = "render"
+        return await render_pool.combined_report(spool, monthly, suppliers)
+
+
+@dataclass
+class ReportPart:
+    """Rows of one part spooled to a temporary file, with what its caption and the next part need."""
+    spool: RowSpool
+    newest: Optional[str] = None  # date of the first row
+    oldest: Optional[str] = None  # date of the last dated row
+    undated: bool = False  # ends with undated rows
+    last: Optional[Tuple] = None  # page_cursor() of the last row
+    more: bool = False  # rows follow this part
+    
+    @property
+    def row_count(self) -> int:
+        return self.spool.row_count
+    
+    def date_range(self) -> str:
+        """
+        Caption text of the dates the part covers.
+        
+        Rows come newest first on the normalized date with undated rows
+        last (see date_key_sql).
+        """
+        if self.newest is None:
+            return "فواتير بدون تاريخ"
+        text = f"{self.oldest} إلى {self.newest}"
+        if self.undated:
+            text += " وفواتير بدون تاريخ"
+        return text
+    
+    def __enter__(self) -> "ReportPart":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.spool.__exit__(*exc_info)
+
+
+async def _spool_part(
+    table: str,
+    user_id: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    after: Optional[Tuple],
+    max_rows: int,
+    until: Optional[Tuple],
+    progress: ExportProgress
+) -> ReportPart:
+    """
+    Spool up to max_rows rows following the cursor after, page by page.
+    
+    Args:
+        after: page_cursor() of the row before the part (None to start at the newest)
+        until: page_cursor() of the last row the part may hold (None for no bound)
+    """
+    date_index = KEYSET_COLUMNS[table].index("invoice_date")
+    part = ReportPart(RowSpool(), last=after)
+    try:
+        while part.row_count < max_rows:
+            if progress.cancelled:
+                raise ExportCancelled()
+            
+            wanted = min(STREAM_CHUNK_SIZE, max_rows - part.row_count)
+            # One row more than wanted tells whether anything follows
+            page = await repository.get_page(table, user_id, start_date, end_date, part.last, wanted + 1)
+            if until is not None:
+                page = [row for row in page if page_cursor(table, row) >= until]
+            part.more = len(page) > wanted
+            page = page[:wanted]
+            if not page:
+                break
+            
+            await part.spool.write(page)
+            part.last = page_cursor(table, page[-1])
+            if until is None:
+                progress.rows += len(page)
+            
+            for row in page:
+                date = iso_date(row[date_index])
+                if date is None:
+                    part.undated = True
+                    continue
+                part.newest = part.newest or date
+                part.oldest = date
+            
+            if not part.more:
+                break
+    except BaseException:
+        part.spool.__exit__(None, None, None)
+        raise
+    return part
+
+
+async def _send_in_parts(
+    target: Message,
+    user_id: int,
+    table: str,
+    file_format: str,
+    filename: str,
+    caption: Callable[[int], str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    progress: ExportProgress
+) -> Tuple[int, List[Tuple[str, str]]]:
+    """
+    Stream rows into parts sized for Telegram and send each one as soon as it is rendered.
+    
+    A report that fits in its first part is sent as a single document.
+    Part length comes from the bytes per row of the last rendered part
+    (ROW_BYTES_ESTIMATE before the first); a part that still comes out
+    too large is read again from the database as smaller pieces of the
+    same key range, so no more than one part is ever on disk.
+    
+    Returns:
+        (row count, (file_id, caption) of each sent document)
+    """
+    part_limit = part_limit_bytes()
+    row_bytes = ROW_BYTES_ESTIMATE[file_format]
+    name, _, extension = filename.partition(".")
+    
+    sent_parts = []
+    row_count = 0
+    position = None  # page_cursor() of the last row sent
+    # (rows, cursor of the last row) of the pieces of a part that came out too large
+    pieces: List[Tuple[int, Tuple]] = []
+    
+    while True:
+        if pieces:
+            max_rows, until = pieces.pop(0)
+        else:
+            max_rows, until = max(1, int(part_limit * PART_SIZE_HEADROOM / row_bytes)), None
+        
+        with await _spool_part(
+            table, user_id, start_date, end_date, position, max_rows, until, progress
+        ) as part:
+            if not part.row_count:
+                if pieces:
+                    continue
+                break
+            
+            whole = not sent_parts and until is None and not part.more
+            progress.stage = "render" if whole else "parts"
+            progress.part = len(sent_parts) + 1
+            
+            report = await render_rows(table, file_format, part.spool)
+            with report.file:
+                row_bytes = report.size / part.row_count
+                if report.size > part_limit and part.row_count > 1:
+                    count = max(2, math.ceil(report.size / (part_limit * PART_SIZE_HEADROOM)))
+                    size = math.ceil(part.row_count / count)
+                    pieces[:0] = [
+                        (min(size, part.row_count - offset), part.last)
+                        for offset in range(0, part.row_count, size)
+                    ]
+                    continue
+                
+                if whole:
+                    progress.stage = "upload"
+                    document, text = ReportInputFile(report.file, filename), caption(part.row_count)
+                else:
+                    number = len(sent_parts) + 1
+                    document = ReportInputFile(report.file, f"{name}_part{number}.{extension}")
+                    text = f"{caption(part.row_count)}\n\n📎 الجزء {number}: {part.date_range()}"
+                sent = await target.answer_document(document=document, caption=text)
+            
+            sent_parts.append((sent.document.file_id, text))
+            row_count += part.row_count
+            position = part.last
+            if whole:
+                break
+    
+    if len(sent_parts) > 1:
+        logger.info(f"Sent {table} export of {row_count} rows to user {user_id} in {len(sent_parts)} parts")
+    return row_count, sent_parts
+
+
+async def send_export(
+    target: Message,
+    user_id: int,
+    table: str,
+    file_format: str,
+    filename: str,
+    caption: Callable[[int], str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    progress: Optional[ExportProgress] = None
+) -> int:
+    """
+    Build and send an export, or re-send the upload of an unchanged earlier one.
+    
+    Invoice and item reports over EXPORT_PART_MAX_MB are sent as several
+    date-range parts, cut while the rows stream. A re-send that fails
+    part-way is continued from the first undelivered part by the next
+    request for the same report.
+    
+    Raises:
+        ExportTooLarge: If a combined report is over the limit
+    
+    Args:
+        target: Message to answer with the document
+        caption: Builds the caption from the row count (of each part, when split)
+        progress: Updated as rows stream and parts are sent
+    
+    Returns:
+        Number of rows in the report; 0 means nothing was sent
+    """
+    progress = progress or ExportProgress()
+    version = await repository.get_data_version(user_id)
+    key = (user_id, table, file_format, start_date, end_date)
+    
+    cached = export_cache.get(key, version)
+    if cached:
+        try:
+            for file_id, part_caption in cached.parts[cached.sent:]:
+                await target.answer_document(document=file_id, caption=part_caption)
+                cached.sent += 1
+            cached.sent = 0
+            logger.info(f"Re-sent cached {table} export to user {user_id}")
+            return cached.row_count
+        except TelegramBadRequest as e:
+            logger.warning(f"Cached export file rejected, rebuilding: {e}")
+    
+    if table in KEYSET_COLUMNS:
+        row_count, parts = await _send_in_parts(
+            target, user_id, table, file_format, filename, caption,
+            start_date, end_date, progress
+        )
+        if not row_count:
+            return 0
+    else:
+        report = await build_combined_export(user_id, start_date, end_date, progress)
+        with report.file:
+            row_count, size = report.row_count, report.size
+            if not row_count:
+                return 0
+            if size > part_limit_bytes():
+                raise ExportTooLarge(f"{table} export of {size / 1e6:.1f} MB")
+            
+            progress.stage = "upload"
+            text = caption(row_count)
+            sent = await target.answer_document(
+                document=ReportInputFile(report.file, filename),
+                caption=text
+            )
+            parts = [(sent.document.file_id, text)]
+    
+    export_cache.put(key, version, CachedExport(row_count, parts))
+    return row_count
@@ -0,0 +1,214 @@
+"""
+Export Jobs
+Runs exports in the background: one job per user, a global concurrency cap,
+a live progress message with a cancel button, and de-duplicated requests
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from bot.export_delivery import ExportProgress, ExportTooLarge, send_export
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Callback data prefix of the cancel button
+CANCEL_PREFIX = "export_cancel:"
+
+# Seconds between progress message edits
+PROGRESS_INTERVAL = 2.0
+
+
+@dataclass
+class ExportRequest:
+    """What to export and how to present it."""
+    table: str
+    file_format: str
+    filename: str
+    caption: Callable[[int], str]
+    empty_text: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    
+    @property
+    def key(self) -> Tuple:
+        """Requests with the same key produce the same report."""
+        return (self.table, self.file_format, self.start_date, self.end_date)
+
+
+@dataclass
+class ExportJob:
+    """One queued or running export."""
+    job_id: str
+    user_id: int
+    request: ExportRequest
+    status: Optional[Message] = None
+    progress: ExportProgress = field(default_factory=ExportProgress)
+    task: Optional[asyncio.Task] = None
+
+
+def get_cancel_keyboard(job_id: str) -> InlineKeyboardMarkup:
+    """Keyboard with the cancel button of a job."""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🚫 إلغاء التصدير", callback_data=f"{CANCEL_PREFIX}{job_id}")]
+    ])
+
+
+def format_progress(job: ExportJob) -> str:
+    """Status message text for a job's current stage."""
+    progress = job.progress
+    if progress.stage == "query":
+        text = f"⏳ جاري قراءة البيانات... {progress.rows:,} صف"
+    elif progress.stage == "render":
+        text = f"⚙️ جاري إنشاء الملف ({progress.rows:,} صف)..."
+    elif progress.stage == "parts":
+        text = f"📦 التقرير كبير، جاري إرسال الجزء {progress.part}..."
+    else:
+        text = "📤 جاري إرسال الملف..."
+    return f"{text}\n\nرقم المهمة: {job.job_id}"
+
+
+class ExportJobManager:
+    """Schedules export jobs and keeps their progress messages up to date."""
+    
+    def __init__(self, max_concurrent: int = 4, progress_interval: float = PROGRESS_INTERVAL):
+        self.progress_interval = progress_interval
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._jobs: Dict[str, ExportJob] = {}
+        self._user_jobs: Dict[int, ExportJob] = {}
+    
+    async def submit(self, target: Message, user_id: int, request: ExportRequest) -> ExportJob:
+        """
+        Queue an export and return at once.
+        
+        A request identical to the user's pending job is folded into it;
+        any other request is turned away until that job finishes or is cancelled.
+        
+        Args:
+            target: Message to answer with progress and the document
+            user_id: Telegram user ID
+            request: What to export
+        
+        Returns:
+            The new job, or the user's existing one
+        """
+        existing = self._user_jobs.get(user_id)
+        if existing:
+            if existing.request.key == request.key:
+                await target.answer(f"⏳ هذا التقرير قيد الإنشاء بالفعل (رقم المهمة: {existing.job_id})")
+            else:
+                await target.answer(
+                    "⚠️ لديك تصدير آخر قيد التنفيذ. انتظر انتهاءه أو ألغه أولاً",
+                    reply_markup=get_cancel_keyboard(existing.job_id)
+                )
+            return existing
+        
+        # Registered before the first await, so a second request arriving
+        # meanwhile sees this job instead of starting its own
+        job = ExportJob(uuid.uuid4().hex[:8], user_id, request)
+        self._jobs[job.job_id] = job
+        self._user_jobs[user_id] = job
+        try:
+            job.status = await target.answer(
+                f"⏳ التقرير في قائمة الانتظار...\n\nرقم المهمة: {job.job_id}",
+                reply_markup=get_cancel_keyboard(job.job_id)
+            )
+        except Exception:
+            self._forget(job)
+            raise
+        
+        job.task = asyncio.create_task(self._run(job, target))
+        
+        logger.info(f"Queued export job {job.job_id} for user {user_id}: {request.key}")
+        return job
+    
+    def cancel(self, job_id: str, user_id: int) -> bool:
+        """
+        Cancel a job of the given user.
+        
+        Returns:
+            False if there is no such job (finished, or someone else's)
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id or job.task is None:
+            return False
+        
+        job.progress.cancelled = True
+        job.task.cancel()
+        return True
+    
+    async def _run(self, job: ExportJob, target: Message):
+        """Wait for a slot, run the export and report the outcome."""
+        request = job.request
+        try:
+            async with self._slots:
+                ticker = asyncio.create_task(self._report_progress(job))
+                try:
+                    row_count = await send_export(
+                        target, job.user_id, request.table, request.file_format,
+                        request.filename, request.caption,
+                        request.start_date, request.end_date, job.progress
+                    )
+                finally:
+                    ticker.cancel()
+            
+            if row_count:
+                await self._set_status(job, f"✅ تم إرسال التقرير ({row_count:,} صف)")
+                logger.info(f"Export job {job.job_id}: user {job.user_id} exported {row_count} {request.table} rows")
+            else:
+                await self._set_status(job, request.empty_text)
+        
+        except asyncio.CancelledError:
+            job.progress.cancelled = True
+            await self._set_status(job, "🚫 تم إلغاء التصدير")
+            logger.info(f"Export job {job.job_id} cancelled")
+        
+        except ExportTooLarge as e:
+            logger.warning(f"Export job {job.job_id} too large: {e}")
+            await self._set_status(job, "❌ التقرير أكبر من الحد المسموح في تيليجرام، اختر فترة أقصر")
+        
+        except Exception as e:
+            logger.error(f"Export job {job.job_id} failed: {e}")
+            await self._set_status(job, "❌ حدث خطأ أثناء إنشاء التقرير")
+        
+        finally:
+            self._forget(job)
+    
+    def _forget(self, job: ExportJob):
+        """Drop a finished job, leaving a newer job of the same user in place."""
+        self._jobs.pop(job.job_id, None)
+        if self._user_jobs.get(job.user_id) is job:
+            self._user_jobs.pop(job.user_id)
+    
+    async def _report_progress(self, job: ExportJob):
+        """Edit the status message whenever the progress text changes; errors only skip a tick."""
+        last_text = None
+        while True:
+            text = format_progress(job)
+            if text != last_text:
+                try:
+                    await job.status.edit_text(text, reply_markup=get_cancel_keyboard(job.job_id))
+                    last_text = text
+                except TelegramBadRequest:
+                    pass
+                except Exception as e:
+                    # Flood control or a network error: try again on the next tick
+                    logger.warning(f"Could not update export job {job.job_id} progress: {e}")
+            await asyncio.sleep(self.progress_interval)
+    
+    @staticmethod
+    async def _set_status(job: ExportJob, text: str):
+        """Replace the status message with a final text (and no buttons)."""
+        try:
+            await job.status.edit_text(text)
+        except TelegramBadRequest as e:
+            logger.warning(f"Could not update export job {job.job_id} status: {e}")
+
+
+# Global instance
+export_jobs = ExportJobManager(max_concurrent=settings.EXPORT_MAX_CONCURRENT)
@@ -0,0 +1,432 @@
+"""
+FSM Storage
+Persistent conversation state for drafts in progress, selected by FSM_STORAGE
+"""
+import asyncio
+import base64
+import json
+import logging
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config.settings import settings
+from models.invoice import InvoiceData
+
+logger = logging.getLogger(__name__)
+
+# Envelope of a state's data dict; bump when the layout changes
+DATA_FORMAT_VERSION = 1
+
+# Value encodings inside the envelope
+TAG_JSON = 0
+TAG_INVOICE = 1
+
+_HEADER = struct.Struct("<BH")  # version, entry count
+_ENTRY = struct.Struct("<HBI")  # key length, tag, value length
+
+
+def encode_data(data: Dict[str, Any]) -> bytes:
+    """
+    Encode FSM data: invoices use InvoiceData.to_bytes, other values JSON.
+    
+    Raises:
+        TypeError: If a value is neither an InvoiceData nor JSON-serializable
+    """
+    parts = [_HEADER.pack(DATA_FORMAT_VERSION, len(data))]
+    for key, value in data.items():
+        if isinstance(value, InvoiceData):
+            tag, payload = TAG_INVOICE, value.to_bytes()
+        else:
+            tag, payload = TAG_JSON, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        key_bytes = key.encode("utf-8")
+        parts.append(_ENTRY.pack(len(key_bytes), tag, len(payload)))
+        parts.append(key_bytes)
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def decode_data(blob: bytes) -> Dict[str, Any]:
+    """
+    Decode data written by encode_data.
+    
+    Raises:
+        ValueError: If the data is corrupt or of an unknown version
+    """
+    try:
+        version, count = _HEADER.unpack_from(blob, 0)
+        if version != DATA_FORMAT_VERSION:
+            raise ValueError(f"Unsupported FSM data version: {version}")
+        offset = _HEADER.size
+        
+        data = {}
+        for _ in range(count):
+            key_length, tag, value_length = _ENTRY.unpack_from(blob, offset)
+            offset += _ENTRY.size
+            key = blob[offset:offset + key_length].decode("utf-8")
+            offset += key_length
+            payload = blob[offset:offset + value_length]
+            offset += value_length
+            
+            if tag == TAG_INVOICE:
+                data[key] = InvoiceData.from_bytes(payload)
+            elif tag == TAG_JSON:
+                data[key] = json.loads(payload)
+            else:
+                raise ValueError(f"Unknown FSM value tag: {tag}")
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid FSM data: {e}")
+    return data
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+@dataclass
+class ExpiredState:
+    """State removed by a TTL sweep, with the data needed to clean up its chat."""
+    chat_id: int
+    data: Dict[str, Any]
+
+
+@dataclass
+class _Record:
+    """Cached state and encoded data of one key."""
+    state: Optional[str]
+    data: bytes
+    version: int
+    dirty: bool = False
+    # time.monotonic() when the version was last known to match the file
+    checked_at: float = 0.0
+    
+    @property
+    def empty(self) -> bool:
+        return self.state is None and self.data == EMPTY_DATA
+
+
+EMPTY_DATA = encode_data({})
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a local SQLite file.
+    
+    Hot keys are cached in memory and written behind: changes are
+    flushed in one transaction every flush_interval seconds (and on
+    close), so a burst of update_data calls while editing a draft costs
+    a single write. Each row carries a version bumped on every write;
+    a clean cached key is served from memory for recheck_interval
+    seconds and then re-checked against it, so processes sharing the
+    file (WAL mode) see each other's flushed changes.
+    """
+    
+    def __init__(
+        self,
+        db_path: str,
+        flush_interval: float = 1.0,
+        cache_size: int = 1000,
+        recheck_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            db_path: SQLite file holding the states
+            flush_interval: Seconds a change may wait in memory before it is written
+            cache_size: Clean keys kept in memory (dirty keys are never evicted)
+            recheck_interval: Seconds a clean cached key is trusted without
+                reading its version (default: flush_interval)
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self.recheck_interval = flush_interval if recheck_interval is None else recheck_interval
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_records (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data BLOB NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+    
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+    
+    # Blocking database access (runs in worker threads)
+    
+    def _read_version(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM fsm_records WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+    
+    def _read(self, key: str) -> _Record:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, data, version FROM fsm_records WHERE key = ?", (key,)
+            ).fetchone()
+        return _Record(*row) if row else _Record(None, EMPTY_DATA, 0)
+    
+    def _write(self, records: List[Tuple[str, Optional[str], bytes, bool]]) -> Dict[str, int]:
+        """Write (key, state, data, empty) rows in one transaction; returns the new versions."""
+        versions = {}
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, state, data, empty in records:
+                    if empty:
+                        self._conn.execute("DELETE FROM fsm_records WHERE key = ?", (key,))
+                        versions[key] = 0
+                        continue
+                    versions[key] = self._conn.execute("""
+                        INSERT INTO fsm_records (key, state, data, version, updated_at)
+                        VALUES (?, ?, ?, 1, ?)
+                        ON CONFLICT (key) DO UPDATE SET
+                            state = excluded.state,
+                            data = excluded.data,
+                            version = fsm_records.version + 1,
+                            updated_at = excluded.updated_at
+                        RETURNING version
+                    """, (key, state, data, now)).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return versions
+    
+    # Cache
+    
+    async def _get(self, key: StorageKey) -> _Record:
+        """Cached record of a key, loading or refreshing it from the file as needed."""
+        name = self._key(key)
+        record = self._cache.get(name)
+        if record is not None:
+            self._cache.move_to_end(name)
+            if record.dirty or time.monotonic() - record.checked_at < self.recheck_interval:
+                return record
+            checked_at = time.monotonic()
+            if await asyncio.to_thread(self._read_version, name) == record.version:
+                record.checked_at = checked_at
+                return record
+        
+        checked_at = time.monotonic()
+        fresh = await asyncio.to_thread(self._read, name)
+        fresh.checked_at = checked_at
+        # A write may have landed while reading
+        record = self._cache.get(name)
+        if record is not None and record.dirty:
+            return record
+        self._cache[name] = fresh
+        self._evict()
+        return fresh
+    
+    def _evict(self):
+        """Drop least recently used clean keys beyond cache_size."""
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        for name in [name for name, record in self._cache.items() if not record.dirty][:excess]:
+            del self._cache[name]
+    
+    def _mark_dirty(self, name: str, record: _Record):
+        record.dirty = True
+        # The record may have been evicted while the caller was awaiting
+        self._cache[name] = record
+        self._cache.move_to_end(name)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Changes made from here on schedule the next flush
+        self._flush_task = None
+        await self.flush()
+    
+    async def flush(self):
+        """Write every changed key to the file now."""
+        async with self._flush_lock:
+            dirty = {name: record for name, record in self._cache.items() if record.dirty}
+            if not dirty:
+                return
+            
+            rows = [(name, record.state, record.data, record.empty) for name, record in dirty.items()]
+            for record in dirty.values():
+                record.dirty = False
+            
+            try:
+                versions = await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(rows)} FSM record(s): {e}")
+                for name, record in dirty.items():
+                    self._mark_dirty(name, record)
+                return
+            
+            written_at = time.monotonic()
+            for name, record in dirty.items():
+                record.version = versions[name]
+                record.checked_at = written_at
+            self._evict()
+    
+    # BaseStorage
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        record.state = _state_name(state)
+        self._mark_dirty(self._key(key), record)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        record.data = encode_data(data)
+        self._mark_dirty(self._key(key), record)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get(key)
+        try:
+            return decode_data(record.data)
+        except ValueError as e:
+            logger.error(f"Discarding unreadable FSM data of {self._key(key)}: {e}")
+            return {}
+    
+    async def expire(self, older_than: float) -> List[ExpiredState]:
+        """
+        Delete states not changed since older_than (a Unix time).
+        
+        A row is only deleted if its version is still the one read, so a
+        draft edited meanwhile, here or in another process, survives.
+        """
+        await self.flush()
+        rows = await asyncio.to_thread(self._expire, older_than)
+        
+        expired = []
+        for name, blob in rows:
+            record = self._cache.get(name)
+            if record is not None:
+                if record.dirty:
+                    # Edited since the flush above; it will be written back
+                    continue
+                del self._cache[name]
+            try:
+                data = decode_data(blob)
+            except ValueError:
+                data = {}
+            expired.append(ExpiredState(chat_id=int(name.split(":")[1]), data=data))
+        return expired
+    
+    def _expire(self, older_than: float) -> List[Tuple[str, bytes]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, data, version FROM fsm_records WHERE updated_at < ?", (older_than,)
+            ).fetchall()
+            deleted = []
+            for key, data, version in rows:
+                cursor = self._conn.execute(
+                    "DELETE FROM fsm_records WHERE key = ? AND version = ?", (key, version)
+                )
+                if cursor.rowcount:
+                    deleted.append((key, data))
+        return deleted
+    
+    async def draft_stats(self) -> Tuple[int, int]:
+        """(number of stored states, total size of their data in bytes)."""
+        def stats() -> Tuple[int, int]:
+            with self._lock:
+                return self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM fsm_records"
+                ).fetchone()
+        
+        count, size = await asyncio.to_thread(stats)
+        return count, size
+    
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
+        self._conn.close()
+
+
+class TimedMemoryStorage(MemoryStorage):
+    """In-memory storage that remembers when each key last changed, for TTL sweeps."""
+    
+    def __init__(self):
+        super().__init__()
+        self._changed: Dict[StorageKey, float] = {}
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await super().set_state(key, state)
+        self._changed[key] = time.time()
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await super().set_data(key, data)
+        self._changed[key] = time.time()
+    
+    async def expire(self, older_than: float) -> List[ExpiredState]:
+        """Drop states not changed since older_than, and the empty records reads leave behind."""
+        expired = []
+        for key in list(self.storage):
+            record = self.storage[key]
+            if record.state is None and not record.data:
+                del self.storage[key]
+                self._changed.pop(key, None)
+            elif self._changed.get(key, 0) < older_than:
+                del self.storage[key]
+                self._changed.pop(key, None)
+                expired.append(ExpiredState(chat_id=key.chat_id, data=record.data))
+        return expired
+    
+    async def draft_stats(self) -> Tuple[int, int]:
+        """(number of stored states, total size of their data in bytes, as encoded for SQLite)."""
+        records = [record for record in self.storage.values() if record.state is not None or record.data]
+        return len(records), sum(len(encode_data(record.data)) for record in records)
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    """Redis values must be text: the binary encoding, base64'd."""
+    return base64.b64encode(encode_data(data)).decode("ascii")
+
+
+def _loads(value: str) -> Dict[str, Any]:
+    return decode_data(base64.b64decode(value))
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Create the FSM storage configured by FSM_STORAGE."""
+    if settings.FSM_STORAGE == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+        # Redis expires abandoned drafts itself (their messages are left in the chat)
+        ttl = int(settings.DRAFT_TTL_HOURS * 3600) or None
+        return RedisStorage.from_url(
+            settings.REDIS_URL, state_ttl=ttl, data_ttl=ttl,
+            json_dumps=_dumps, json_loads=_loads
+        )
+    
+    if settings.FSM_STORAGE == "sqlite":
+        return SQLiteStorage(
+            settings.FSM_DB_PATH,
+            flush_interval=settings.FSM_FLUSH_INTERVAL,
+            cache_size=settings.FSM_CACHE_SIZE
+        )
+    
+    return TimedMemoryStorage()
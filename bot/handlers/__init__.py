@@ -7,6 +7,9 @@ from bot.handlers.callbacks import router as callbacks_router
 from bot.handlers.edit_handlers import router as edit_router
 from bot.handlers.item_edit_handlers import router as item_edit_router
 from bot.handlers.export import router as export_router
+from bot.handlers.price import router as price_router
+from bot.handlers.search import router as search_router
+from bot.handlers.subscriptions import router as subscriptions_router
 from bot.handlers.menu_handlers import router as menu_router
 
 # List of all routers to include
@@ -14,6 +17,9 @@ all_routers = [
     start_router,
     menu_router,  # Menu handlers
     export_router,  # Export commands
+    price_router,  # Price history command
+    search_router,  # Full-text search command
+    subscriptions_router,  # Scheduled report subscriptions
     callbacks_router,  # Invoice callbacks
     item_edit_router,  # Item edit handlers
     edit_router,  # Edit handlers
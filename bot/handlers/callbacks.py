@@ -8,9 +8,9 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 
-from services.database import db_service
+from services.storage import repository, DuplicateInvoiceError
 from services.excel_generator import excel_generator
-from bot.keyboards.invoice_keyboard import get_edit_menu_keyboard, get_totals_edit_keyboard, get_invoice_confirmation_keyboard
+from bot.keyboards.invoice_keyboard import get_edit_menu_keyboard, get_totals_edit_keyboard, get_invoice_confirmation_keyboard, get_duplicate_warning_keyboard
 from bot.states.invoice_states import InvoiceStates
 from models.invoice import InvoiceData
 from utils.message_tracker import add_related_message
@@ -36,9 +36,11 @@ async def save_invoice_callback(callback: CallbackQuery, state: FSMContext):
         return
     
     try:
-        # Save to database
+        # Save to database (the user already confirmed a flagged duplicate)
         user_id = callback.from_user.id
-        invoice_id = db_service.save_invoice(user_id, invoice)
+        invoice_id = await repository.save_invoice(
+            user_id, invoice, allow_duplicate=data.get("is_duplicate", False)
+        )
         
         # Create stats button
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -79,6 +81,16 @@ async def save_invoice_callback(callback: CallbackQuery, state: FSMContext):
         
         logger.info(f"Invoice {invoice_id} saved for user {user_id}")
         
+    except DuplicateInvoiceError:
+        # Saved meanwhile or edited into an existing number: ask before saving again
+        await callback.message.edit_text(
+            "⚠️ *هذه الفاتورة مسجلة من قبل\\!*\n\n"
+            "هل تريد المتابعة على أي حال؟",
+            parse_mode="MarkdownV2",
+            reply_markup=get_duplicate_warning_keyboard()
+        )
+        await state.update_data(is_duplicate=True)
+        return
     except Exception as e:
         logger.error(f"Failed to save invoice: {e}")
         await callback.message.reply("❌ حدث خطأ أثناء حفظ الفاتورة")
@@ -11,6 +11,8 @@ from bot.states.invoice_states import InvoiceStates
 from bot.keyboards.invoice_keyboard import get_edit_menu_keyboard
 from bot.handlers.invoice import format_invoice_result
 from utils.calculations import recalculate_invoice
+from models.money import Money
+from utils.dates import iso_date
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -84,7 +86,7 @@ async def process_date_edit(message: Message, state: FSMContext):
     invoice = data.get("invoice_data")
     
     if invoice:
-        invoice.invoice_date = message.text
+        invoice.invoice_date = iso_date(message.text.strip()) or message.text
         await state.update_data(invoice_data=invoice)
         await update_invoice_in_place(message, state, "✅ تم تحديث التاريخ")
         await state.set_state(InvoiceStates.waiting_confirmation)
@@ -120,7 +122,7 @@ async def process_tax_num_edit(message: Message, state: FSMContext):
 async def process_discount_edit(message: Message, state: FSMContext):
     """Process discount edit."""
     try:
-        new_value = float(message.text)
+        new_value = Money.of(message.text)
         data = await state.get_data()
         invoice = data.get("invoice_data")
         
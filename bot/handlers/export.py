@@ -1,56 +1,123 @@
 """
 Export Commands
-Commands for exporting invoices and items to Excel
+Commands for exporting invoices and items to Excel, CSV or Parquet
 """
+import asyncio
 import logging
+from typing import Optional, Tuple
 from datetime import datetime
-from aiogram import Router
+from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, BufferedInputFile
+from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 
 from services.database import db_service
-from services.export_generator import export_generator
+from services.analytics import analytics_service, UserAnalytics
+from services.storage import repository
+from services.tabular_export import EXPORT_FORMATS
+from bot.export_delivery import COMBINED_EXPORT
+from bot.export_jobs import CANCEL_PREFIX, ExportRequest, export_jobs
+from utils.dates import iso_date
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Stats, price history and search read the local SQLite file only
+LOCAL_REPORTS_UNAVAILABLE = "⚠️ هذه الميزة غير متاحة حالياً مع قاعدة البيانات المركزية"
+
+
+def format_stats_text(analytics: UserAnalytics) -> str:
+    """Format user analytics for display."""
+    lines = [
+        "📊 إحصائياتك:",
+        "",
+        f"عدد الفواتير المحفوظة: {analytics.invoice_count}",
+    ]
+    
+    if not analytics.invoice_count:
+        lines.extend(["", "💡 اختر نوع التقرير:"])
+        return "\n".join(lines)
+    
+    lines.extend([
+        f"إجمالي المشتريات: {analytics.total_spend:,.2f}",
+        f"إجمالي الضريبة: {analytics.total_tax:,.2f}",
+        f"إجمالي الخصومات: {analytics.total_discount:,.2f}",
+        f"متوسط الفاتورة: {analytics.average_invoice:,.2f}",
+    ])
+    
+    if analytics.monthly:
+        lines.extend(["", "━━━━━━━━━━━━━━━━━━━━", "", "📈 المشتريات الشهرية:"])
+        for month, total, tax, count in analytics.monthly:
+            lines.append(f"    {month}: {total:,.2f} (ضريبة {tax:,.2f}) - {count} فاتورة")
+    
+    if analytics.quarterly_tax:
+        lines.extend(["", "🧾 الضريبة حسب الربع:"])
+        for quarter, tax in analytics.quarterly_tax:
+            lines.append(f"    {quarter}: {tax:,.2f}")
+    
+    if analytics.top_suppliers:
+        lines.extend(["", "━━━━━━━━━━━━━━━━━━━━", "", "🏢 أكبر الموردين:"])
+        for i, (name, total, count) in enumerate(analytics.top_suppliers, 1):
+            lines.append(f"    {i}. {name or 'غير محدد'}: {total:,.2f} ({count} فاتورة)")
+    
+    if analytics.top_items_by_spend:
+        lines.extend(["", "💰 أعلى الأصناف إنفاقاً:"])
+        for i, (name, total, quantity) in enumerate(analytics.top_items_by_spend, 1):
+            lines.append(f"    {i}. {name or 'غير محدد'}: {total:,.2f}")
+    
+    if analytics.top_items_by_quantity:
+        lines.extend(["", "📦 أكثر الأصناف كمية:"])
+        for i, (name, total, quantity) in enumerate(analytics.top_items_by_quantity, 1):
+            lines.append(f"    {i}. {name or 'غير محدد'}: {quantity:,.2f}")
+    
+    lines.extend(["", "━━━━━━━━━━━━━━━━━━━━", "", "💡 اختر نوع التقرير:"])
+    return "\n".join(lines)
+
+
+def parse_export_format(args: list, position: int) -> Optional[str]:
+    """Export format given at args[position] (xlsx if omitted), or None if unsupported."""
+    file_format = args[position].lower() if len(args) > position else "xlsx"
+    return file_format if file_format in EXPORT_FORMATS else None
+
+
+UNSUPPORTED_FORMAT_TEXT = f"❌ صيغة غير مدعومة. الصيغ المتاحة: {', '.join(EXPORT_FORMATS)}"
+
+
+def parse_date_range(start: str, end: str) -> Optional[Tuple[str, str]]:
+    """Both dates of a range as YYYY-MM-DD, or None if either is not a real date."""
+    dates = (iso_date(start), iso_date(end))
+    try:
+        for date in dates:
+            datetime.strptime(date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    return dates
+
+
+INVALID_DATE_TEXT = "❌ تأكد من صيغة التاريخ (YYYY-MM-DD)"
+
 
 @router.message(Command("export_invoices"))
 async def export_all_invoices(message: Message, state: FSMContext):
-    """Export all user's invoices to Excel."""
+    """Export all user's invoices to Excel, CSV or Parquet."""
     user_id = message.from_user.id
     
     # Clear any active state
     await state.clear()
     
-    try:
-        # Get all invoices
-        invoices = db_service.get_user_invoices(user_id)
-        
-        if not invoices:
-            await message.answer("❌ لا توجد فواتير محفوظة")
-            return
-        
-        # Convert to list of dicts
-        invoices_list = [dict(inv) for inv in invoices]
-        
-        # Generate Excel
-        await message.answer("⏳ جاري إنشاء التقرير...")
-        excel_file = export_generator.generate_invoices_report(invoices_list)
-        filename = f"invoices_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
-        # Send file
-        await message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📊 تقرير الفواتير\n\nعدد الفواتير: {len(invoices)}"
-        )
-        
-        logger.info(f"User {user_id} exported {len(invoices)} invoices")
-        
-    except Exception as e:
-        logger.error(f"Failed to export invoices: {e}")
-        await message.answer("❌ حدث خطأ أثناء إنشاء التقرير")
+    file_format = parse_export_format(message.text.split(), 1)
+    if file_format is None:
+        await message.answer(UNSUPPORTED_FORMAT_TEXT)
+        return
+    
+    filename = f"invoices_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[file_format]}"
+    await export_jobs.submit(message, user_id, ExportRequest(
+        table="invoices",
+        file_format=file_format,
+        filename=filename,
+        caption=lambda count: f"📊 تقرير الفواتير\n\nعدد الفواتير: {count}",
+        empty_text="❌ لا توجد فواتير محفوظة"
+    ))
 
 
 @router.message(Command("export_invoices_date"))
@@ -65,78 +132,55 @@ async def export_invoices_by_date(message: Message, state: FSMContext):
     if len(args) < 3:
         await message.answer(
             "📅 *استخدام الأمر:*\n\n"
-            "`/export_invoices_date YYYY-MM-DD YYYY-MM-DD`\n\n"
+            "`/export_invoices_date YYYY-MM-DD YYYY-MM-DD [xlsx|csv|parquet]`\n\n"
             "مثال:\n"
             "`/export_invoices_date 2024-01-01 2024-12-31`",
             parse_mode="Markdown"
         )
         return
     
-    start_date = args[1]
-    end_date = args[2]
+    date_range = parse_date_range(args[1], args[2])
+    if date_range is None:
+        await message.answer(INVALID_DATE_TEXT)
+        return
+    start_date, end_date = date_range
     
-    try:
-        # Get filtered invoices
-        invoices = db_service.get_user_invoices(user_id, start_date, end_date)
-        
-        if not invoices:
-            await message.answer(f"❌ لا توجد فواتير في الفترة من {start_date} إلى {end_date}")
-            return
-        
-        # Convert to list of dicts
-        invoices_list = [dict(inv) for inv in invoices]
-        
-        # Generate Excel
-        await message.answer("⏳ جاري إنشاء التقرير...")
-        excel_file = export_generator.generate_invoices_report(invoices_list)
-        filename = f"invoices_{start_date}_to_{end_date}.xlsx"
-        
-        # Send file
-        await message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📊 تقرير الفواتير\n\nالفترة: {start_date} إلى {end_date}\nعدد الفواتير: {len(invoices)}"
-        )
-        
-        logger.info(f"User {user_id} exported {len(invoices)} invoices from {start_date} to {end_date}")
-        
-    except Exception as e:
-        logger.error(f"Failed to export invoices by date: {e}")
-        await message.answer("❌ حدث خطأ. تأكد من صيغة التاريخ (YYYY-MM-DD)")
+    file_format = parse_export_format(args, 3)
+    if file_format is None:
+        await message.answer(UNSUPPORTED_FORMAT_TEXT)
+        return
+    
+    filename = f"invoices_{start_date}_to_{end_date}.{EXPORT_FORMATS[file_format]}"
+    await export_jobs.submit(message, user_id, ExportRequest(
+        table="invoices",
+        file_format=file_format,
+        filename=filename,
+        caption=lambda count: f"📊 تقرير الفواتير\n\nالفترة: {start_date} إلى {end_date}\nعدد الفواتير: {count}",
+        empty_text=f"❌ لا توجد فواتير في الفترة من {start_date} إلى {end_date}",
+        start_date=start_date,
+        end_date=end_date
+    ))
 
 
 @router.message(Command("export_items"))
 async def export_all_items(message: Message, state: FSMContext):
-    """Export all user's items to Excel."""
+    """Export all user's items to Excel, CSV or Parquet."""
     user_id = message.from_user.id
     await state.clear()
     
-    try:
-        # Get all items
-        items = db_service.get_user_items(user_id)
-        
-        if not items:
-            await message.answer("❌ لا توجد أصناف محفوظة")
-            return
-        
-        # Convert to list of dicts
-        items_list = [dict(item) for item in items]
-        
-        # Generate Excel
-        await message.answer("⏳ جاري إنشاء التقرير...")
-        excel_file = export_generator.generate_items_report(items_list)
-        filename = f"items_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
-        # Send file
-        await message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📦 تقرير الأصناف\n\nعدد الأصناف: {len(items)}"
-        )
-        
-        logger.info(f"User {user_id} exported {len(items)} items")
-        
-    except Exception as e:
-        logger.error(f"Failed to export items: {e}")
-        await message.answer("❌ حدث خطأ أثناء إنشاء التقرير")
+    file_format = parse_export_format(message.text.split(), 1)
+    if file_format is None:
+        await message.answer(UNSUPPORTED_FORMAT_TEXT)
+        return
+    
+    filename = f"items_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[file_format]}"
+    await export_jobs.submit(message, user_id, ExportRequest(
+        table="invoice_items",
+        file_format=file_format,
+        filename=filename,
+        caption=lambda count: f"📦 تقرير الأصناف\n\nعدد الأصناف: {count}",
+        empty_text="❌ لا توجد أصناف محفوظة"
+    ))
 
 
 @router.message(Command("export_items_date"))
@@ -151,43 +195,91 @@ async def export_items_by_date(message: Message, state: FSMContext):
     if len(args) < 3:
         await message.answer(
             "📅 *استخدام الأمر:*\n\n"
-            "`/export_items_date YYYY-MM-DD YYYY-MM-DD`\n\n"
+            "`/export_items_date YYYY-MM-DD YYYY-MM-DD [xlsx|csv|parquet]`\n\n"
             "مثال:\n"
             "`/export_items_date 2024-01-01 2024-12-31`",
             parse_mode="Markdown"
         )
         return
     
-    start_date = args[1]
-    end_date = args[2]
+    date_range = parse_date_range(args[1], args[2])
+    if date_range is None:
+        await message.answer(INVALID_DATE_TEXT)
+        return
+    start_date, end_date = date_range
     
-    try:
-        # Get filtered items
-        items = db_service.get_user_items(user_id, start_date, end_date)
-        
-        if not items:
-            await message.answer(f"❌ لا توجد أصناف في الفترة من {start_date} إلى {end_date}")
-            return
-        
-        # Convert to list of dicts
-        items_list = [dict(item) for item in items]
-        
-        # Generate Excel
-        await message.answer("⏳ جاري إنشاء التقرير...")
-        excel_file = export_generator.generate_items_report(items_list)
-        filename = f"items_{start_date}_to_{end_date}.xlsx"
-        
-        # Send file
-        await message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📦 تقرير الأصناف\n\nالفترة: {start_date} إلى {end_date}\nعدد الأصناف: {len(items)}"
+    file_format = parse_export_format(args, 3)
+    if file_format is None:
+        await message.answer(UNSUPPORTED_FORMAT_TEXT)
+        return
+    
+    filename = f"items_{start_date}_to_{end_date}.{EXPORT_FORMATS[file_format]}"
+    await export_jobs.submit(message, user_id, ExportRequest(
+        table="invoice_items",
+        file_format=file_format,
+        filename=filename,
+        caption=lambda count: f"📦 تقرير الأصناف\n\nالفترة: {start_date} إلى {end_date}\nعدد الأصناف: {count}",
+        empty_text=f"❌ لا توجد أصناف في الفترة من {start_date} إلى {end_date}",
+        start_date=start_date,
+        end_date=end_date
+    ))
+
+
+@router.message(Command("export_combined"))
+async def export_combined(message: Message, state: FSMContext):
+    """Export invoices with their items and monthly/supplier summaries in one workbook."""
+    user_id = message.from_user.id
+    await state.clear()
+    
+    # Optional date range
+    args = message.text.split()
+    if len(args) == 2:
+        await message.answer(
+            "📅 *استخدام الأمر:*\n\n"
+            "`/export_combined [YYYY-MM-DD YYYY-MM-DD]`\n\n"
+            "مثال:\n"
+            "`/export_combined 2024-01-01 2024-12-31`",
+            parse_mode="Markdown"
         )
-        
-        logger.info(f"User {user_id} exported {len(items)} items from {start_date} to {end_date}")
-        
-    except Exception as e:
-        logger.error(f"Failed to export items by date: {e}")
-        await message.answer("❌ حدث خطأ. تأكد من صيغة التاريخ (YYYY-MM-DD)")
+        return
+    
+    start_date, end_date = None, None
+    if len(args) > 2:
+        date_range = parse_date_range(args[1], args[2])
+        if date_range is None:
+            await message.answer(INVALID_DATE_TEXT)
+            return
+        start_date, end_date = date_range
+    
+    if start_date:
+        filename = f"combined_{start_date}_to_{end_date}.xlsx"
+        period = f"\nالفترة: {start_date} إلى {end_date}"
+        empty_text = f"❌ لا توجد فواتير في الفترة من {start_date} إلى {end_date}"
+    else:
+        filename = f"combined_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        period = ""
+        empty_text = "❌ لا توجد فواتير محفوظة"
+    
+    await export_jobs.submit(message, user_id, ExportRequest(
+        table=COMBINED_EXPORT,
+        file_format="xlsx",
+        filename=filename,
+        caption=lambda count: f"📚 التقرير الشامل\n{period}\nعدد الفواتير: {count}",
+        empty_text=empty_text,
+        start_date=start_date,
+        end_date=end_date
+    ))
+
+
+@router.callback_query(F.data.startswith(CANCEL_PREFIX))
+async def cancel_export_callback(callback: CallbackQuery):
+    """Cancel a running export job."""
+    job_id = callback.data[len(CANCEL_PREFIX):]
+    
+    if export_jobs.cancel(job_id, callback.from_user.id):
+        await callback.answer("🚫 جاري إلغاء التصدير...")
+    else:
+        await callback.answer("انتهت هذه المهمة بالفعل", show_alert=True)
 
 
 @router.message(Command("stats"))
@@ -196,8 +288,12 @@ async def show_stats(message: Message, state: FSMContext):
     user_id = message.from_user.id
     await state.clear()
     
+    if not repository.local_reports:
+        await message.answer(LOCAL_REPORTS_UNAVAILABLE)
+        return
+    
     try:
-        invoice_count = db_service.get_invoice_count(user_id)
+        analytics = await analytics_service.get_user_analytics(user_id)
         
         # Create export buttons keyboard
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -214,11 +310,34 @@ async def show_stats(message: Message, state: FSMContext):
         ])
         
         await message.answer(
-            f"📊 إحصائياتك:\n\n"
-            f"عدد الفواتير المحفوظة: {invoice_count}\n\n"
-            f"💡 اختر نوع التقرير:",
+            format_stats_text(analytics),
             reply_markup=keyboard
         )
     except Exception as e:
         logger.error(f"Failed to show stats: {e}")
         await message.answer("❌ حدث خطأ")
+
+
+@router.message(Command("rebuild_stats"))
+async def rebuild_stats(message: Message, state: FSMContext):
+    """Recompute user's summary statistics from saved invoices."""
+    user_id = message.from_user.id
+    await state.clear()
+    
+    if not repository.local_reports:
+        await message.answer(LOCAL_REPORTS_UNAVAILABLE)
+        return
+    
+    try:
+        drift = await asyncio.to_thread(db_service.rebuild_stats, user_id)
+        
+        if drift:
+            await message.answer(f"✅ تمت إعادة حساب الإحصائيات\n\nتم تصحيح {drift} سجل")
+        else:
+            await message.answer("✅ الإحصائيات متطابقة مع الفواتير المحفوظة")
+        
+        logger.info(f"User {user_id} rebuilt stats ({drift} rows corrected)")
+        
+    except Exception as e:
+        logger.error(f"Failed to rebuild stats: {e}")
+        await message.answer("❌ حدث خطأ")
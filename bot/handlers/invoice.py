@@ -2,6 +2,7 @@
 Invoice Handler
 Handles invoice images and PDF files
 """
+import asyncio
 import logging
 from datetime import datetime
 from aiogram import Router, F, Bot
@@ -11,7 +12,9 @@ from aiogram.fsm.context import FSMContext
 from services.ocr_service import ocr_service
 from services.validator import validator
 from services.excel_generator import excel_generator
-from services.database import db_service
+from services.qr_service import qr_service
+from services.render_pool import render_pool
+from services.storage import repository
 from bot.keyboards.invoice_keyboard import get_invoice_confirmation_keyboard, get_edit_menu_keyboard, get_totals_edit_keyboard, get_duplicate_warning_keyboard
 from bot.states.invoice_states import InvoiceStates
 
@@ -101,8 +104,11 @@ async def handle_photo(message: Message, bot: Bot, state: FSMContext) -> None:
         
         logger.info(f"Downloaded photo: {len(image_data)} bytes")
         
-        # Extract data using OCR
-        invoice = await ocr_service.extract_from_image(image_data)
+        # Decode the ZATCA QR code in the pool while OCR runs (QR first, so it is submitted first)
+        qr, invoice = await asyncio.gather(
+            render_pool.read_qr(image_data),
+            ocr_service.extract_from_image(image_data)
+        )
         
         # Check for OCR failure first
         if not invoice.items:
@@ -113,12 +119,23 @@ async def handle_photo(message: Message, bot: Bot, state: FSMContext) -> None:
             )
             return
         
-        # Validate calculations (only if we have items)
-        validator.validate(invoice)
+        # Prefill and cross-check the header against the QR code
+        qr_notes = qr_service.apply(invoice, qr) if qr else []
+        
+        if qr and qr_service.settles_totals(invoice):
+            # Items add up to the QR's signed totals: no arithmetic audit needed
+            invoice.is_valid = True
+            invoice.validation_message = "✅ الحسابات مطابقة لرمز QR"
+        else:
+            # Validate calculations (only if we have items)
+            validator.validate(invoice)
+        
+        if qr_notes:
+            invoice.validation_message += "\n\n🔳 تم التصحيح من رمز QR:\n" + "\n".join(qr_notes)
         
         # Check for duplicate invoice
         user_id = message.from_user.id
-        is_duplicate = db_service.check_duplicate_invoice(
+        is_duplicate = await repository.check_duplicate_invoice(
             user_id,
             invoice.invoice_number,
             invoice.tax_number
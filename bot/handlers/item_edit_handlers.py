@@ -11,6 +11,7 @@ from bot.keyboards.invoice_keyboard import get_items_list_keyboard, get_item_edi
 from bot.states.invoice_states import InvoiceStates
 from bot.handlers.invoice import format_invoice_result
 from utils.calculations import recalculate_invoice
+from models.money import Money
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -236,7 +237,7 @@ async def process_item_unit_edit(message: Message, state: FSMContext):
 async def process_item_price_edit(message: Message, state: FSMContext):
     """Process item price edit."""
     try:
-        new_value = float(message.text)
+        new_value = Money.of(message.text)
         data = await state.get_data()
         invoice = data.get("invoice_data")
         item_index = data.get("editing_item_index")
@@ -5,12 +5,15 @@ Handles main menu button clicks
 import logging
 from datetime import datetime
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, BufferedInputFile
+from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from services.database import db_service
-from services.export_generator import export_generator
+from services.analytics import analytics_service
+from services.storage import repository
+from bot.export_delivery import COMBINED_EXPORT
+from bot.export_jobs import ExportRequest, export_jobs
+from bot.handlers.export import INVALID_DATE_TEXT, LOCAL_REPORTS_UNAVAILABLE, format_stats_text, parse_date_range
 from bot.handlers.start import get_main_menu_keyboard, get_invoices_menu_keyboard, get_items_menu_keyboard
 
 logger = logging.getLogger(__name__)
@@ -63,8 +66,12 @@ async def menu_stats_callback(callback: CallbackQuery):
     await callback.answer()
     user_id = callback.from_user.id
     
+    if not repository.local_reports:
+        await callback.message.reply(LOCAL_REPORTS_UNAVAILABLE)
+        return
+    
     try:
-        invoice_count = db_service.get_invoice_count(user_id)
+        analytics = await analytics_service.get_user_analytics(user_id)
         
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         export_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -82,9 +89,7 @@ async def menu_stats_callback(callback: CallbackQuery):
         ])
         
         await callback.message.edit_text(
-            f"📊 إحصائياتك:\n\n"
-            f"عدد الفواتير المحفوظة: {invoice_count}\n\n"
-            f"💡 اختر نوع التقرير:",
+            format_stats_text(analytics),
             reply_markup=export_keyboard
         )
     except Exception as e:
@@ -129,6 +134,7 @@ async def menu_help_callback(callback: CallbackQuery):
         "📊 التقارير:\n\n"
         "    • اضغط 'تقارير الفواتير' لتصدير الفواتير\n"
         "    • اضغط 'تقارير الأصناف' لتصدير الأصناف\n"
+        "    • اضغط 'تقرير شامل' لملف واحد بالفواتير وأصنافها وملخصاتها\n"
         "    • يمكنك التصدير لفترة محددة",
         reply_markup=get_main_menu_keyboard()
     )
@@ -142,27 +148,14 @@ async def export_all_invoices_callback(callback: CallbackQuery):
     await callback.answer("⏳ جاري إنشاء التقرير...")
     user_id = callback.from_user.id
     
-    try:
-        invoices = db_service.get_user_invoices(user_id)
-        
-        if not invoices:
-            await callback.answer("❌ لا توجد فواتير", show_alert=True)
-            return
-        
-        invoices_list = [dict(inv) for inv in invoices]
-        excel_file = export_generator.generate_invoices_report(invoices_list)
-        filename = f"invoices_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
-        await callback.message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📊 تقرير الفواتير - عدد: {len(invoices)}"
-        )
-        
-        logger.info(f"User {user_id} exported {len(invoices)} invoices")
-        
-    except Exception as e:
-        logger.error(f"Failed to export invoices: {e}")
-        await callback.answer("❌ حدث خطأ", show_alert=True)
+    filename = f"invoices_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    await export_jobs.submit(callback.message, user_id, ExportRequest(
+        table="invoices",
+        file_format="xlsx",
+        filename=filename,
+        caption=lambda count: f"📊 تقرير الفواتير - عدد: {count}",
+        empty_text="❌ لا توجد فواتير"
+    ))
 
 
 @router.callback_query(F.data == "export_invoices_date")
@@ -184,27 +177,30 @@ async def export_all_items_callback(callback: CallbackQuery):
     await callback.answer("⏳ جاري إنشاء التقرير...")
     user_id = callback.from_user.id
     
-    try:
-        items = db_service.get_user_items(user_id)
-        
-        if not items:
-            await callback.answer("❌ لا توجد أصناف", show_alert=True)
-            return
-        
-        items_list = [dict(item) for item in items]
-        excel_file = export_generator.generate_items_report(items_list)
-        filename = f"items_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
-        await callback.message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📦 تقرير الأصناف - عدد: {len(items)}"
-        )
-        
-        logger.info(f"User {user_id} exported {len(items)} items")
-        
-    except Exception as e:
-        logger.error(f"Failed to export items: {e}")
-        await callback.answer("❌ حدث خطأ", show_alert=True)
+    filename = f"items_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    await export_jobs.submit(callback.message, user_id, ExportRequest(
+        table="invoice_items",
+        file_format="xlsx",
+        filename=filename,
+        caption=lambda count: f"📦 تقرير الأصناف - عدد: {count}",
+        empty_text="❌ لا توجد أصناف"
+    ))
+
+
+@router.callback_query(F.data == "export_combined")
+async def export_combined_callback(callback: CallbackQuery):
+    """Export invoices, their items and summaries in one workbook."""
+    await callback.answer("⏳ جاري إنشاء التقرير...")
+    user_id = callback.from_user.id
+    
+    filename = f"combined_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    await export_jobs.submit(callback.message, user_id, ExportRequest(
+        table=COMBINED_EXPORT,
+        file_format="xlsx",
+        filename=filename,
+        caption=lambda count: f"📚 التقرير الشامل - عدد الفواتير: {count}",
+        empty_text="❌ لا توجد فواتير"
+    ))
 
 
 @router.callback_query(F.data == "export_items_date")
@@ -225,74 +221,52 @@ async def export_items_date_callback(callback: CallbackQuery, state: FSMContext)
 @router.message(DateInputStates.waiting_invoices_date)
 async def process_invoices_date(message, state: FSMContext):
     """Process date input for invoices export."""
-    try:
-        parts = message.text.split()
-        if len(parts) < 2:
-            await message.answer("❌ صيغة خاطئة. أدخل تاريخين مثال: 2024-01-01 2024-12-31")
-            return
-        
-        start_date, end_date = parts[0], parts[1]
-        user_id = message.from_user.id
-        
-        invoices = db_service.get_user_invoices(user_id, start_date, end_date)
-        
-        if not invoices:
-            await message.answer(f"❌ لا توجد فواتير في الفترة من {start_date} إلى {end_date}")
-            await state.clear()
-            return
-        
-        invoices_list = [dict(inv) for inv in invoices]
-        
-        await message.answer("⏳ جاري إنشاء التقرير...")
-        excel_file = export_generator.generate_invoices_report(invoices_list)
-        filename = f"invoices_{start_date}_to_{end_date}.xlsx"
-        
-        await message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📊 تقرير الفواتير\n\nالفترة: {start_date} إلى {end_date}\nعدد الفواتير: {len(invoices)}"
-        )
-        
-        await state.clear()
-        
-    except Exception as e:
-        logger.error(f"Failed to export invoices by date: {e}")
-        await message.answer("❌ حدث خطأ. تأكد من صيغة التاريخ")
-        await state.clear()
+    parts = message.text.split()
+    if len(parts) < 2:
+        await message.answer("❌ صيغة خاطئة. أدخل تاريخين مثال: 2024-01-01 2024-12-31")
+        return
+    
+    date_range = parse_date_range(parts[0], parts[1])
+    if date_range is None:
+        await message.answer(INVALID_DATE_TEXT)
+        return
+    
+    start_date, end_date = date_range
+    await state.clear()
+    
+    await export_jobs.submit(message, message.from_user.id, ExportRequest(
+        table="invoices",
+        file_format="xlsx",
+        filename=f"invoices_{start_date}_to_{end_date}.xlsx",
+        caption=lambda count: f"📊 تقرير الفواتير\n\nالفترة: {start_date} إلى {end_date}\nعدد الفواتير: {count}",
+        empty_text=f"❌ لا توجد فواتير في الفترة من {start_date} إلى {end_date}",
+        start_date=start_date,
+        end_date=end_date
+    ))
 
 
 @router.message(DateInputStates.waiting_items_date)
 async def process_items_date(message, state: FSMContext):
     """Process date input for items export."""
-    try:
-        parts = message.text.split()
-        if len(parts) < 2:
-            await message.answer("❌ صيغة خاطئة. أدخل تاريخين مثال: 2024-01-01 2024-12-31")
-            return
-        
-        start_date, end_date = parts[0], parts[1]
-        user_id = message.from_user.id
-        
-        items = db_service.get_user_items(user_id, start_date, end_date)
-        
-        if not items:
-            await message.answer(f"❌ لا توجد أصناف في الفترة من {start_date} إلى {end_date}")
-            await state.clear()
-            return
-        
-        items_list = [dict(item) for item in items]
-        
-        await message.answer("⏳ جاري إنشاء التقرير...")
-        excel_file = export_generator.generate_items_report(items_list)
-        filename = f"items_{start_date}_to_{end_date}.xlsx"
-        
-        await message.answer_document(
-            document=BufferedInputFile(excel_file.read(), filename=filename),
-            caption=f"📦 تقرير الأصناف\n\nالفترة: {start_date} إلى {end_date}\nعدد الأصناف: {len(items)}"
-        )
-        
-        await state.clear()
-        
-    except Exception as e:
-        logger.error(f"Failed to export items by date: {e}")
-        await message.answer("❌ حدث خطأ. تأكد من صيغة التاريخ")
-        await state.clear()
+    parts = message.text.split()
+    if len(parts) < 2:
+        await message.answer("❌ صيغة خاطئة. أدخل تاريخين مثال: 2024-01-01 2024-12-31")
+        return
+    
+    date_range = parse_date_range(parts[0], parts[1])
+    if date_range is None:
+        await message.answer(INVALID_DATE_TEXT)
+        return
+    
+    start_date, end_date = date_range
+    await state.clear()
+    
+    await export_jobs.submit(message, message.from_user.id, ExportRequest(
+        table="invoice_items",
+        file_format="xlsx",
+        filename=f"items_{start_date}_to_{end_date}.xlsx",
+        caption=lambda count: f"📦 تقرير الأصناف\n\nالفترة: {start_date} إلى {end_date}\nعدد الأصناف: {count}",
+        empty_text=f"❌ لا توجد أصناف في الفترة من {start_date} إلى {end_date}",
+        start_date=start_date,
+        end_date=end_date
+    ))
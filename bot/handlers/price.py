@@ -0,0 +1,94 @@
+"""
+Price Command
+Shows unit-price history of an item from saved invoices
+"""
+import asyncio
+import logging
+from typing import List
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+
+from models.money import Money
+from services.database import db_service
+from services.storage import repository
+from bot.handlers.export import LOCAL_REPORTS_UNAVAILABLE
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+
+def format_price_history(entry, history, summary) -> str:
+    """Format price history of one catalog item for display."""
+    unit = f" ({entry['unit']})" if entry["unit"] else ""
+    lines = [
+        f"🏷️ {entry['canonical_name']}{unit}",
+        "",
+        "🏢 حسب المورد:",
+    ]
+    
+    for row in summary:
+        lines.append(
+            f"    {row['supplier_name'] or 'غير محدد'}: "
+            f"آخر سعر {Money(row['last_price']):,.2f} | "
+            f"أقل {Money(row['min_price']):,.2f} | أعلى {Money(row['max_price']):,.2f} "
+            f"({row['purchases']} مرة)"
+        )
+    
+    lines.extend(["", "📅 آخر الأسعار:"])
+    for row in history:
+        lines.append(
+            f"    {row['invoice_date'] or 'غير محدد'} - "
+            f"{row['supplier_name'] or 'غير محدد'}: {Money(row['unit_price']):,.2f}"
+        )
+    
+    return "\n".join(lines)
+
+
+def load_price_blocks(user_id: int, name: str) -> List[str]:
+    """Formatted price history of each catalog item matching name (blocking; run in a thread)."""
+    return [
+        format_price_history(
+            entry,
+            db_service.get_price_history(entry["id"]),
+            db_service.get_price_summary(entry["id"])
+        )
+        for entry in db_service.find_catalog_items(user_id, name)
+    ]
+
+
+@router.message(Command("price"))
+async def show_price_history(message: Message, command: CommandObject, state: FSMContext):
+    """Show unit-price history and per-supplier min/max/last for an item."""
+    user_id = message.from_user.id
+    await state.clear()
+    
+    if not command.args:
+        await message.answer(
+            "🏷️ *استخدام الأمر:*\n\n"
+            "`/price اسم الصنف`\n\n"
+            "مثال:\n"
+            "`/price عصير جهينة`",
+            parse_mode="Markdown"
+        )
+        return
+    
+    if not repository.local_reports:
+        await message.answer(LOCAL_REPORTS_UNAVAILABLE)
+        return
+    
+    try:
+        blocks = await asyncio.to_thread(load_price_blocks, user_id, command.args)
+        
+        if not blocks:
+            await message.answer(f"❌ لا يوجد صنف باسم: {command.args}")
+            return
+        
+        await message.answer("\n\n━━━━━━━━━━━━━━━━━━━━\n\n".join(blocks))
+        
+        logger.info(f"User {user_id} looked up prices for '{command.args}'")
+        
+    except Exception as e:
+        logger.error(f"Failed to show price history: {e}")
+        await message.answer("❌ حدث خطأ")
@@ -0,0 +1,78 @@
+"""
+Search Command
+Full-text search over saved invoices and their items
+"""
+import asyncio
+import logging
+import time
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+
+from models.money import Money
+from services.database import db_service
+from services.storage import repository
+from bot.handlers.export import LOCAL_REPORTS_UNAVAILABLE
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+
+def format_search_results(query: str, results) -> str:
+    """Format search results for display."""
+    lines = [f"🔎 نتائج البحث عن: {query}", ""]
+    
+    for i, row in enumerate(results, 1):
+        lines.append(
+            f"{i}. {row['supplier_name'] or 'غير محدد'} - "
+            f"فاتورة {row['invoice_number'] or 'غير محدد'}"
+        )
+        lines.append(
+            f"    📅 {row['invoice_date'] or 'غير محدد'} | "
+            f"💰 {Money(row['total_amount']):,.2f}"
+        )
+        if row["matched_items"]:
+            lines.append(f"    🛒 {row['matched_items']}")
+        lines.append("")
+    
+    return "\n".join(lines).rstrip()
+
+
+@router.message(Command("search"))
+async def search_invoices(message: Message, command: CommandObject, state: FSMContext):
+    """Search user's invoices by supplier, invoice number or item name."""
+    user_id = message.from_user.id
+    await state.clear()
+    
+    if not command.args:
+        await message.answer(
+            "🔎 *استخدام الأمر:*\n\n"
+            "`/search كلمة البحث`\n\n"
+            "يمكنك البحث باسم المورد أو رقم الفاتورة أو اسم الصنف\n\n"
+            "مثال:\n"
+            "`/search جهينة`",
+            parse_mode="Markdown"
+        )
+        return
+    
+    if not repository.local_reports:
+        await message.answer(LOCAL_REPORTS_UNAVAILABLE)
+        return
+    
+    try:
+        started = time.perf_counter()
+        results = await asyncio.to_thread(db_service.search_invoices, user_id, command.args)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        if not results:
+            await message.answer(f"❌ لا توجد نتائج لـ: {command.args}")
+            return
+        
+        await message.answer(format_search_results(command.args, results))
+        
+        logger.info(f"User {user_id} searched '{command.args}': {len(results)} results in {elapsed_ms:.1f} ms")
+        
+    except Exception as e:
+        logger.error(f"Failed to search invoices: {e}")
+        await message.answer("❌ حدث خطأ")
@@ -16,6 +16,9 @@ def get_main_menu_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="📊 تقارير الفواتير", callback_data="menu_invoices"),
             InlineKeyboardButton(text="📦 تقارير الأصناف", callback_data="menu_items")
         ],
+        [
+            InlineKeyboardButton(text="📚 تقرير شامل (فواتير + أصناف)", callback_data="export_combined")
+        ],
         [
             InlineKeyboardButton(text="📈 إحصائياتي", callback_data="menu_stats"),
             InlineKeyboardButton(text="❓ المساعدة", callback_data="menu_help")
@@ -86,8 +89,15 @@ async def cmd_help(message: Message) -> None:
         "    /start - بدء المحادثة\n"
         "    /help - المساعدة\n"
         "    /stats - الإحصائيات\n"
+        "    /rebuild_stats - إعادة حساب الإحصائيات\n"
+        "    /price - تاريخ أسعار صنف\n"
+        "    /search - البحث في الفواتير\n"
         "    /export_invoices - تصدير كل الفواتير\n"
-        "    /export_items - تصدير كل الأصناف\n\n"
+        "    /export_items - تصدير كل الأصناف\n"
+        "    (أضف csv أو parquet بعد أمري التصدير أعلاه لتصدير البيانات الخام)\n"
+        "    /export_combined - تقرير شامل للفواتير وأصنافها مع الملخصات (Excel فقط)\n"
+        "    /subscribe - التقارير الشهرية التلقائية\n"
+        "    /unsubscribe - إلغاء التقارير الشهرية\n\n"
         "━━━━━━━━━━━━━━━━━━━━\n\n"
         "📊 البيانات المستخرجة:\n"
         "    • اسم المورد\n"
@@ -0,0 +1,102 @@
+"""
+Subscription Commands
+Subscribe to monthly reports delivered automatically on the 1st
+"""
+import logging
+from datetime import datetime
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+
+from bot.scheduled_reports import REPORT_TYPES, due_period
+from config.settings import settings
+from services.storage import repository
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+
+def format_subscriptions_text(reports) -> str:
+    """Format user's subscriptions and the command usage for display."""
+    lines = ["🗓️ التقارير الشهرية", ""]
+    
+    if reports:
+        lines.append("اشتراكاتك الحالية:")
+        for report in reports:
+            lines.append(f"    • {REPORT_TYPES[report][0]}")
+    else:
+        lines.append("لا توجد اشتراكات حالياً")
+    
+    lines.extend([
+        "",
+        f"تصلك تقارير الشهر السابق يوم 1 من كل شهر الساعة {settings.REPORT_SEND_HOUR}:00",
+        "",
+        "📋 الأوامر:",
+        "    /subscribe monthly - تقرير المشتريات الشهري",
+        "    /subscribe vat - ملخص ضريبة القيمة المضافة",
+        "    /unsubscribe - إلغاء كل الاشتراكات",
+    ])
+    return "\n".join(lines)
+
+
+@router.message(Command("subscribe"))
+async def subscribe(message: Message, command: CommandObject, state: FSMContext):
+    """Subscribe to a scheduled monthly report, or show current subscriptions."""
+    user_id = message.from_user.id
+    await state.clear()
+    
+    report = (command.args or "").strip().lower()
+    
+    try:
+        if not report:
+            reports = await repository.get_user_subscriptions(user_id)
+            await message.answer(format_subscriptions_text(reports))
+            return
+        
+        if report not in REPORT_TYPES:
+            await message.answer(f"❌ نوع تقرير غير معروف. الأنواع المتاحة: {', '.join(REPORT_TYPES)}")
+            return
+        
+        # Start with next month's delivery rather than back-filling the current one
+        added = await repository.add_subscription(
+            user_id, message.chat.id, report,
+            last_period=due_period(datetime.now(), settings.REPORT_SEND_HOUR)
+        )
+        
+        title = REPORT_TYPES[report][0]
+        if added:
+            await message.answer(f"✅ تم الاشتراك في {title}\n\nسيصلك التقرير يوم 1 من كل شهر")
+            logger.info(f"User {user_id} subscribed to {report} reports")
+        else:
+            await message.answer(f"ℹ️ أنت مشترك بالفعل في {title}")
+    
+    except Exception as e:
+        logger.error(f"Failed to subscribe: {e}")
+        await message.answer("❌ حدث خطأ")
+
+
+@router.message(Command("unsubscribe"))
+async def unsubscribe(message: Message, command: CommandObject, state: FSMContext):
+    """Cancel one scheduled report (all if no type is given)."""
+    user_id = message.from_user.id
+    await state.clear()
+    
+    report = (command.args or "").strip().lower() or None
+    
+    if report is not None and report not in REPORT_TYPES:
+        await message.answer(f"❌ نوع تقرير غير معروف. الأنواع المتاحة: {', '.join(REPORT_TYPES)}")
+        return
+    
+    try:
+        removed = await repository.delete_subscriptions(user_id, report)
+        
+        if removed:
+            await message.answer("✅ تم إلغاء الاشتراك")
+            logger.info(f"User {user_id} unsubscribed from {report or 'all'} reports")
+        else:
+            await message.answer("ℹ️ لا يوجد اشتراك لإلغائه")
+    
+    except Exception as e:
+        logger.error(f"Failed to unsubscribe: {e}")
+        await message.answer("❌ حدث خطأ")
@@ -0,0 +1,264 @@
+"""
+Scheduled Reports
+Delivers each subscriber's monthly purchases workbook and VAT summary on the 1st
+"""
+import asyncio
+import calendar
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from bot.export_delivery import ReportInputFile
+from config.settings import settings
+from models.money import Money
+from services.database import INVOICE_COLUMNS
+from services.export_generator import ExportResult
+from services.render_pool import render_pool
+from services.storage import repository
+
+logger = logging.getLogger(__name__)
+
+# Report types users can subscribe to: (display name, file name prefix)
+REPORT_TYPES = {
+    "monthly": ("📊 تقرير المشتريات الشهري", "purchases"),
+    "vat": ("🧾 ملخص ضريبة القيمة المضافة", "vat"),
+}
+
+# Attempts per message while Telegram keeps answering with flood control
+SEND_ATTEMPTS = 5
+
+_TAX_INDEX = INVOICE_COLUMNS.index("tax_amount")
+
+
+def due_period(now: datetime, send_hour: int) -> str:
+    """
+    Latest month (YYYY-MM) whose reports are due at now.
+    
+    That is the previous month from send_hour on the 1st, and the month
+    before it until then.
+    """
+    first_of_month = (now - timedelta(hours=send_hour)).replace(day=1)
+    return (first_of_month - timedelta(days=1)).strftime("%Y-%m")
+
+
+def period_bounds(period: str) -> Tuple[str, str]:
+    """First and last date (YYYY-MM-DD) of a YYYY-MM period."""
+    year, month = map(int, period.split("-"))
+    return f"{period}-01", f"{period}-{calendar.monthrange(year, month)[1]:02d}"
+
+
+@dataclass
+class RenderedReport:
+    """One subscription's report, ready to send."""
+    user_id: int
+    chat_id: int
+    report: str
+    invoice_count: int
+    tax_amount: int  # halalas
+    result: Optional[ExportResult] = None  # None when the period has no invoices
+
+
+class ReportScheduler:
+    """
+    Delivers the reports of all due subscriptions in one pass.
+    
+    Subscriptions are read sorted by user and their invoices fetched for
+    batch_users users per query. Workbooks render in the worker pool a
+    few ahead of the sender, which paces messages below Telegram's
+    broadcast limit and waits out any flood-control reply, so the spike
+    on the 1st is spread out instead of hitting the bot at once.
+    """
+    
+    def __init__(self, send_hour: int = 8, batch_users: int = 200, send_rate: float = 20):
+        """
+        Args:
+            send_hour: Hour of the 1st from which last month's reports are sent
+            batch_users: Users whose invoices are fetched per query
+            send_rate: Messages sent per second at most
+        """
+        self.send_hour = send_hour
+        self.batch_users = batch_users
+        self.send_interval = 1 / send_rate
+        self._next_send = 0.0
+    
+    async def run_forever(self, bot: Bot, interval_seconds: float):
+        """Check for due reports now and then every interval until cancelled."""
+        while True:
+            try:
+                await self.run_once(bot)
+            except Exception as e:
+                logger.error(f"Scheduled reports run failed: {e}")
+            
+            await asyncio.sleep(interval_seconds)
+    
+    async def run_once(self, bot: Bot, now: Optional[datetime] = None) -> int:
+        """
+        Deliver every subscription not yet sent for the due period.
+        
+        Delivered subscriptions are marked one by one, so a run that is
+        interrupted resumes where it stopped.
+        
+        Returns:
+            Number of reports delivered
+        """
+        period = due_period(now or datetime.now(), self.send_hour)
+        due = await repository.get_due_subscriptions(period)
+        if not due:
+            return 0
+        
+        logger.info(f"Delivering {len(due)} scheduled reports for {period}")
+        
+        # Render tasks in subscription order, ended by None
+        queue: asyncio.Queue = asyncio.Queue()
+        ahead = asyncio.Semaphore(max(1, render_pool.max_workers) * 2)
+        producer = asyncio.create_task(self._render_all(due, period, queue, ahead))
+        
+        delivered = 0
+        try:
+            while (task := await queue.get()) is not None:
+                rendered = await task
+                if rendered and await self._deliver(bot, rendered, period):
+                    delivered += 1
+                ahead.release()
+            await producer
+        finally:
+            producer.cancel()
+            while not queue.empty():
+                self._discard(queue.get_nowait())
+        
+        logger.info(f"Delivered {delivered} of {len(due)} scheduled reports for {period}")
+        return delivered
+    
+    async def _render_all(
+        self,
+        due: List[Tuple[int, int, str]],
+        period: str,
+        queue: asyncio.Queue,
+        ahead: asyncio.Semaphore
+    ):
+        """Fetch invoices batch by batch and queue a render task per subscription."""
+        start_date, end_date = period_bounds(period)
+        users = [(user_id, list(subscriptions)) for user_id, subscriptions in groupby(due, key=itemgetter(0))]
+        
+        try:
+            for offset in range(0, len(users), self.batch_users):
+                batch = users[offset:offset + self.batch_users]
+                rows = await repository.get_period_invoices(
+                    [user_id for user_id, _ in batch], start_date, end_date
+                )
+                invoices = {
+                    user_id: [row[1:] for row in user_rows]
+                    for user_id, user_rows in groupby(rows, key=itemgetter(0))
+                }
+                
+                for user_id, subscriptions in batch:
+                    for _, chat_id, report in subscriptions:
+                        await ahead.acquire()
+                        queue.put_nowait(asyncio.create_task(
+                            self._render(user_id, chat_id, report, invoices.get(user_id, []), period)
+                        ))
+        finally:
+            queue.put_nowait(None)
+    
+    @staticmethod
+    async def _render(
+        user_id: int,
+        chat_id: int,
+        report: str,
+        invoices: List[Tuple],
+        period: str
+    ) -> Optional[RenderedReport]:
+        """Render one subscription's report; None if rendering failed."""
+        rendered = RenderedReport(
+            user_id, chat_id, report,
+            invoice_count=len(invoices),
+            tax_amount=sum(row[_TAX_INDEX] for row in invoices)
+        )
+        if not invoices:
+            return rendered
+        
+        try:
+            if report == "vat":
+                rendered.result = await render_pool.vat_summary(invoices, period)
+            else:
+                rendered.result = await render_pool.invoices_report(invoices)
+        except Exception as e:
+            logger.error(f"Failed to render {report} report of user {user_id} for {period}: {e}")
+            return None
+        return rendered
+    
+    async def _deliver(self, bot: Bot, rendered: RenderedReport, period: str) -> bool:
+        """Send one report and mark its subscription delivered."""
+        title, file_prefix = REPORT_TYPES.get(rendered.report, REPORT_TYPES["monthly"])
+        
+        try:
+            if rendered.result is None:
+                await self._paced(lambda: bot.send_message(
+                    rendered.chat_id,
+                    f"{title} - {period}\n\nلا توجد فواتير محفوظة في هذا الشهر"
+                ))
+            else:
+                with rendered.result.file:
+                    document = ReportInputFile(rendered.result.file, f"{file_prefix}_{period}.xlsx")
+                    caption = (
+                        f"{title} - {period}\n\n"
+                        f"عدد الفواتير: {rendered.invoice_count}\n"
+                        f"إجمالي الضريبة: {Money(rendered.tax_amount):,.2f}"
+                    )
+                    await self._paced(lambda: bot.send_document(rendered.chat_id, document, caption=caption))
+        
+        except TelegramForbiddenError:
+            # The user blocked the bot; stop scheduling for them
+            await repository.delete_subscriptions(rendered.user_id)
+            logger.info(f"User {rendered.user_id} blocked the bot, removed their report subscriptions")
+            return False
+        
+        except Exception as e:
+            logger.error(f"Failed to send {rendered.report} report to user {rendered.user_id}: {e}")
+            return False
+        
+        await repository.mark_subscription_sent(rendered.user_id, rendered.report, period)
+        return True
+    
+    async def _paced(self, send: Callable[[], Awaitable]):
+        """Make one Telegram call in its turn, retrying after flood-control replies."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, SEND_ATTEMPTS + 1):
+            now = loop.time()
+            slot = max(now, self._next_send)
+            self._next_send = slot + self.send_interval
+            await asyncio.sleep(slot - now)
+            
+            try:
+                return await send()
+            except TelegramRetryAfter as e:
+                if attempt == SEND_ATTEMPTS:
+                    raise
+                logger.warning(f"Telegram flood control, pausing scheduled reports for {e.retry_after}s")
+                self._next_send = max(self._next_send, loop.time() + e.retry_after)
+    
+    @staticmethod
+    def _discard(task: Optional[asyncio.Task]):
+        """Drop a render nobody will send, closing its file if it already finished."""
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            rendered = task.result()
+            if rendered and rendered.result:
+                rendered.result.file.close()
+
+
+# Global instance
+report_scheduler = ReportScheduler(
+    send_hour=settings.REPORT_SEND_HOUR,
+    batch_users=settings.REPORT_BATCH_USERS,
+    send_rate=settings.REPORT_SEND_RATE
+)
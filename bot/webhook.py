@@ -0,0 +1,153 @@
+"""
+Webhook Server
+Receives Telegram updates over HTTPS so several bot replicas can run behind a load balancer
+"""
+import asyncio
+import logging
+import signal
+from typing import Any, Dict, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds to let updates in progress finish on shutdown
+DRAIN_TIMEOUT = 30
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler with a cap on updates processed at once.
+    
+    Updates are acknowledged immediately and handled in the background.
+    Once max_concurrent are in progress, further deliveries get a 503 so
+    Telegram retries them later (possibly on another replica) instead of
+    piling up tasks in this process.
+    """
+    
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, max_concurrent: int):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token)
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self._tasks: Set[asyncio.Task] = set()
+    
+    @property
+    def saturated(self) -> bool:
+        """Whether new updates are currently being turned away."""
+        return self.in_flight >= self.max_concurrent
+    
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if self.saturated:
+            return web.Response(status=503, text="Busy", headers={"Retry-After": "1"})
+        
+        self.in_flight += 1
+        try:
+            return await super()._handle_request_background(bot, request)
+        except Exception:
+            # No task was started for this update
+            self.in_flight -= 1
+            raise
+    
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await super()._background_feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Failed to process update {update.get('update_id')}: {e}")
+        finally:
+            self._tasks.discard(task)
+            self.in_flight -= 1
+    
+    async def drain(self, timeout: float):
+        """Wait up to timeout seconds for updates in progress to finish."""
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} update(s) to finish")
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+class WebhookServer:
+    """
+    Embedded aiohttp server for webhook mode.
+    
+    Routes:
+        POST WEBHOOK_PATH - Telegram updates (checked against WEBHOOK_SECRET)
+        GET /healthz - liveness: the process is serving requests
+        GET /readyz - readiness: 503 while starting, draining or saturated
+    """
+    
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        self.dp = dp
+        self.bot = bot
+        self.ready = False
+        self.handler = LimitedRequestHandler(
+            dp, bot,
+            secret_token=settings.WEBHOOK_SECRET,
+            max_concurrent=settings.WEBHOOK_MAX_CONCURRENT_UPDATES
+        )
+    
+    def build_app(self) -> web.Application:
+        """Create the aiohttp application with the webhook and health routes."""
+        app = web.Application()
+        self.handler.register(app, path=settings.WEBHOOK_PATH)
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        setup_application(app, self.dp, bot=self.bot)
+        return app
+    
+    async def healthz(self, request: web.Request) -> web.Response:
+        """Liveness probe."""
+        return web.json_response({"status": "ok"})
+    
+    async def readyz(self, request: web.Request) -> web.Response:
+        """Readiness probe: take this replica out of rotation when it cannot take updates."""
+        ready = self.ready and not self.handler.saturated
+        return web.json_response(
+            {
+                "status": "ready" if ready else "unavailable",
+                "in_flight": self.handler.in_flight,
+                "max_concurrent": self.handler.max_concurrent,
+            },
+            status=200 if ready else 503
+        )
+    
+    async def serve(self):
+        """
+        Serve until SIGINT/SIGTERM, then drain updates in progress.
+        
+        Every replica registers the same webhook URL, so it is set on
+        startup but never deleted on shutdown.
+        """
+        runner = web.AppRunner(self.build_app())
+        await runner.setup()
+        site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+        await site.start()
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        try:
+            await self.bot.set_webhook(
+                url=settings.WEBHOOK_BASE_URL.rstrip("/") + settings.WEBHOOK_PATH,
+                secret_token=settings.WEBHOOK_SECRET,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS
+            )
+            self.ready = True
+            logger.info(f"🌐 Webhook server listening on {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}")
+            
+            await stop.wait()
+        finally:
+            self.ready = False
+            await site.stop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            await self.handler.drain(DRAIN_TIMEOUT)
+            await runner.cleanup()
+            logger.info("Webhook server stopped")
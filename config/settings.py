@@ -2,6 +2,7 @@
 FatoorahBot Configuration Settings
 """
 import os
+import re
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,6 +21,61 @@ class Settings:
     # Application Settings
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     
+    # Storage Configuration
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "sqlite").lower()  # sqlite | postgres
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    
+    # SQLite Maintenance
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))  # 0 disables archival
+    VACUUM_MAX_PAGES: int = int(os.getenv("VACUUM_MAX_PAGES", "2000"))
+    MAINTENANCE_INTERVAL_HOURS: float = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))
+    
+    # Backups
+    BACKUP_DIR: str = os.getenv("BACKUP_DIR", "data/backups")
+    BACKUP_INTERVAL_HOURS: float = float(os.getenv("BACKUP_INTERVAL_HOURS", "6"))  # 0 disables
+    BACKUP_KEEP: int = int(os.getenv("BACKUP_KEEP", "7"))
+    BACKUP_PAGES_PER_STEP: int = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+    
+    # Report Rendering
+    RENDER_WORKERS: int = int(os.getenv("RENDER_WORKERS", "2"))  # 0 renders in threads
+    # Telegram bots may upload documents up to 50 MB; larger exports are sent in parts
+    EXPORT_PART_MAX_MB: float = float(os.getenv("EXPORT_PART_MAX_MB", "45"))
+    # Exports running at once across all users; one per user on top of that
+    EXPORT_MAX_CONCURRENT: int = int(os.getenv("EXPORT_MAX_CONCURRENT", "4"))
+    
+    # Scheduled Reports (previous month's reports go out on the 1st)
+    REPORT_SEND_HOUR: int = int(os.getenv("REPORT_SEND_HOUR", "8"))
+    REPORT_CHECK_INTERVAL_MINUTES: float = float(os.getenv("REPORT_CHECK_INTERVAL_MINUTES", "15"))
+    REPORT_BATCH_USERS: int = int(os.getenv("REPORT_BATCH_USERS", "200"))  # Users fetched per query
+    # Telegram allows about 30 messages per second across all chats
+    REPORT_SEND_RATE: float = float(os.getenv("REPORT_SEND_RATE", "20"))
+    
+    # Update Delivery
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling").lower()  # polling | webhook
+    WEBHOOK_BASE_URL: str = os.getenv("WEBHOOK_BASE_URL", "")  # Public HTTPS URL of the server or load balancer
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")  # 1-256 characters: A-Z, a-z, 0-9, _ and -
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    # Updates handled at once per replica; beyond that Telegram is asked to retry
+    WEBHOOK_MAX_CONCURRENT_UPDATES: int = int(os.getenv("WEBHOOK_MAX_CONCURRENT_UPDATES", "50"))
+    # Parallel connections Telegram opens to the webhook (1-100)
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    # Conversation State (drafts being reviewed or edited)
+    FSM_STORAGE: str = os.getenv("FSM_STORAGE", "sqlite").lower()  # memory | sqlite | redis
+    FSM_DB_PATH: str = os.getenv("FSM_DB_PATH", "data/fsm.db")
+    FSM_FLUSH_INTERVAL: float = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))  # Seconds changes stay in memory
+    FSM_CACHE_SIZE: int = int(os.getenv("FSM_CACHE_SIZE", "1000"))  # Conversations cached per process
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    # Drafts never saved or cancelled are removed, with the bot's messages about them
+    DRAFT_TTL_HOURS: float = float(os.getenv("DRAFT_TTL_HOURS", "24"))  # 0 keeps drafts forever
+    DRAFT_SWEEP_INTERVAL_MINUTES: float = float(os.getenv("DRAFT_SWEEP_INTERVAL_MINUTES", "30"))
+    
+    # Maintenance, backups and scheduled reports; enable on one replica only
+    BACKGROUND_JOBS: bool = os.getenv("BACKGROUND_JOBS", "True").lower() == "true"
+    
     @classmethod
     def validate(cls) -> bool:
         """Validate that all required settings are present."""
@@ -27,6 +83,21 @@ class Settings:
             raise ValueError("TELEGRAM_BOT_TOKEN is required!")
         if not cls.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY is required!")
+        if cls.STORAGE_BACKEND not in ("sqlite", "postgres"):
+            raise ValueError(f"Unknown STORAGE_BACKEND: {cls.STORAGE_BACKEND}")
+        if cls.STORAGE_BACKEND == "postgres" and not cls.DATABASE_URL:
+            raise ValueError("DATABASE_URL is required for STORAGE_BACKEND=postgres!")
+        if cls.FSM_STORAGE not in ("memory", "sqlite", "redis"):
+            raise ValueError(f"Unknown FSM_STORAGE: {cls.FSM_STORAGE}")
+        if cls.FSM_STORAGE == "redis" and not cls.REDIS_URL:
+            raise ValueError("REDIS_URL is required for FSM_STORAGE=redis!")
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"Unknown BOT_MODE: {cls.BOT_MODE}")
+        if cls.BOT_MODE == "webhook":
+            if not cls.WEBHOOK_BASE_URL.startswith("https://"):
+                raise ValueError("WEBHOOK_BASE_URL must be an https:// URL for BOT_MODE=webhook!")
+            if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", cls.WEBHOOK_SECRET):
+                raise ValueError("WEBHOOK_SECRET is required for BOT_MODE=webhook (A-Z, a-z, 0-9, _ and -)!")
         return True
 
 
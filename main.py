@@ -12,6 +12,15 @@ from aiogram.client.default import DefaultBotProperties
 
 from config.settings import settings
 from bot.handlers import all_routers
+from services.storage import repository
+from services.maintenance import maintenance_service
+from services.backup import backup_service
+from services.excel_generator import excel_generator
+from services.render_pool import render_pool
+from bot.scheduled_reports import report_scheduler
+from bot.webhook import WebhookServer
+from bot.fsm_storage import create_fsm_storage
+from bot.draft_sweeper import draft_sweeper
 
 
 # Configure logging
@@ -32,21 +41,64 @@ async def main() -> None:
     # Initialize bot with token
     bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
     
-    # Initialize dispatcher
-    dp = Dispatcher()
+    # Initialize dispatcher (drafts in progress persist in the FSM storage)
+    dp = Dispatcher(storage=create_fsm_storage())
     
     # Register all routers
     for router in all_routers:
         dp.include_router(router)
     
+    # Build the invoice workbook template once; forked workers inherit it
+    excel_generator.prepare()
+    
+    # Fork the report workers while the process is still single-threaded
+    render_pool.start()
+    
+    # Open storage connections
+    await repository.connect()
+    
+    # Archive old invoices and vacuum the local database in the background
+    background_tasks = []
+    if settings.BACKGROUND_JOBS:
+        if settings.STORAGE_BACKEND == "sqlite":
+            background_tasks.append(asyncio.create_task(
+                maintenance_service.run_forever(settings.MAINTENANCE_INTERVAL_HOURS * 3600)
+            ))
+            
+            # Online snapshots of the local database
+            if settings.BACKUP_INTERVAL_HOURS > 0:
+                background_tasks.append(asyncio.create_task(
+                    backup_service.run_forever(settings.BACKUP_INTERVAL_HOURS * 3600)
+                ))
+        
+        # Monthly reports for subscribers
+        background_tasks.append(asyncio.create_task(
+            report_scheduler.run_forever(bot, settings.REPORT_CHECK_INTERVAL_MINUTES * 60)
+        ))
+    
+    # Expire abandoned drafts (safe on every replica: a draft is deleted only once)
+    if settings.DRAFT_TTL_HOURS > 0:
+        background_tasks.append(asyncio.create_task(
+            draft_sweeper.run_forever(bot, dp.storage, settings.DRAFT_SWEEP_INTERVAL_MINUTES * 60)
+        ))
+    
     # Log startup
     logger.info("🚀 FatoorahBot is starting...")
     logger.info(f"📋 Registered {len(all_routers)} routers")
     
-    # Start polling
+    # Receive updates
     try:
-        await dp.start_polling(bot)
+        if settings.BOT_MODE == "webhook":
+            await WebhookServer(dp, bot).serve()
+        else:
+            # A webhook left over from webhook mode would make polling fail
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        for task in background_tasks:
+            task.cancel()
+        await repository.close()
+        render_pool.shutdown()
         await bot.session.close()
 
 
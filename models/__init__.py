@@ -1,4 +1,5 @@
 """
 FatoorahBot - Data Models
 """
-from models.invoice import InvoiceData, InvoiceItem
\ No newline at end of file
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
\ No newline at end of file
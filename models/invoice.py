@@ -2,21 +2,95 @@
 Invoice Data Models
 Defines the structure of extracted invoice data
 """
-from dataclasses import dataclass, field
-from typing import List, Optional
+import struct
+from dataclasses import dataclass, field, replace
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from models.money import Money
 
-@dataclass
+# Binary encoding (to_bytes/from_bytes); bump when the layout changes.
+# Version 1 stored items one after another, version 2 stores them as columns
+CODEC_VERSION = 2
+
+_VERSION = struct.Struct("<B")
+_LENGTH = struct.Struct("<I")
+_ITEM_NUMBERS = struct.Struct("<dqq")  # quantity, unit_price, total
+_TOTALS = struct.Struct("<qqdqq?")  # subtotal, discount, tax_rate, tax_amount, total_amount, is_valid
+
+
+def _pack_str(value: Optional[str]) -> bytes:
+    """Length-prefixed UTF-8; None is stored as ""."""
+    data = value.encode("utf-8") if value else b""
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_str(buffer: bytes, offset: int) -> Tuple[str, int]:
+    """Read a length-prefixed string; returns (value, next offset)."""
+    (length,) = _LENGTH.unpack_from(buffer, offset)
+    offset += _LENGTH.size
+    return buffer[offset:offset + length].decode("utf-8"), offset + length
+
+
+def _item_columns(count: int) -> struct.Struct:
+    """Name lengths, unit lengths, quantities, unit prices and totals of count items."""
+    return struct.Struct(f"<{count}I{count}I{count}d{count}q{count}q")
+
+
+def _split(text: str, lengths: Sequence[int]) -> List[str]:
+    """Cut text into consecutive pieces of the given lengths (in characters)."""
+    ends = list(accumulate(lengths))
+    return [text[end - length:end] for end, length in zip(ends, lengths)]
+
+
+@dataclass(slots=True)
 class InvoiceItem:
     """Represents a single item in the invoice."""
     name: str = ""
     quantity: float = 0.0
     unit: str = ""
-    unit_price: float = 0.0
-    total: float = 0.0
+    unit_price: Money = Money(0)
+    total: Money = Money(0)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict (amounts in halalas), e.g. for JSON."""
+        return {
+            "name": self.name,
+            "quantity": self.quantity,
+            "unit": self.unit,
+            "unit_price": int(self.unit_price),
+            "total": int(self.total),
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InvoiceItem":
+        """Item from a dict written by to_dict."""
+        return cls(
+            name=data.get("name") or "",
+            quantity=data.get("quantity") or 0.0,
+            unit=data.get("unit") or "",
+            unit_price=Money(data.get("unit_price") or 0),
+            total=Money(data.get("total") or 0),
+        )
+    
+    def to_bytes(self) -> bytes:
+        """Encode the item on its own (version 1 item layout, no header)."""
+        return (
+            _pack_str(self.name) + _pack_str(self.unit)
+            + _ITEM_NUMBERS.pack(float(self.quantity), self.unit_price, self.total)
+        )
+    
+    @classmethod
+    def from_bytes(cls, buffer: bytes, offset: int = 0) -> Tuple["InvoiceItem", int]:
+        """Decode an item written by to_bytes; returns (item, next offset)."""
+        name, offset = _unpack_str(buffer, offset)
+        unit, offset = _unpack_str(buffer, offset)
+        quantity, unit_price, total = _ITEM_NUMBERS.unpack_from(buffer, offset)
+        item = cls(name=name, quantity=quantity, unit=unit, unit_price=Money(unit_price), total=Money(total))
+        return item, offset + _ITEM_NUMBERS.size
 
 
-@dataclass
+@dataclass(slots=True)
 class InvoiceData:
     """Represents the complete invoice data."""
     # Supplier Information
@@ -31,12 +105,144 @@ class InvoiceData:
     items: List[InvoiceItem] = field(default_factory=list)
     
     # Totals
-    subtotal: float = 0.0
-    discount: float = 0.0
+    subtotal: Money = Money(0)
+    discount: Money = Money(0)
     tax_rate: float = 0.0  # Tax percentage (e.g., 15 for 15%)
-    tax_amount: float = 0.0
-    total_amount: float = 0.0
+    tax_amount: Money = Money(0)
+    total_amount: Money = Money(0)
     
     # Validation
     is_valid: bool = False
-    validation_message: str = ""
\ No newline at end of file
+    validation_message: str = ""
+    
+    def __reduce__(self):
+        # pickle (render pool) and copy.deepcopy go through the binary codec,
+        # several times faster than the field-by-field state of slotted classes
+        return type(self).from_bytes, (self.to_bytes(),)
+    
+    def __copy__(self):
+        return replace(self)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict (amounts in halalas), e.g. for JSON."""
+        return {
+            "supplier_name": self.supplier_name,
+            "tax_number": self.tax_number,
+            "invoice_number": self.invoice_number,
+            "invoice_date": self.invoice_date,
+            "items": [item.to_dict() for item in self.items],
+            "subtotal": int(self.subtotal),
+            "discount": int(self.discount),
+            "tax_rate": self.tax_rate,
+            "tax_amount": int(self.tax_amount),
+            "total_amount": int(self.total_amount),
+            "is_valid": self.is_valid,
+            "validation_message": self.validation_message,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InvoiceData":
+        """Invoice from a dict written by to_dict."""
+        return cls(
+            supplier_name=data.get("supplier_name") or "",
+            tax_number=data.get("tax_number") or "",
+            invoice_number=data.get("invoice_number") or "",
+            invoice_date=data.get("invoice_date") or "",
+            items=[InvoiceItem.from_dict(item) for item in data.get("items") or []],
+            subtotal=Money(data.get("subtotal") or 0),
+            discount=Money(data.get("discount") or 0),
+            tax_rate=data.get("tax_rate") or 0.0,
+            tax_amount=Money(data.get("tax_amount") or 0),
+            total_amount=Money(data.get("total_amount") or 0),
+            is_valid=data.get("is_valid", False),
+            validation_message=data.get("validation_message") or "",
+        )
+    
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary encoding, used to keep drafts in FSM storage.
+        
+        Layout (little-endian): version byte, the header strings and the
+        validation message (u32 length + UTF-8 each), the totals and the
+        item count, then the items as columns: name and unit lengths,
+        quantities, unit prices and totals as packed arrays, followed by
+        all names and all units as two strings. A 200-item invoice packs
+        and unpacks with a handful of struct calls instead of 200.
+        """
+        items = self.items
+        names = [item.name or "" for item in items]
+        units = [item.unit or "" for item in items]
+        
+        parts = [_VERSION.pack(CODEC_VERSION)]
+        for value in (self.supplier_name, self.tax_number, self.invoice_number,
+                      self.invoice_date, self.validation_message):
+            parts.append(_pack_str(value))
+        parts.append(_TOTALS.pack(
+            self.subtotal, self.discount, float(self.tax_rate),
+            self.tax_amount, self.total_amount, self.is_valid
+        ))
+        parts.append(_LENGTH.pack(len(items)))
+        parts.append(_item_columns(len(items)).pack(
+            *map(len, names), *map(len, units),
+            *[float(item.quantity) for item in items],
+            *[item.unit_price for item in items],
+            *[item.total for item in items]
+        ))
+        parts.append(_pack_str("".join(names)))
+        parts.append(_pack_str("".join(units)))
+        return b"".join(parts)
+    
+    @classmethod
+    def from_bytes(cls, buffer: bytes) -> "InvoiceData":
+        """
+        Decode an invoice written by to_bytes (current or version 1 layout).
+        
+        Raises:
+            ValueError: If the data is truncated or of an unknown version
+        """
+        try:
+            (version,) = _VERSION.unpack_from(buffer, 0)
+            if version not in (1, CODEC_VERSION):
+                raise ValueError(f"Unsupported invoice encoding version: {version}")
+            offset = _VERSION.size
+            
+            strings = []
+            for _ in range(5):
+                value, offset = _unpack_str(buffer, offset)
+                strings.append(value)
+            supplier_name, tax_number, invoice_number, invoice_date, validation_message = strings
+            
+            subtotal, discount, tax_rate, tax_amount, total_amount, is_valid = _TOTALS.unpack_from(buffer, offset)
+            offset += _TOTALS.size
+            
+            (count,) = _LENGTH.unpack_from(buffer, offset)
+            offset += _LENGTH.size
+            if version == 1:
+                items = []
+                for _ in range(count):
+                    item, offset = InvoiceItem.from_bytes(buffer, offset)
+                    items.append(item)
+            else:
+                columns = _item_columns(count)
+                values = columns.unpack_from(buffer, offset)
+                offset += columns.size
+                names, offset = _unpack_str(buffer, offset)
+                units, offset = _unpack_str(buffer, offset)
+                items = [
+                    InvoiceItem(name, quantity, unit, Money(unit_price), Money(total))
+                    for name, unit, quantity, unit_price, total in zip(
+                        _split(names, values[:count]), _split(units, values[count:2 * count]),
+                        values[2 * count:3 * count], values[3 * count:4 * count], values[4 * count:]
+                    )
+                ]
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid invoice encoding: {e}")
+        
+        return cls(
+            supplier_name=supplier_name, tax_number=tax_number,
+            invoice_number=invoice_number, invoice_date=invoice_date,
+            items=items,
+            subtotal=Money(subtotal), discount=Money(discount), tax_rate=tax_rate,
+            tax_amount=Money(tax_amount), total_amount=Money(total_amount),
+            is_valid=is_valid, validation_message=validation_message
+        )
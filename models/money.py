@@ -0,0 +1,111 @@
+"""
+Money Type
+Exact money amounts stored as integer minor units (halalas)
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Optional, Union
+
+# Minor units per riyal
+MINOR_UNITS = 100
+
+Number = Union[int, float, str, Decimal]
+
+
+def _round_half_up(value: Decimal) -> int:
+    """Round a Decimal to the nearest integer, halves away from zero."""
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class Money(int):
+    """
+    Amount in halalas (1/100 SAR).
+
+    Behaves as an int for storage, comparison and SQL, while addition,
+    subtraction and scaling stay Money and display/format in riyals.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, value: Union["Money", Number, None]) -> "Money":
+        """
+        Convert an amount in riyals to Money, rounding half up.
+
+        Raises:
+            ValueError: If value is not a number
+        """
+        if isinstance(value, Money):
+            return value
+        if value is None or value == "":
+            return cls(0)
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {value!r}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid amount: {value!r}")
+        return cls(_round_half_up(amount * MINOR_UNITS))
+
+    def to_decimal(self) -> Decimal:
+        """Amount in riyals as an exact Decimal."""
+        return Decimal(int(self)).scaleb(-2)
+
+    def percent(self, rate: Number) -> "Money":
+        """rate% of this amount, rounded half up once."""
+        return Money(_round_half_up(Decimal(int(self)) * Decimal(str(rate)) / 100))
+
+    @staticmethod
+    def _minor(other) -> int:
+        """Minor units of an addend, which must be Money."""
+        if isinstance(other, Money):
+            return int(other)
+        # A plain 5 could mean riyals or halalas; floats would fall back to float arithmetic
+        raise TypeError(f"Cannot combine Money with {type(other).__name__}; use Money.of() or Money()")
+
+    def __add__(self, other):
+        return Money(int(self) + self._minor(other))
+
+    def __radd__(self, other):
+        # sum() starts from a plain 0
+        if type(other) is int and other == 0:
+            return self
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        return Money(int(self) - self._minor(other))
+
+    def __rsub__(self, other):
+        return Money(self._minor(other) - int(self))
+
+    def __mul__(self, factor):
+        if isinstance(factor, Money):
+            raise TypeError("Cannot multiply Money by Money")
+        if isinstance(factor, (int, float, Decimal)):
+            return Money(_round_half_up(Decimal(int(self)) * Decimal(str(factor))))
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, divisor):
+        if isinstance(divisor, (int, float, Decimal)) and not isinstance(divisor, Money):
+            return Money(_round_half_up(Decimal(int(self)) / Decimal(str(divisor))))
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __abs__(self):
+        return Money(abs(int(self)))
+
+    def __str__(self) -> str:
+        return str(self.to_decimal())
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    def __format__(self, spec: str) -> str:
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+
+def to_riyals(value: Optional[int]) -> Optional[Decimal]:
+    """Stored halalas as riyals for reports; NULL stays None."""
+    return None if value is None else Money(value).to_decimal()
@@ -0,0 +1,124 @@
+"""
+Analytics Service
+Per-user spending analytics computed with SQL aggregates
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from models.money import Money
+from services.database import DatabaseService, db_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserAnalytics:
+    """Aggregated spending figures for one user."""
+    invoice_count: int = 0
+    total_spend: Money = Money(0)
+    total_tax: Money = Money(0)
+    total_discount: Money = Money(0)
+    average_invoice: Money = Money(0)
+    
+    # (month, total, tax, invoice_count), newest first
+    monthly: List[Tuple[str, Money, Money, int]] = field(default_factory=list)
+    
+    # (quarter, tax), newest first
+    quarterly_tax: List[Tuple[str, Money]] = field(default_factory=list)
+    
+    # (supplier, total, invoice_count)
+    top_suppliers: List[Tuple[str, Money, int]] = field(default_factory=list)
+    
+    # (item, total, quantity)
+    top_items_by_spend: List[Tuple[str, Money, float]] = field(default_factory=list)
+    top_items_by_quantity: List[Tuple[str, Money, float]] = field(default_factory=list)
+
+
+class AnalyticsService:
+    """Service for computing and caching user analytics."""
+    
+    def __init__(self, db: DatabaseService, months: int = 6, top_n: int = 5, max_entries: int = 1000):
+        """
+        Initialize analytics service.
+        
+        Args:
+            db: Database service to query
+            months: Number of months shown in the trend
+            top_n: Number of suppliers/items in each top list
+            max_entries: Users whose analytics are cached (least recently used dropped first)
+        """
+        self.db = db
+        self.months = months
+        self.top_n = top_n
+        self.max_entries = max_entries
+        # user_id -> (data version, analytics)
+        self._cache: "OrderedDict[int, Tuple[int, UserAnalytics]]" = OrderedDict()
+    
+    async def get_user_analytics(self, user_id: int) -> UserAnalytics:
+        """
+        Get user's analytics, recomputing only after their data changed.
+        
+        The cache is keyed on the per-user data version, which the
+        database bumps on every save. Queries run in a worker thread;
+        the cache is only touched from the event loop.
+        """
+        version = await asyncio.to_thread(self.db.get_data_version, user_id)
+        cached = self._cache.get(user_id)
+        if cached and cached[0] == version:
+            self._cache.move_to_end(user_id)
+            return cached[1]
+        
+        started = time.perf_counter()
+        analytics = await asyncio.to_thread(self._compute, user_id)
+        self._cache[user_id] = (version, analytics)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        
+        logger.info(
+            f"Computed analytics for user {user_id} in "
+            f"{(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return analytics
+    
+    def _compute(self, user_id: int) -> UserAnalytics:
+        """Run the aggregate queries for one user."""
+        totals = self.db.get_user_totals(user_id)
+        count = totals["invoice_count"]
+        
+        return UserAnalytics(
+            invoice_count=count,
+            total_spend=Money(totals["total_amount"]),
+            total_tax=Money(totals["tax_amount"]),
+            total_discount=Money(totals["discount"]),
+            average_invoice=Money(totals["total_amount"]) / count if count else Money(0),
+            monthly=[
+                (row["month"], Money(row["total_amount"]), Money(row["tax_amount"]), row["invoice_count"])
+                for row in self.db.get_monthly_stats(user_id, self.months)
+                if row["month"]
+            ],
+            quarterly_tax=[
+                (row["quarter"], Money(row["tax_amount"]))
+                for row in self.db.get_quarterly_tax(user_id)
+            ],
+            top_suppliers=[
+                (row["supplier_name"], Money(row["total_amount"]), row["invoice_count"])
+                for row in self.db.get_supplier_stats(user_id, self.top_n)
+            ],
+            top_items_by_spend=[
+                (row["item_name"], Money(row["total"]), row["quantity"])
+                for row in self.db.get_top_items(user_id, "total", self.top_n)
+            ],
+            top_items_by_quantity=[
+                (row["item_name"], Money(row["total"]), row["quantity"])
+                for row in self.db.get_top_items(user_id, "quantity", self.top_n)
+            ],
+        )
+
+
+# Global instance
+analytics_service = AnalyticsService(db_service)
@@ -0,0 +1,293 @@
+"""
+Backup Service
+Online snapshots of the invoice databases with rotation, verification and restore
+
+Usage:
+    python -m services.backup backup
+    python -m services.backup list
+    python -m services.backup verify <snapshot>
+    python -m services.backup restore <snapshot>
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import shutil
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from config.settings import settings
+from services.database import DatabaseService, db_service
+
+logger = logging.getLogger(__name__)
+
+# Snapshot directories are named by their creation time
+SNAPSHOT_NAME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+@dataclass
+class BackupResult:
+    """Outcome of one snapshot run."""
+    name: str
+    pages: int
+    bytes_copied: int
+    compressed_bytes: int
+    duration: float
+
+
+class BackupService:
+    """
+    Snapshots the hot and archive databases while the bot keeps running.
+
+    Pages are copied with SQLite's online backup API a few at a time with
+    a short sleep in between, so a writer never waits for more than one step.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseService,
+        backup_dir: str = "data/backups",
+        keep: int = 7,
+        pages_per_step: int = 256,
+        step_sleep: float = 0.005
+    ):
+        self.db = db
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+
+    def _database_files(self) -> List[Path]:
+        """Database files that make up one snapshot."""
+        return [Path(self.db.db_path), Path(self.db.archive_path)]
+
+    def create_snapshot(self) -> BackupResult:
+        """
+        Copy all databases into a new compressed, verified snapshot.
+
+        Returns:
+            BackupResult of the run
+
+        Raises:
+            RuntimeError: If a copy fails its integrity check
+        """
+        started = time.perf_counter()
+        name = datetime.now().strftime(SNAPSHOT_NAME_FORMAT)
+        target_dir = self.backup_dir / name
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        pages = bytes_copied = compressed_bytes = 0
+
+        try:
+            # Archival moves rows between the files; copy both on the same side of a move
+            with self.db.archive_lock:
+                copies = []
+                for source_path in self._database_files():
+                    if not source_path.exists():
+                        continue
+                    copy_path = target_dir / source_path.name
+                    copied_pages, page_size = self._online_copy(source_path, copy_path)
+                    pages += copied_pages
+                    bytes_copied += copied_pages * page_size
+                    copies.append(copy_path)
+
+            for copy_path in copies:
+                self._check_integrity(copy_path)
+                compressed_bytes += self._compress(copy_path).stat().st_size
+        except Exception:
+            shutil.rmtree(target_dir, ignore_errors=True)
+            raise
+
+        duration = time.perf_counter() - started
+        result = BackupResult(name, pages, bytes_copied, compressed_bytes, duration)
+        logger.info(
+            f"Backup {name}: {pages} pages, {bytes_copied / 1e6:.1f} MB in {duration:.2f}s "
+            f"({bytes_copied / 1e6 / max(duration, 1e-6):.1f} MB/s), "
+            f"{compressed_bytes / 1e6:.1f} MB compressed"
+        )
+
+        self._rotate()
+        return result
+
+    def _online_copy(self, source_path: Path, copy_path: Path):
+        """Copy a live database page-step by page-step; returns (pages, page_size)."""
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(copy_path)
+        progress = {"pages": 0}
+
+        def on_progress(status, remaining, total):
+            progress["pages"] = total
+
+        try:
+            source.backup(
+                target,
+                pages=self.pages_per_step,
+                progress=on_progress,
+                sleep=self.step_sleep
+            )
+            page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+        return progress["pages"], page_size
+
+    @staticmethod
+    def _check_integrity(path: Path):
+        """Raise RuntimeError unless the database at path passes integrity_check."""
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            # Damage in the header or schema fails the check before it can report
+            result = str(e)
+        finally:
+            conn.close()
+
+        if result != "ok":
+            raise RuntimeError(f"Integrity check failed for {path.name}: {result}")
+
+    @staticmethod
+    def _compress(path: Path) -> Path:
+        """Gzip a file next to itself and remove the original."""
+        gz_path = path.with_name(path.name + ".gz")
+        with open(path, "rb") as src, gzip.open(gz_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        path.unlink()
+        return gz_path
+
+    @staticmethod
+    def _decompress(gz_path: Path, path: Path):
+        """Gunzip a snapshot file to path."""
+        with gzip.open(gz_path, "rb") as src, open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def _rotate(self):
+        """Delete the oldest snapshots beyond the configured count."""
+        for name in self.list_snapshots()[self.keep:]:
+            shutil.rmtree(self.backup_dir / name, ignore_errors=True)
+            logger.info(f"Removed old backup {name}")
+
+    def list_snapshots(self) -> List[str]:
+        """Snapshot names, newest first."""
+        if not self.backup_dir.exists():
+            return []
+        return sorted(
+            (path.name for path in self.backup_dir.iterdir() if path.is_dir()),
+            reverse=True
+        )
+
+    def _snapshot_dir(self, name: str) -> Path:
+        target_dir = self.backup_dir / name
+        if not target_dir.is_dir():
+            raise FileNotFoundError(f"No such backup: {name}")
+        return target_dir
+
+    def verify_snapshot(self, name: str) -> bool:
+        """
+        Decompress a snapshot to a scratch file and run integrity_check on it.
+
+        Returns:
+            True if every database in the snapshot is intact
+        """
+        target_dir = self._snapshot_dir(name)
+
+        for gz_path in sorted(target_dir.glob("*.db.gz")):
+            scratch = target_dir / f".verify-{gz_path.stem}"
+            try:
+                self._decompress(gz_path, scratch)
+                self._check_integrity(scratch)
+            except Exception as e:
+                logger.error(f"Backup {name} failed verification: {e}")
+                return False
+            finally:
+                scratch.unlink(missing_ok=True)
+
+        logger.info(f"Backup {name} verified")
+        return True
+
+    def restore_snapshot(self, name: str):
+        """
+        Replace the live databases with a snapshot.
+
+        The snapshot is written through the backup API into the live
+        files, so connections opened afterwards see it atomically.
+        """
+        target_dir = self._snapshot_dir(name)
+
+        with self.db.archive_lock:
+            for live_path in self._database_files():
+                gz_path = target_dir / f"{live_path.name}.gz"
+                if not gz_path.exists():
+                    continue
+
+                scratch = target_dir / f".restore-{live_path.name}"
+                try:
+                    self._decompress(gz_path, scratch)
+                    self._check_integrity(scratch)
+
+                    source = sqlite3.connect(scratch)
+                    live = sqlite3.connect(live_path)
+                    try:
+                        source.backup(live)
+                    finally:
+                        live.close()
+                        source.close()
+                finally:
+                    scratch.unlink(missing_ok=True)
+
+        # Reload horizon/columns and run any pending migrations on the restored data
+        self.db.initialize_db()
+        logger.info(f"Restored backup {name}")
+
+    async def run_forever(self, interval_seconds: float):
+        """Take a snapshot now and then every interval until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.create_snapshot)
+            except Exception as e:
+                logger.error(f"Backup failed: {e}")
+
+            await asyncio.sleep(interval_seconds)
+
+
+# Global instance
+backup_service = BackupService(
+    db_service,
+    backup_dir=settings.BACKUP_DIR,
+    keep=settings.BACKUP_KEEP,
+    pages_per_step=settings.BACKUP_PAGES_PER_STEP
+)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="FatoorahBot database backups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backup", help="Take a snapshot now")
+    commands.add_parser("list", help="List snapshots, newest first")
+    commands.add_parser("verify", help="Check a snapshot's integrity").add_argument("snapshot")
+    commands.add_parser("restore", help="Replace the live databases with a snapshot").add_argument("snapshot")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.command == "backup":
+        print(backup_service.create_snapshot().name)
+    elif args.command == "list":
+        for name in backup_service.list_snapshots():
+            print(name)
+    elif args.command == "verify":
+        return 0 if backup_service.verify_snapshot(args.snapshot) else 1
+    elif args.command == "restore":
+        backup_service.restore_snapshot(args.snapshot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,70 +2,308 @@
 Database Service
 SQLite database for storing invoices and items per user
 """
+import re
 import sqlite3
 import logging
+import threading
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from pathlib import Path
 from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money, MINOR_UNITS
+from utils.dates import iso_date
+from utils.text_normalization import normalize_identifier, normalize_text
 
 logger = logging.getLogger(__name__)
 
+# Schema version kept in PRAGMA user_version
+# 1: money columns hold INTEGER halalas instead of REAL riyals
+# 2: delete triggers skip rows being moved to the archive
+# 3: invoice dates are stored as YYYY-MM-DD
+SCHEMA_VERSION = 3
+
+INVOICES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        supplier_name TEXT,
+        tax_number TEXT,
+        invoice_number TEXT,
+        invoice_date TEXT,
+        subtotal INTEGER DEFAULT 0,
+        discount INTEGER DEFAULT 0,
+        tax_amount INTEGER DEFAULT 0,
+        total_amount INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+INVOICE_ITEMS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        item_name TEXT,
+        quantity REAL DEFAULT 0,
+        unit TEXT,
+        unit_price INTEGER DEFAULT 0,
+        total INTEGER DEFAULT 0,
+        invoice_date TEXT,
+        catalog_id INTEGER,
+        FOREIGN KEY (invoice_id) REFERENCES invoices (id),
+        FOREIGN KEY (catalog_id) REFERENCES items_catalog (id)
+    )
+"""
+
+# Money columns (stored in halalas) per table
+MONEY_COLUMNS = {
+    "invoices": ("subtotal", "discount", "tax_amount", "total_amount"),
+    "invoice_items": ("unit_price", "total"),
+}
+
+# Column order of the lightweight tuples yielded by the streaming queries
+INVOICE_COLUMNS = (
+    "id", "supplier_name", "tax_number", "invoice_number", "invoice_date",
+    "subtotal", "discount", "tax_amount", "total_amount"
+)
+ITEM_COLUMNS = (
+    "id", "invoice_id", "item_name", "quantity", "unit",
+    "unit_price", "total", "invoice_date"
+)
+
+# Column order of the invoice + item rows of the combined export: one row per
+# item, or a single row with NULL item columns for an invoice without items
+INVOICE_LINE_COLUMNS = INVOICE_COLUMNS + (
+    "item_id", "item_name", "quantity", "unit", "unit_price", "item_total"
+)
+
+# Column order of the summary rows of the combined export
+MONTHLY_SUMMARY_COLUMNS = ("month", "invoice_count") + MONEY_COLUMNS["invoices"]
+SUPPLIER_SUMMARY_COLUMNS = ("supplier_name", "tax_number", "invoice_count") + MONEY_COLUMNS["invoices"]
+
+KEYSET_COLUMNS = {
+    "invoices": INVOICE_COLUMNS,
+    "invoice_items": ITEM_COLUMNS,
+}
+
+# Default number of rows fetched per keyset page
+STREAM_CHUNK_SIZE = 1000
+
+# Tables whose old rows move to the archive database
+ARCHIVED_TABLES = ("invoices", "invoice_items")
+
+# Invoices moved per archive transaction
+ARCHIVE_BATCH_SIZE = 1000
+
+# Delete triggers must not undo summaries/search/versions for rows that are only moving
+UNLESS_ARCHIVING = "WHEN NOT (SELECT moving FROM archive_state)"
+
+
+class DuplicateInvoiceError(Exception):
+    """Raised when a user saves an invoice number + tax number they already saved."""
+    
+    def __init__(self, invoice_id: int):
+        super().__init__(f"Duplicate of invoice {invoice_id}")
+        self.invoice_id = invoice_id
+
+
+def invoice_key(invoice_number: str, tax_number: str) -> Optional[Tuple[str, str]]:
+    """Normalized (tax_key, invoice_key), or None if either number is missing."""
+    tax_key = normalize_identifier(tax_number)
+    number_key = normalize_identifier(invoice_number)
+    if not tax_key or not number_key:
+        return None
+    return tax_key, number_key
+
+
+def page_cursor(table: str, row: Tuple) -> Tuple:
+    """Keyset position (date key, id) of a streamed row; see date_key_sql."""
+    return iso_date(row[KEYSET_COLUMNS[table].index("invoice_date")]) or "", row[0]
+
+# Money columns rolled up into the per-user summary tables
+STATS_COLUMNS = MONEY_COLUMNS["invoices"]
+
+
+def iso_date_sql(column: str) -> str:
+    """
+    SQL expression normalizing a stored invoice date to YYYY-MM-DD.
+    
+    Handles YYYY-MM-DD / YYYY/MM/DD and the DD/MM/YYYY format returned
+    by OCR; anything else evaluates to NULL.
+    """
+    return f"""(CASE
+        WHEN {column} GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*'
+            THEN substr({column}, 1, 4) || '-' || substr({column}, 6, 2) || '-' || substr({column}, 9, 2)
+        WHEN {column} GLOB '[0-9][0-9][-/][0-9][0-9][-/][0-9][0-9][0-9][0-9]*'
+            THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)
+    END)"""
+
+
+def month_sql(column: str) -> str:
+    """SQL expression giving the YYYY-MM month of a stored date ('' if unknown)."""
+    return f"COALESCE(substr({iso_date_sql(column)}, 1, 7), '')"
+
+
+def date_key_sql(column: str) -> str:
+    """
+    SQL expression giving the sort key of a stored date: YYYY-MM-DD, or '' if unknown.
+    
+    Keyset pages are ordered and sought on (key, id): chronological for
+    every stored format, and undated rows sort last instead of being
+    skipped by the row-value comparison as NULLs would be.
+    """
+    return f"COALESCE({iso_date_sql(column)}, '')"
+
+
+# Sort key of invoice and item rows, indexed together with user_id and id
+DATE_KEY = date_key_sql("invoice_date")
+
+
+def date_range_sql(start_date: Optional[str], end_date: Optional[str], params: List) -> str:
+    """
+    Conditions keeping rows dated within start_date..end_date (YYYY-MM-DD, either optional).
+    
+    Undated rows only match when there is no range. Appends the bound
+    values to params.
+    """
+    conditions = ""
+    if start_date:
+        conditions += f" AND {DATE_KEY} >= ?"
+        params.append(start_date)
+    if end_date:
+        # '0' is above the '' key of undated rows
+        conditions += f" AND {DATE_KEY} BETWEEN '0' AND ?"
+        params.append(end_date)
+    return conditions
+
+
+# Summary tables: (table, key column, key expression over an invoices row)
+STATS_TABLES = (
+    ("user_monthly_stats", "month", month_sql("{row}.invoice_date")),
+    ("user_supplier_stats", "supplier_name", "COALESCE({row}.supplier_name, '')"),
+)
+
 
 class DatabaseService:
     """Service for managing invoice database."""
     
-    def __init__(self, db_path: str = "data/invoices.db"):
+    def __init__(self, db_path: str = "data/invoices.db", archive_path: Optional[str] = None):
         """Initialize database service."""
         self.db_path = db_path
+        self.archive_path = archive_path or str(Path(db_path).with_name(f"{Path(db_path).stem}_archive.db"))
+        self._archive_columns: Dict[str, str] = {}
+        # Held while rows move between the hot and archive files (and by backups)
+        self.archive_lock = threading.Lock()
+        # user_id -> saved (tax_key, invoice_key) pairs, for O(1) "not a duplicate" answers
+        self._known_keys: Dict[int, Set[Tuple[str, str]]] = {}
         # Create data directory if not exists
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self.initialize_db()
     
-    def get_connection(self) -> sqlite3.Connection:
-        """Get database connection."""
+    def get_connection(self, with_archive: bool = False) -> sqlite3.Connection:
+        """
+        Get database connection.
+        
+        Args:
+            with_archive: Attach the archive database and expose
+                invoices_all / invoice_items_all views over hot + archived rows
+        """
         conn = sqlite3.Connection(self.db_path)
         conn.row_factory = sqlite3.Row
+        # Used by the full-text search and duplicate key triggers
+        conn.create_function("normalize_text", 1, normalize_text, deterministic=True)
+        conn.create_function("normalize_identifier", 1, normalize_identifier, deterministic=True)
+        
+        if with_archive:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            for table, columns in self._archive_columns.items():
+                conn.execute(f"""
+                    CREATE TEMP VIEW {table}_all AS
+                    SELECT {columns} FROM main.{table}
+                    UNION ALL
+                    SELECT {columns} FROM archive.{table}
+                """)
         return conn
     
+    def _open_range(self, start_date: Optional[str] = None) -> Tuple[sqlite3.Connection, str, str]:
+        """
+        Open a connection for reading rows dated from start_date on (all time if None).
+        
+        Returns:
+            (connection, invoices source, items source); the sources include
+            archived rows only when the range reaches past the archive horizon
+        """
+        # ATTACH is not allowed inside a transaction, so the archive is attached
+        # up front whichever tables the range needs
+        conn = self.get_connection(with_archive=True)
+        # The horizon is shared by every process using the file, so it is read
+        # per query, in the same transaction as the rows: an archive run
+        # committing in between cannot move rows out of this read
+        conn.execute("BEGIN")
+        horizon = self.get_archive_horizon(conn)
+        if horizon is None or (start_date and start_date >= horizon):
+            return conn, "invoices", "invoice_items"
+        return conn, "invoices_all", "invoice_items_all"
+    
+    @staticmethod
+    def get_archive_horizon(conn: sqlite3.Connection) -> Optional[str]:
+        """Date (YYYY-MM-DD) before which invoices live in the archive, or None if nothing is archived."""
+        return conn.execute("SELECT horizon FROM archive_state").fetchone()[0]
+    
     def initialize_db(self):
         """Create tables if they don't exist."""
-        conn = self.get_connection()
+        conn = self.get_connection(with_archive=True)
         cursor = conn.cursor()
         
+        cursor.execute("PRAGMA user_version")
+        schema_version = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'invoices'"
+        )
+        is_new_db = cursor.fetchone()[0] == 0
+        
+        # Let scheduled incremental vacuums return freed pages to the filesystem
+        cursor.execute("PRAGMA auto_vacuum")
+        needs_vacuum = cursor.fetchone()[0] != 2 and not is_new_db
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
         # Invoices table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                supplier_name TEXT,
-                tax_number TEXT,
-                invoice_number TEXT,
-                invoice_date TEXT,
-                subtotal REAL DEFAULT 0,
-                discount REAL DEFAULT 0,
-                tax_amount REAL DEFAULT 0,
-                total_amount REAL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        cursor.execute(INVOICES_TABLE_SQL.format(name="invoices"))
         
         # Invoice items table
+        cursor.execute(INVOICE_ITEMS_TABLE_SQL.format(name="invoice_items"))
+        
+        # Items catalog: one row per distinct (normalized name, unit) per user
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS invoice_items (
+            CREATE TABLE IF NOT EXISTS items_catalog (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_id INTEGER NOT NULL,
                 user_id INTEGER NOT NULL,
-                item_name TEXT,
-                quantity REAL DEFAULT 0,
+                normalized_name TEXT NOT NULL,
+                unit_key TEXT NOT NULL DEFAULT '',
+                canonical_name TEXT,
                 unit TEXT,
-                unit_price REAL DEFAULT 0,
-                total REAL DEFAULT 0,
-                invoice_date TEXT,
-                FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, normalized_name, unit_key)
             )
         """)
         
+        # Databases created before the catalog existed lack the reference column
+        cursor.execute("PRAGMA table_info(invoice_items)")
+        if "catalog_id" not in [col["name"] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE invoice_items ADD COLUMN catalog_id INTEGER REFERENCES items_catalog (id)")
+        
+        if not is_new_db and schema_version < 1:
+            self._migrate_money_to_minor_units(conn)
+        if schema_version < 2:
+            # Recreated below with the UNLESS_ARCHIVING condition
+            for trigger in (
+                "trg_user_monthly_stats_delete", "trg_user_supplier_stats_delete",
+                "trg_data_versions_delete", "trg_invoice_search_delete",
+                "trg_invoice_search_item_delete"
+            ):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
         # Create indexes for better performance
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_invoices_user_id 
@@ -87,21 +325,510 @@ class DatabaseService:
             ON invoice_items(invoice_date)
         """)
         
+        # Keyset pagination indexes on the normalized date key (see date_key_sql)
+        cursor.execute("DROP INDEX IF EXISTS idx_invoices_user_date")
+        cursor.execute("DROP INDEX IF EXISTS idx_items_user_date")
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_invoices_user_day 
+            ON invoices(user_id, {DATE_KEY}, id)
+        """)
+        
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_items_user_day 
+            ON invoice_items(user_id, {DATE_KEY}, id)
+        """)
+        
+        # Covering index for per-item aggregates (top items by spend/quantity)
+        cursor.execute("DROP INDEX IF EXISTS idx_items_user_name")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_items_user_catalog 
+            ON invoice_items(user_id, catalog_id, total, quantity)
+        """)
+        
+        # Price history lookups per catalog item
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_items_catalog_date 
+            ON invoice_items(catalog_id, invoice_date)
+        """)
+        
+        # Items of an invoice, for the invoice + item join of the combined export
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_items_invoice 
+            ON invoice_items(invoice_id)
+        """)
+        
+        self._backfill_catalog(cursor)
+        self._create_search_index(cursor)
+        
+        stats_created = self._create_stats_tables(cursor)
+        self._create_version_table(cursor)
+        self._create_subscriptions_table(cursor)
+        self._create_archive(cursor)
+        if not is_new_db and schema_version < 3:
+            self._migrate_dates_to_iso(cursor)
+        self._create_invoice_keys(cursor)
+        self._load_invoice_keys(cursor)
+        
         conn.commit()
+        
+        if needs_vacuum:
+            logger.info("Rebuilding database file to enable incremental vacuum...")
+            conn.execute("VACUUM")
         conn.close()
+        
+        if stats_created:
+            self.rebuild_stats()
+        
         logger.info("Database initialized successfully")
     
-    def save_invoice(self, user_id: int, invoice: InvoiceData) -> int:
+    def _migrate_money_to_minor_units(self, conn: sqlite3.Connection):
+        """
+        Convert REAL riyal amounts to INTEGER halalas (schema version 1).
+        
+        SQLite cannot change column types in place, so invoices and
+        invoice_items are rebuilt with their IDs preserved. Summary
+        tables are dropped and get rebuilt from the converted rows.
+        """
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        
+        try:
+            for table, ddl in (
+                ("invoices", INVOICES_TABLE_SQL),
+                ("invoice_items", INVOICE_ITEMS_TABLE_SQL),
+            ):
+                cursor.execute(ddl.format(name=f"{table}_new"))
+                cursor.execute(f"PRAGMA table_info({table}_new)")
+                columns = [col["name"] for col in cursor.fetchall()]
+                
+                select = ", ".join(
+                    f"CAST(ROUND({col} * {MINOR_UNITS}) AS INTEGER)" if col in MONEY_COLUMNS[table] else col
+                    for col in columns
+                )
+                cursor.execute(f"""
+                    INSERT INTO {table}_new ({", ".join(columns)})
+                    SELECT {select} FROM {table}
+                """)
+                migrated = cursor.rowcount
+                
+                # Dropping the table also drops its indexes and triggers; both are recreated
+                cursor.execute(f"DROP TABLE {table}")
+                cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+                logger.info(f"Migrated {migrated} {table} rows to integer halalas")
+            
+            for table, _, _ in STATS_TABLES:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Failed to migrate money columns: {e}")
+            raise
+    
+    def _migrate_dates_to_iso(self, cursor: sqlite3.Cursor):
+        """
+        Rewrite stored invoice dates as YYYY-MM-DD (schema version 3).
+        
+        Dates in a format iso_date_sql does not know are left as they are.
+        Months are unchanged, so the summary tables stay correct.
+        """
+        iso = iso_date_sql("invoice_date")
+        for schema in ("main", "archive"):
+            for table in ARCHIVED_TABLES:
+                cursor.execute(f"""
+                    UPDATE {schema}.{table} SET invoice_date = {iso}
+                    WHERE {iso} <> invoice_date
+                """)
+                logger.info(f"Normalized {cursor.rowcount} {schema}.{table} dates to YYYY-MM-DD")
+    
+    def _create_stats_tables(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        Create per-user summary tables and the triggers that maintain them.
+        
+        Returns:
+            True if the summary tables were newly created and need a backfill
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'user_monthly_stats'"
+        )
+        exists = cursor.fetchone()[0] > 0
+        
+        money_columns = ",\n".join(f"{col} INTEGER DEFAULT 0" for col in STATS_COLUMNS)
+        
+        # Per-user, per-month totals
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS user_monthly_stats (
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                invoice_count INTEGER DEFAULT 0,
+                {money_columns},
+                PRIMARY KEY (user_id, month)
+            ) WITHOUT ROWID
+        """)
+        
+        # Per-user, per-supplier totals
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS user_supplier_stats (
+                user_id INTEGER NOT NULL,
+                supplier_name TEXT NOT NULL,
+                invoice_count INTEGER DEFAULT 0,
+                {money_columns},
+                PRIMARY KEY (user_id, supplier_name)
+            ) WITHOUT ROWID
+        """)
+        
+        # Triggers keep both tables in step with every write to invoices
+        for table, key_column, key_template in STATS_TABLES:
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_insert
+                AFTER INSERT ON invoices
+                BEGIN
+                    {self._stats_apply_sql(table, key_column, key_template, "NEW", "+")}
+                END
+            """)
+            
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_delete
+                AFTER DELETE ON invoices {UNLESS_ARCHIVING}
+                BEGIN
+                    {self._stats_apply_sql(table, key_column, key_template, "OLD", "-")}
+                END
+            """)
+            
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_update
+                AFTER UPDATE OF user_id, supplier_name, invoice_date, {", ".join(STATS_COLUMNS)}
+                ON invoices
+                BEGIN
+                    {self._stats_apply_sql(table, key_column, key_template, "OLD", "-")}
+                    {self._stats_apply_sql(table, key_column, key_template, "NEW", "+")}
+                END
+            """)
+        
+        return not exists
+    
+    def _create_version_table(self, cursor: sqlite3.Cursor):
+        """Create per-user data version counters bumped on every invoice write."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            condition = UNLESS_ARCHIVING if event == "DELETE" else ""
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_data_versions_{event.lower()}
+                AFTER {event} ON invoices {condition}
+                BEGIN
+                    INSERT OR IGNORE INTO data_versions (user_id) VALUES ({row}.user_id);
+                    UPDATE data_versions SET version = version + 1 WHERE user_id = {row}.user_id;
+                END
+            """)
+    
+    def _create_subscriptions_table(self, cursor: sqlite3.Cursor):
+        """Create the scheduled report subscriptions table."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS report_subscriptions (
+                user_id INTEGER NOT NULL,
+                report TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                last_period TEXT NOT NULL DEFAULT '',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, report)
+            )
+        """)
+    
+    def _create_archive(self, cursor: sqlite3.Cursor):
+        """
+        Create the archive tables in the attached archive database.
+        
+        Old invoices keep their IDs when moved, so archived rows still match
+        their search index entries and AUTOINCREMENT never reuses them.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archive_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                horizon TEXT,
+                moving INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO archive_state (id) VALUES (1)")
+        
+        cursor.execute(INVOICES_TABLE_SQL.format(name="archive.invoices"))
+        cursor.execute(INVOICE_ITEMS_TABLE_SQL.format(name="archive.invoice_items"))
+        
+        cursor.execute("DROP INDEX IF EXISTS archive.idx_invoices_user_date")
+        cursor.execute("DROP INDEX IF EXISTS archive.idx_items_user_date")
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS archive.idx_invoices_user_day 
+            ON invoices(user_id, {DATE_KEY}, id)
+        """)
+        
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS archive.idx_items_user_day 
+            ON invoice_items(user_id, {DATE_KEY}, id)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS archive.idx_items_user_catalog 
+            ON invoice_items(user_id, catalog_id, total, quantity)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS archive.idx_items_catalog_date 
+            ON invoice_items(catalog_id, invoice_date)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS archive.idx_items_invoice 
+            ON invoice_items(invoice_id)
+        """)
+        
+        for table in ARCHIVED_TABLES:
+            cursor.execute(f"PRAGMA main.table_info({table})")
+            self._archive_columns[table] = ", ".join(col["name"] for col in cursor.fetchall())
+    
+    def _create_invoice_keys(self, cursor: sqlite3.Cursor):
+        """
+        Create the unique (user, tax number, invoice number) key table.
+        
+        It lives in the hot database only, so uniqueness also covers
+        archived invoices. On first creation the oldest invoice of each key
+        claims it; duplicates saved earlier stay without a key.
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'invoice_keys'"
+        )
+        exists = cursor.fetchone()[0] > 0
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS invoice_keys (
+                user_id INTEGER NOT NULL,
+                tax_key TEXT NOT NULL,
+                invoice_key TEXT NOT NULL,
+                invoice_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, tax_key, invoice_key)
+            ) WITHOUT ROWID
+        """)
+        
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_keys_delete
+            AFTER DELETE ON invoices {UNLESS_ARCHIVING}
+            BEGIN
+                DELETE FROM invoice_keys WHERE user_id = OLD.user_id AND invoice_id = OLD.id;
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_keys_update
+            AFTER UPDATE OF user_id, invoice_number, tax_number ON invoices
+            BEGIN
+                DELETE FROM invoice_keys WHERE user_id = OLD.user_id AND invoice_id = OLD.id;
+                INSERT OR IGNORE INTO invoice_keys (user_id, tax_key, invoice_key, invoice_id)
+                SELECT NEW.user_id, normalize_identifier(NEW.tax_number),
+                       normalize_identifier(NEW.invoice_number), NEW.id
+                WHERE normalize_identifier(NEW.tax_number) != ''
+                  AND normalize_identifier(NEW.invoice_number) != '';
+            END
+        """)
+        
+        if not exists:
+            cursor.execute("""
+                INSERT OR IGNORE INTO invoice_keys (user_id, tax_key, invoice_key, invoice_id)
+                SELECT user_id, tax_key, invoice_key, id FROM (
+                    SELECT id, user_id, normalize_identifier(tax_number) AS tax_key,
+                           normalize_identifier(invoice_number) AS invoice_key
+                    FROM main.invoices
+                    UNION ALL
+                    SELECT id, user_id, normalize_identifier(tax_number),
+                           normalize_identifier(invoice_number)
+                    FROM archive.invoices
+                )
+                WHERE tax_key != '' AND invoice_key != ''
+                ORDER BY id
+            """)
+            logger.info(f"Indexed {cursor.rowcount} invoice keys for duplicate detection")
+    
+    def _load_invoice_keys(self, cursor: sqlite3.Cursor):
+        """Warm the in-memory duplicate filter from the key table."""
+        known_keys: Dict[int, Set[Tuple[str, str]]] = {}
+        cursor.execute("SELECT user_id, tax_key, invoice_key FROM invoice_keys")
+        for user_id, tax_key, number_key in cursor:
+            known_keys.setdefault(user_id, set()).add((tax_key, number_key))
+        self._known_keys = known_keys
+    
+    def _backfill_catalog(self, cursor: sqlite3.Cursor):
+        """Link items saved before the catalog existed to catalog entries."""
+        cursor.execute("""
+            SELECT DISTINCT user_id, item_name, unit FROM invoice_items
+            WHERE catalog_id IS NULL
+        """)
+        pending = cursor.fetchall()
+        
+        for row in pending:
+            catalog_id = self._get_catalog_id(cursor, row["user_id"], row["item_name"], row["unit"])
+            cursor.execute("""
+                UPDATE invoice_items SET catalog_id = ?
+                WHERE catalog_id IS NULL AND user_id = ? AND item_name IS ? AND unit IS ?
+            """, (catalog_id, row["user_id"], row["item_name"], row["unit"]))
+        
+        if pending:
+            logger.info(f"Linked {len(pending)} item names to the items catalog")
+    
+    def _create_search_index(self, cursor: sqlite3.Cursor):
+        """
+        Create the FTS5 index over invoices and the triggers that sync it.
+        
+        One document per invoice (rowid = invoice id) holding normalized
+        supplier name, invoice number and item names. The owner column
+        carries a 'u<user_id>' token so searches stay within one user.
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'invoice_search'"
+        )
+        exists = cursor.fetchone()[0] > 0
+        
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(
+                owner, supplier_name, invoice_number, items
+            )
+        """)
+        
+        items_of = """(
+            SELECT COALESCE(group_concat(normalize_text(item_name), ' '), '')
+            FROM invoice_items WHERE invoice_id = {invoice_id}
+        )"""
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_search_insert
+            AFTER INSERT ON invoices
+            BEGIN
+                INSERT INTO invoice_search (rowid, owner, supplier_name, invoice_number, items)
+                VALUES (
+                    NEW.id, 'u' || NEW.user_id,
+                    normalize_text(NEW.supplier_name), normalize_text(NEW.invoice_number), ''
+                );
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_search_update
+            AFTER UPDATE OF user_id, supplier_name, invoice_number ON invoices
+            BEGIN
+                UPDATE invoice_search SET
+                    owner = 'u' || NEW.user_id,
+                    supplier_name = normalize_text(NEW.supplier_name),
+                    invoice_number = normalize_text(NEW.invoice_number)
+                WHERE rowid = NEW.id;
+            END
+        """)
+        
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_search_delete
+            AFTER DELETE ON invoices {UNLESS_ARCHIVING}
+            BEGIN
+                DELETE FROM invoice_search WHERE rowid = OLD.id;
+            END
+        """)
+        
+        # Items are appended as they are saved; edits rebuild the invoice's item text
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_search_item_insert
+            AFTER INSERT ON invoice_items
+            BEGIN
+                UPDATE invoice_search
+                SET items = trim(items || ' ' || normalize_text(NEW.item_name))
+                WHERE rowid = NEW.invoice_id;
+            END
+        """)
+        
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_search_item_update
+            AFTER UPDATE OF item_name, invoice_id ON invoice_items
+            BEGIN
+                UPDATE invoice_search SET items = {items_of.format(invoice_id="OLD.invoice_id")}
+                WHERE rowid = OLD.invoice_id;
+                UPDATE invoice_search SET items = {items_of.format(invoice_id="NEW.invoice_id")}
+                WHERE rowid = NEW.invoice_id;
+            END
+        """)
+        
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_invoice_search_item_delete
+            AFTER DELETE ON invoice_items {UNLESS_ARCHIVING}
+            BEGIN
+                UPDATE invoice_search SET items = {items_of.format(invoice_id="OLD.invoice_id")}
+                WHERE rowid = OLD.invoice_id;
+            END
+        """)
+        
+        if not exists:
+            cursor.execute(f"""
+                INSERT INTO invoice_search (rowid, owner, supplier_name, invoice_number, items)
+                SELECT id, 'u' || user_id, normalize_text(supplier_name),
+                       normalize_text(invoice_number), {items_of.format(invoice_id="invoices.id")}
+                FROM invoices
+            """)
+            logger.info(f"Indexed {cursor.rowcount} invoices for full-text search")
+    
+    @staticmethod
+    def _get_catalog_id(cursor: sqlite3.Cursor, user_id: int, name: str, unit: str) -> int:
+        """Get catalog ID for an item name/unit, creating the entry on first sight."""
+        normalized_name = normalize_text(name)
+        unit_key = normalize_text(unit)
+        
+        cursor.execute("""
+            INSERT OR IGNORE INTO items_catalog (
+                user_id, normalized_name, unit_key, canonical_name, unit
+            ) VALUES (?, ?, ?, ?, ?)
+        """, (user_id, normalized_name, unit_key, name, unit))
+        
+        cursor.execute("""
+            SELECT id FROM items_catalog
+            WHERE user_id = ? AND normalized_name = ? AND unit_key = ?
+        """, (user_id, normalized_name, unit_key))
+        return cursor.fetchone()[0]
+    
+    @staticmethod
+    def _stats_apply_sql(table: str, key_column: str, key_template: str, row: str, sign: str) -> str:
+        """Trigger body adding (+) or removing (-) one invoice row from a summary table."""
+        key = key_template.format(row=row)
+        deltas = ", ".join(f"{col} = {col} {sign} {row}.{col}" for col in STATS_COLUMNS)
+        
+        statements = [
+            f"INSERT OR IGNORE INTO {table} (user_id, {key_column}) VALUES ({row}.user_id, {key});",
+            f"UPDATE {table} SET invoice_count = invoice_count {sign} 1, {deltas} "
+            f"WHERE user_id = {row}.user_id AND {key_column} = {key};",
+        ]
+        if sign == "-":
+            statements.append(
+                f"DELETE FROM {table} WHERE user_id = {row}.user_id "
+                f"AND {key_column} = {key} AND invoice_count <= 0;"
+            )
+        return "\n".join(statements)
+    
+    def save_invoice(self, user_id: int, invoice: InvoiceData, allow_duplicate: bool = False) -> int:
         """
         Save invoice to database.
         
+        The duplicate check is part of the insert: the invoice claims its
+        (tax number, invoice number) key in the same transaction.
+        
         Args:
             user_id: Telegram user ID
             invoice: Invoice data
+            allow_duplicate: Save even if the key is already taken
             
         Returns:
             invoice_id: ID of saved invoice
+            
+        Raises:
+            DuplicateInvoiceError: If the key is taken and allow_duplicate is False
         """
+        key = invoice_key(invoice.invoice_number, invoice.tax_number)
+        invoice_date = iso_date(invoice.invoice_date) or invoice.invoice_date
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -117,37 +844,59 @@ class DatabaseService:
                 invoice.supplier_name,
                 invoice.tax_number,
                 invoice.invoice_number,
-                invoice.invoice_date,
-                invoice.subtotal,
-                invoice.discount,
-                invoice.tax_amount,
-                invoice.total_amount
+                invoice_date,
+                Money.of(invoice.subtotal),
+                Money.of(invoice.discount),
+                Money.of(invoice.tax_amount),
+                Money.of(invoice.total_amount)
             ))
             
             invoice_id = cursor.lastrowid
             
+            if key:
+                cursor.execute("""
+                    INSERT INTO invoice_keys (user_id, tax_key, invoice_key, invoice_id)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
+                """, (user_id, *key, invoice_id))
+                
+                if cursor.rowcount == 0 and not allow_duplicate:
+                    cursor.execute("""
+                        SELECT invoice_id FROM invoice_keys
+                        WHERE user_id = ? AND tax_key = ? AND invoice_key = ?
+                    """, (user_id, *key))
+                    raise DuplicateInvoiceError(cursor.fetchone()[0])
+            
             # Insert items
             for item in invoice.items:
+                catalog_id = self._get_catalog_id(cursor, user_id, item.name, item.unit)
                 cursor.execute("""
                     INSERT INTO invoice_items (
                         invoice_id, user_id, item_name, quantity,
-                        unit, unit_price, total, invoice_date
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        unit, unit_price, total, invoice_date, catalog_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     invoice_id,
                     user_id,
                     item.name,
                     item.quantity,
                     item.unit,
-                    item.unit_price,
-                    item.total,
-                    invoice.invoice_date
+                    Money.of(item.unit_price),
+                    Money.of(item.total),
+                    invoice_date,
+                    catalog_id
                 ))
             
             conn.commit()
+            if key:
+                self._known_keys.setdefault(user_id, set()).add(key)
             logger.info(f"Saved invoice {invoice_id} for user {user_id}")
             return invoice_id
             
+        except DuplicateInvoiceError as e:
+            conn.rollback()
+            logger.info(f"Rejected duplicate of invoice {e.invoice_id} for user {user_id}")
+            raise
         except Exception as e:
             conn.rollback()
             logger.error(f"Failed to save invoice: {e}")
@@ -172,21 +921,15 @@ class DatabaseService:
         Returns:
             List of invoice tuples
         """
-        conn = self.get_connection()
+        conn, invoices, _ = self._open_range(start_date)
         cursor = conn.cursor()
         
-        query = "SELECT * FROM invoices WHERE user_id = ?"
+        query = f"SELECT * FROM {invoices} WHERE user_id = ?"
         params = [user_id]
         
-        if start_date:
-            query += " AND invoice_date >= ?"
-            params.append(start_date)
+        query += date_range_sql(start_date, end_date, params)
         
-        if end_date:
-            query += " AND invoice_date <= ?"
-            params.append(end_date)
-        
-        query += " ORDER BY invoice_date DESC, created_at DESC"
+        query += f" ORDER BY {DATE_KEY} DESC, created_at DESC"
         
         cursor.execute(query, params)
         invoices = cursor.fetchall()
@@ -211,21 +954,15 @@ class DatabaseService:
         Returns:
             List of item tuples
         """
-        conn = self.get_connection()
+        conn, _, items = self._open_range(start_date)
         cursor = conn.cursor()
         
-        query = "SELECT * FROM invoice_items WHERE user_id = ?"
+        query = f"SELECT * FROM {items} WHERE user_id = ?"
         params = [user_id]
         
-        if start_date:
-            query += " AND invoice_date >= ?"
-            params.append(start_date)
+        query += date_range_sql(start_date, end_date, params)
         
-        if end_date:
-            query += " AND invoice_date <= ?"
-            params.append(end_date)
-        
-        query += " ORDER BY invoice_date DESC"
+        query += f" ORDER BY {DATE_KEY} DESC, id DESC"
         
         cursor.execute(query, params)
         items = cursor.fetchall()
@@ -233,19 +970,499 @@ class DatabaseService:
         
         return items
     
+    def iter_user_invoices(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[Tuple]:
+        """
+        Stream user's invoices newest first using keyset pagination.
+        
+        Rows are plain tuples ordered as INVOICE_COLUMNS, fetched
+        chunk_size at a time on (date key, id), so memory stays
+        constant regardless of how many invoices the user has.
+        
+        Args:
+            user_id: Telegram user ID
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            chunk_size: Rows fetched per page
+            
+        Yields:
+            Invoice tuples
+        """
+        yield from self._iter_keyset("invoices", user_id, start_date, end_date, chunk_size)
+    
+    def iter_user_items(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[Tuple]:
+        """
+        Stream user's items newest first using keyset pagination.
+        
+        Args:
+            user_id: Telegram user ID
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            chunk_size: Rows fetched per page
+            
+        Yields:
+            Item tuples ordered as ITEM_COLUMNS
+        """
+        yield from self._iter_keyset("invoice_items", user_id, start_date, end_date, chunk_size)
+    
+    def get_keyset_page(
+        self,
+        table: str,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        """
+        Fetch one page of user's invoices or items, newest first.
+        
+        Args:
+            table: "invoices" or "invoice_items"
+            user_id: Telegram user ID
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            after: page_cursor() of the last row of the previous page
+            limit: Maximum rows to return
+            
+        Returns:
+            Row tuples ordered as KEYSET_COLUMNS[table]
+        """
+        conn, invoices, items = self._open_range(start_date)
+        source = invoices if table == "invoices" else items
+        columns = KEYSET_COLUMNS[table]
+        query = f"SELECT {', '.join(columns)} FROM {source} WHERE user_id = ?"
+        params = [user_id]
+        
+        query += date_range_sql(start_date, end_date, params)
+        
+        if after is not None:
+            query += f" AND ({DATE_KEY}, id) < (?, ?)"
+            params.extend(after)
+        
+        query += f" ORDER BY {DATE_KEY} DESC, id DESC LIMIT ?"
+        params.append(limit)
+        
+        conn.row_factory = None
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+    
+    def _iter_keyset(
+        self,
+        table: str,
+        user_id: int,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        chunk_size: int
+    ) -> Iterator[Tuple]:
+        """Yield rows of table page by page, seeking past the last (date key, id)."""
+        after = None
+        while True:
+            rows = self.get_keyset_page(table, user_id, start_date, end_date, after, chunk_size)
+            yield from rows
+            
+            if len(rows) < chunk_size:
+                break
+            
+            after = page_cursor(table, rows[-1])
+    
+    def get_invoice_lines_page(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        """
+        Fetch one page of user's invoices joined with their items, newest first.
+        
+        A page holds up to limit invoices with all of their items; items
+        follow their invoice in id order.
+        
+        Args:
+            user_id: Telegram user ID
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            after: page_cursor("invoices", ...) of the last invoice of the previous page
+            limit: Maximum invoices to return
+            
+        Returns:
+            Row tuples ordered as INVOICE_LINE_COLUMNS
+        """
+        conn, invoices, items = self._open_range(start_date)
+        query = f"SELECT {', '.join(INVOICE_COLUMNS)}, {DATE_KEY} AS date_key FROM {invoices} WHERE user_id = ?"
+        params = [user_id]
+        
+        query += date_range_sql(start_date, end_date, params)
+        
+        if after is not None:
+            query += f" AND ({DATE_KEY}, id) < (?, ?)"
+            params.extend(after)
+        
+        query += f" ORDER BY {DATE_KEY} DESC, id DESC LIMIT ?"
+        params.append(limit)
+        
+        invoice_columns = ", ".join(f"page.{col}" for col in INVOICE_COLUMNS)
+        conn.row_factory = None
+        try:
+            return conn.execute(f"""
+                WITH page AS ({query})
+                SELECT {invoice_columns},
+                       it.id, it.item_name, it.quantity, it.unit, it.unit_price, it.total
+                FROM page
+                LEFT JOIN {items} it ON it.invoice_id = page.id
+                ORDER BY page.date_key DESC, page.id DESC, it.id
+            """, params).fetchall()
+        finally:
+            conn.close()
+    
+    def _get_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        group_columns: str,
+        order_by: str
+    ) -> List[Tuple]:
+        """Invoice count and money totals of user's invoices grouped by an expression."""
+        conn, invoices, _ = self._open_range(start_date)
+        sums = ", ".join(f"SUM({col})" for col in STATS_COLUMNS)
+        query = f"SELECT {group_columns}, COUNT(*), {sums} FROM {invoices} WHERE user_id = ?"
+        params = [user_id]
+        
+        query += date_range_sql(start_date, end_date, params)
+        
+        query += f" GROUP BY 1 ORDER BY {order_by}"
+        
+        conn.row_factory = None
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+    
+    def get_monthly_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        """Get user's totals per month for a date range, newest month first (MONTHLY_SUMMARY_COLUMNS)."""
+        return self._get_summary(user_id, start_date, end_date, month_sql("invoice_date"), "1 DESC")
+    
+    def get_supplier_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        """Get user's totals per supplier for a date range, largest first (SUPPLIER_SUMMARY_COLUMNS)."""
+        return self._get_summary(
+            user_id, start_date, end_date,
+            "COALESCE(supplier_name, ''), MAX(tax_number)", "SUM(total_amount) DESC"
+        )
+    
     def get_invoice_count(self, user_id: int) -> int:
-        """Get total number of invoices for user."""
+        """Get total number of invoices for user (from the monthly summary)."""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM invoices WHERE user_id = ?", (user_id,))
+        cursor.execute(
+            "SELECT COALESCE(SUM(invoice_count), 0) FROM user_monthly_stats WHERE user_id = ?",
+            (user_id,)
+        )
         count = cursor.fetchone()[0]
         conn.close()
         return count
     
+    def get_user_totals(self, user_id: int) -> sqlite3.Row:
+        """
+        Get user's all-time invoice count and money totals.
+        
+        Reads one summary row per month instead of scanning invoices.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        sums = ", ".join(f"COALESCE(SUM({col}), 0) AS {col}" for col in STATS_COLUMNS)
+        cursor.execute(f"""
+            SELECT COALESCE(SUM(invoice_count), 0) AS invoice_count, {sums}
+            FROM user_monthly_stats WHERE user_id = ?
+        """, (user_id,))
+        totals = cursor.fetchone()
+        conn.close()
+        return totals
+    
+    def get_monthly_stats(self, user_id: int, limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """Get user's per-month summary rows, newest month first."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM user_monthly_stats
+            WHERE user_id = ? ORDER BY month DESC
+            LIMIT ?
+        """, (user_id, limit if limit is not None else -1))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_supplier_stats(self, user_id: int, limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """Get user's per-supplier summary rows, largest total first."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM user_supplier_stats
+            WHERE user_id = ? ORDER BY total_amount DESC
+            LIMIT ?
+        """, (user_id, limit if limit is not None else -1))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_data_version(self, user_id: int) -> int:
+        """Get user's data version; it changes whenever their invoices change."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM data_versions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0
+    
+    def get_top_items(self, user_id: int, order_by: str = "total", limit: int = 5) -> List[sqlite3.Row]:
+        """
+        Get user's top items aggregated by catalog entry.
+        
+        Args:
+            user_id: Telegram user ID
+            order_by: "total" (spend) or "quantity"
+            limit: Number of items to return
+            
+        Returns:
+            Rows of (item_name, total, quantity, line_count)
+        """
+        if order_by not in ("total", "quantity"):
+            raise ValueError(f"Unsupported order: {order_by}")
+        
+        conn, _, items = self._open_range()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT c.canonical_name AS item_name, t.total, t.quantity, t.line_count
+            FROM (
+                SELECT catalog_id, SUM(total) AS total, SUM(quantity) AS quantity,
+                       COUNT(*) AS line_count
+                FROM {items}
+                WHERE user_id = ?
+                GROUP BY catalog_id
+                ORDER BY {order_by} DESC
+                LIMIT ?
+            ) AS t
+            JOIN items_catalog c ON c.id = t.catalog_id
+            ORDER BY t.{order_by} DESC
+        """, (user_id, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def find_catalog_items(self, user_id: int, query: str, limit: int = 3) -> List[sqlite3.Row]:
+        """
+        Find user's catalog entries matching an item name.
+        
+        Exact normalized matches come first, then partial matches.
+        """
+        normalized = normalize_text(query)
+        if not normalized:
+            return []
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM items_catalog
+            WHERE user_id = ? AND normalized_name LIKE '%' || ? || '%'
+            ORDER BY normalized_name != ?, length(normalized_name), id
+            LIMIT ?
+        """, (user_id, normalized, normalized, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_price_history(self, catalog_id: int, limit: int = 10) -> List[sqlite3.Row]:
+        """Get latest unit prices of a catalog item, newest first."""
+        conn, invoices, items = self._open_range()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT it.invoice_date, inv.supplier_name, it.quantity, it.unit_price
+            FROM {items} it
+            JOIN {invoices} inv ON inv.id = it.invoice_id
+            WHERE it.catalog_id = ?
+            ORDER BY {iso_date_sql("it.invoice_date")} DESC, it.id DESC
+            LIMIT ?
+        """, (catalog_id, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_price_summary(self, catalog_id: int) -> List[sqlite3.Row]:
+        """Get min/max/last unit price of a catalog item per supplier."""
+        conn, invoices, items = self._open_range()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            WITH history AS (
+                SELECT COALESCE(inv.supplier_name, '') AS supplier_name, it.unit_price,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY COALESCE(inv.supplier_name, '')
+                           ORDER BY {iso_date_sql("it.invoice_date")} DESC, it.id DESC
+                       ) AS recency
+                FROM {items} it
+                JOIN {invoices} inv ON inv.id = it.invoice_id
+                WHERE it.catalog_id = ?
+            )
+            SELECT supplier_name, MIN(unit_price) AS min_price, MAX(unit_price) AS max_price,
+                   MAX(CASE WHEN recency = 1 THEN unit_price END) AS last_price,
+                   COUNT(*) AS purchases
+            FROM history
+            GROUP BY supplier_name
+            ORDER BY last_price
+        """, (catalog_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def search_invoices(self, user_id: int, query: str, limit: int = 10) -> List[sqlite3.Row]:
+        """
+        Full-text search over user's invoices.
+        
+        Query terms are normalized like the index and matched as
+        prefixes against supplier name, invoice number and item names.
+        
+        Returns:
+            Invoice rows ranked best first, with a 'matched_items' snippet
+        """
+        terms = re.findall(r"\w+", normalize_text(query))
+        if not terms:
+            return []
+        
+        match = (
+            f'owner : "u{int(user_id)}" AND '
+            "{supplier_name invoice_number items} : ("
+            + " AND ".join(f'"{term}"*' for term in terms)
+            + ")"
+        )
+        
+        conn, invoices, _ = self._open_range()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT inv.id, inv.supplier_name, inv.invoice_number, inv.invoice_date,
+                   inv.total_amount,
+                   snippet(invoice_search, 3, '', '', '…', 6) AS matched_items
+            FROM invoice_search
+            JOIN {invoices} inv ON inv.id = invoice_search.rowid
+            WHERE invoice_search MATCH ?
+            ORDER BY bm25(invoice_search, 0.0, 2.0, 5.0, 1.0)
+            LIMIT ?
+        """, (match, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_quarterly_tax(self, user_id: int, limit: int = 4) -> List[sqlite3.Row]:
+        """Get user's VAT paid per quarter (YYYY-Qn), newest first."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT substr(month, 1, 4) || '-Q' || ((CAST(substr(month, 6, 2) AS INTEGER) + 2) / 3) AS quarter,
+                   SUM(tax_amount) AS tax_amount, SUM(total_amount) AS total_amount
+            FROM user_monthly_stats
+            WHERE user_id = ? AND month != ''
+            GROUP BY quarter
+            ORDER BY quarter DESC
+            LIMIT ?
+        """, (user_id, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def rebuild_stats(self, user_id: Optional[int] = None) -> int:
+        """
+        Recompute summary tables from scratch.
+        
+        Args:
+            user_id: Rebuild only this user's rows (all users if None)
+            
+        Returns:
+            Number of summary rows that differed from the fresh computation
+        """
+        conn, invoices, _ = self._open_range()
+        cursor = conn.cursor()
+        
+        user_filter = "" if user_id is None else "WHERE user_id = ?"
+        params = () if user_id is None else (user_id,)
+        sums = ", ".join(f"SUM({col}) AS {col}" for col in STATS_COLUMNS)
+        columns = ", ".join(STATS_COLUMNS)
+        drift = 0
+        
+        try:
+            for table, key_column, key_template in STATS_TABLES:
+                key = key_template.format(row="invoices")
+                cursor.execute(f"DROP TABLE IF EXISTS temp.fresh_{table}")
+                cursor.execute(f"""
+                    CREATE TEMP TABLE fresh_{table} AS
+                    SELECT user_id, {key} AS {key_column}, COUNT(*) AS invoice_count, {sums}
+                    FROM {invoices} AS invoices {user_filter}
+                    GROUP BY user_id, {key}
+                """, params)
+                
+                # Fresh rows missing or wrong in the table, plus stale keys it still holds
+                select_current = f"SELECT user_id, {key_column}, invoice_count, {columns} FROM {table} {user_filter}"
+                select_fresh = f"SELECT user_id, {key_column}, invoice_count, {columns} FROM temp.fresh_{table}"
+                cursor.execute(f"""
+                    SELECT
+                        (SELECT COUNT(*) FROM ({select_fresh} EXCEPT {select_current})) +
+                        (SELECT COUNT(*) FROM (
+                            SELECT user_id, {key_column} FROM {table} {user_filter}
+                            EXCEPT SELECT user_id, {key_column} FROM temp.fresh_{table}
+                        ))
+                """, params + params)
+                drift += cursor.fetchone()[0]
+                
+                cursor.execute(f"DELETE FROM {table} {user_filter}", params)
+                cursor.execute(f"""
+                    INSERT INTO {table} (user_id, {key_column}, invoice_count, {columns})
+                    SELECT * FROM temp.fresh_{table}
+                """)
+                cursor.execute(f"DROP TABLE temp.fresh_{table}")
+            
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Failed to rebuild stats: {e}")
+            raise
+        finally:
+            conn.close()
+        
+        if drift:
+            logger.warning(f"Stats rebuild corrected {drift} summary rows (user={user_id})")
+        else:
+            logger.info(f"Stats rebuild found summaries consistent (user={user_id})")
+        return drift
+    
     def check_duplicate_invoice(self, user_id: int, invoice_number: str, tax_number: str) -> bool:
         """
         Check if invoice already exists based on invoice_number + tax_number.
         
+        Numbers are compared normalized. Unknown keys are answered from
+        memory; known ones are confirmed against the key table.
+        
         Args:
             user_id: Telegram user ID
             invoice_number: Invoice number
@@ -254,18 +1471,216 @@ class DatabaseService:
         Returns:
             True if duplicate exists, False otherwise
         """
-        if not invoice_number or not tax_number:
+        key = invoice_key(invoice_number, tax_number)
+        if not key or key not in self._known_keys.get(user_id, ()):
             return False
         
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT COUNT(*) FROM invoices 
-            WHERE user_id = ? AND invoice_number = ? AND tax_number = ?
-        """, (user_id, invoice_number, tax_number))
+            SELECT COUNT(*) FROM invoice_keys
+            WHERE user_id = ? AND tax_key = ? AND invoice_key = ?
+        """, (user_id, *key))
         count = cursor.fetchone()[0]
         conn.close()
         return count > 0
+    
+    def add_subscription(self, user_id: int, chat_id: int, report: str, last_period: str) -> bool:
+        """
+        Subscribe user to a scheduled report.
+        
+        Args:
+            user_id: Telegram user ID
+            chat_id: Chat the report is delivered to
+            report: Report type
+            last_period: Period (YYYY-MM) treated as already delivered
+            
+        Returns:
+            False if the user was already subscribed
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO report_subscriptions (user_id, report, chat_id, last_period)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, report) DO NOTHING
+        """, (user_id, report, chat_id, last_period))
+        added = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return added
+    
+    def delete_subscriptions(self, user_id: int, report: Optional[str] = None) -> int:
+        """Unsubscribe user from one report type (all if None); returns rows removed."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if report is None:
+            cursor.execute("DELETE FROM report_subscriptions WHERE user_id = ?", (user_id,))
+        else:
+            cursor.execute(
+                "DELETE FROM report_subscriptions WHERE user_id = ? AND report = ?",
+                (user_id, report)
+            )
+        removed = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return removed
+    
+    def get_user_subscriptions(self, user_id: int) -> List[str]:
+        """Get the report types user is subscribed to."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT report FROM report_subscriptions WHERE user_id = ? ORDER BY report",
+            (user_id,)
+        )
+        reports = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return reports
+    
+    def get_due_subscriptions(self, period: str) -> List[Tuple[int, int, str]]:
+        """
+        Get subscriptions not yet delivered for period (YYYY-MM).
+        
+        Returns:
+            (user_id, chat_id, report) tuples sorted by user
+        """
+        conn = self.get_connection()
+        conn.row_factory = None
+        try:
+            return conn.execute("""
+                SELECT user_id, chat_id, report FROM report_subscriptions
+                WHERE last_period < ?
+                ORDER BY user_id, report
+            """, (period,)).fetchall()
+        finally:
+            conn.close()
+    
+    def mark_subscription_sent(self, user_id: int, report: str, period: str):
+        """Record that user's report for period (YYYY-MM) was delivered."""
+        conn = self.get_connection()
+        conn.execute(
+            "UPDATE report_subscriptions SET last_period = ? WHERE user_id = ? AND report = ?",
+            (period, user_id, report)
+        )
+        conn.commit()
+        conn.close()
+    
+    def get_period_invoices(self, user_ids: List[int], start_date: str, end_date: str) -> List[Tuple]:
+        """
+        Fetch the invoices of several users for one date range in a single query.
+        
+        Args:
+            user_ids: Telegram user IDs
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            
+        Returns:
+            (user_id, *INVOICE_COLUMNS) tuples sorted by user, newest first per user
+        """
+        conn, invoices, _ = self._open_range(start_date)
+        placeholders = ", ".join("?" * len(user_ids))
+        conn.row_factory = None
+        try:
+            return conn.execute(f"""
+                SELECT user_id, {', '.join(INVOICE_COLUMNS)} FROM {invoices}
+                WHERE user_id IN ({placeholders}) AND {iso_date_sql("invoice_date")} BETWEEN ? AND ?
+                ORDER BY user_id, {iso_date_sql("invoice_date")} DESC, id DESC
+            """, (*user_ids, start_date, end_date)).fetchall()
+        finally:
+            conn.close()
+    
+    def archive_old_invoices(self, before: str, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """
+        Move invoices dated before a cutoff, with their items, to the archive.
+        
+        Summary tables, the search index and data versions are left as they
+        are: the invoices still belong to the user, only their storage moves.
+        Invoices without a recognizable date stay in the hot tables.
+        
+        Args:
+            before: Cutoff date (YYYY-MM-DD)
+            batch_size: Invoices moved per transaction
+            
+        Returns:
+            Number of invoices moved
+        """
+        self.archive_lock.acquire()
+        conn = self.get_connection(with_archive=True)
+        cursor = conn.cursor()
+        moved = 0
+        
+        try:
+            while True:
+                cursor.execute("BEGIN IMMEDIATE")
+                # Committed with the moved rows, so readers see both or neither
+                cursor.execute(
+                    "UPDATE archive_state SET horizon = max(COALESCE(horizon, ?1), ?1), moving = 1",
+                    (before,)
+                )
+                
+                cursor.execute("DROP TABLE IF EXISTS temp.archive_batch")
+                cursor.execute(f"""
+                    CREATE TEMP TABLE archive_batch AS
+                    SELECT id FROM main.invoices
+                    WHERE {iso_date_sql("invoice_date")} < ?
+                    LIMIT ?
+                """, (before, batch_size))
+                cursor.execute("SELECT COUNT(*) FROM temp.archive_batch")
+                count = cursor.fetchone()[0]
+                
+                for table, key in (("invoices", "id"), ("invoice_items", "invoice_id")):
+                    columns = self._archive_columns[table]
+                    cursor.execute(f"""
+                        INSERT INTO archive.{table} ({columns})
+                        SELECT {columns} FROM main.{table}
+                        WHERE {key} IN temp.archive_batch
+                    """)
+                
+                cursor.execute("DELETE FROM main.invoice_items WHERE invoice_id IN temp.archive_batch")
+                cursor.execute("DELETE FROM main.invoices WHERE id IN temp.archive_batch")
+                
+                cursor.execute("UPDATE archive_state SET moving = 0")
+                conn.commit()
+                moved += count
+                
+                if count < batch_size:
+                    break
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Failed to archive invoices: {e}")
+            raise
+        finally:
+            conn.close()
+            self.archive_lock.release()
+        
+        if moved:
+            logger.info(f"Archived {moved} invoices dated before {before}")
+        return moved
+    
+    def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """
+        Return free pages of the hot database to the filesystem.
+        
+        Args:
+            max_pages: Upper bound on pages released (0 = all free pages)
+            
+        Returns:
+            Number of pages released
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA freelist_count")
+        free_before = cursor.fetchone()[0]
+        # Each result row is one step of the vacuum; all must be consumed
+        cursor.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        cursor.execute("PRAGMA freelist_count")
+        released = free_before - cursor.fetchone()[0]
+        conn.close()
+        
+        if released:
+            logger.info(f"Incremental vacuum released {released} pages")
+        return released
 
 
 # Global instance
@@ -4,28 +4,35 @@ Exports invoice data to Excel format
 """
 import logging
 from io import BytesIO
-from datetime import datetime
+from typing import Optional
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from models.invoice import InvoiceData
+from services import excel_styles
+from services.excel_template import InvoiceTemplate, sample_invoice
 
 logger = logging.getLogger(__name__)
 
 
 class ExcelGenerator:
-    """Service for generating Excel files from invoice data."""
+    """
+    Service for generating Excel files from invoice data.
+    
+    generate() fills a precompiled InvoiceTemplate; the template is cut
+    from a workbook that generate_openpyxl() builds cell by cell, so both
+    produce the same sheet.
+    """
     
     def __init__(self):
-        # Define colors
-        self.header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        self.header_font = Font(bold=True, color="FFFFFF", size=12)
-        self.title_font = Font(bold=True, size=14)
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        self._template: Optional[InvoiceTemplate] = None
+    
+    def prepare(self) -> InvoiceTemplate:
+        """Build the invoice template (once); call at startup to keep it off the first request."""
+        if self._template is None:
+            reference = BytesIO()
+            self._build_workbook(sample_invoice()).save(reference)
+            self._template = InvoiceTemplate(reference.getvalue())
+            logger.info("Invoice workbook template ready")
+        return self._template
     
     def generate(self, invoice: InvoiceData) -> BytesIO:
         """
@@ -35,105 +42,118 @@ class ExcelGenerator:
             BytesIO: Excel file in memory
         """
         try:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Invoice"
-            # Set worksheet to RTL (Right-to-Left) for Arabic
-            ws.sheet_view.rightToLeft = True
-            
-            # Set column widths
-            ws.column_dimensions['A'].width = 40
-            ws.column_dimensions['B'].width = 15
-            ws.column_dimensions['C'].width = 15
-            ws.column_dimensions['D'].width = 15
-            ws.column_dimensions['E'].width = 15
-            
-            row = 1
-            
-            # Title
-            ws.merge_cells(f'A{row}:E{row}')
-            ws[f'A{row}'] = "بيانات الفاتورة"
-            ws[f'A{row}'].font = self.title_font
-            ws[f'A{row}'].alignment = Alignment(horizontal='center', readingOrder=2)
-            row += 2
-            
-            # Invoice header info
-            info_data = [
-                ("اسم المورد:", invoice.supplier_name or "غير محدد"),
-                ("الرقم الضريبي:", invoice.tax_number or "غير محدد"),
-                ("رقم الفاتورة:", invoice.invoice_number or "غير محدد"),
-                ("التاريخ:", invoice.invoice_date or "غير محدد"),
-            ]
-            
-            for label, value in info_data:
-                ws[f'A{row}'] = label
-                ws[f'A{row}'].font = Font(bold=True)
-                ws[f'B{row}'] = value
-                row += 1
-            
-            row += 1
-            
-            # Items table header
-            headers = ["اسم الصنف", "الكمية", "الوحدة", "سعر الوحدة", "الإجمالي"]
-            for col, header in enumerate(headers, start=1):
-                cell = ws.cell(row=row, column=col, value=header)
-                cell.font = self.header_font
-                cell.fill = self.header_fill
-                cell.alignment = Alignment(horizontal='center')
-                cell.border = self.border
-            
-            row += 1
-            
-            # Items data
-            for item in invoice.items:
-                ws[f'A{row}'] = item.name
-                ws[f'B{row}'] = item.quantity
-                ws[f'C{row}'] = item.unit
-                ws[f'D{row}'] = item.unit_price
-                ws[f'E{row}'] = item.total
-                
-                # Center align all cells
-                for col in range(1, 6):
-                    cell = ws.cell(row=row, column=col)
-                    cell.alignment = Alignment(horizontal='center', vertical='center', readingOrder=2)
-                    cell.border = self.border
-                
-                row += 1
-            
-            # Totals
-            totals_data = [
-                ("المجموع الفرعي:", invoice.subtotal),
-                ("الخصم:", invoice.discount),
-                ("الضريبة:", invoice.tax_amount),
-                ("الإجمالي النهائي:", invoice.total_amount),
-            ]
-            
-            for label, value in totals_data:
-                ws[f'D{row}'] = label
-                ws[f'D{row}'].font = Font(bold=True)
-                ws[f'E{row}'] = value
-                ws[f'E{row}'].font = Font(bold=True) if label.startswith("الإجمالي") else Font()
-                row += 1
-            
-            # Validation message if present
-            if invoice.validation_message:
-                row += 1
-                ws.merge_cells(f'A{row}:E{row}')
-                ws[f'A{row}'] = f"التدقيق: {invoice.validation_message}"
-                ws[f'A{row}'].font = Font(italic=True)
-                ws[f'A{row}'].alignment = Alignment(horizontal='center', readingOrder=2)
-            
-            # Save to BytesIO
+            excel_file = BytesIO(self.prepare().render(invoice))
+        except Exception as e:
+            logger.error(f"Failed to generate Excel: {e}")
+            raise
+        
+        logger.info(f"Excel file generated successfully for invoice {invoice.invoice_number}")
+        return excel_file
+    
+    def generate_openpyxl(self, invoice: InvoiceData) -> BytesIO:
+        """
+        Generate the same Excel file through openpyxl's object model.
+        
+        Slower than generate(); kept as the template's source and as the
+        baseline of benchmarks/invoice_workbook.py.
+        """
+        try:
             excel_file = BytesIO()
-            wb.save(excel_file)
+            self._build_workbook(invoice).save(excel_file)
             excel_file.seek(0)
-            
-            logger.info(f"Excel file generated successfully for invoice {invoice.invoice_number}")
             return excel_file
-            
         except Exception as e:
             logger.error(f"Failed to generate Excel: {e}")
             raise
+    
+    def _build_workbook(self, invoice: InvoiceData) -> Workbook:
+        """Lay out an invoice workbook cell by cell."""
+        wb = Workbook()
+        excel_styles.register_styles(wb)
+        ws = wb.active
+        ws.title = "Invoice"
+        # Set worksheet to RTL (Right-to-Left) for Arabic
+        ws.sheet_view.rightToLeft = True
+        
+        # Set column widths
+        ws.column_dimensions['A'].width = 40
+        ws.column_dimensions['B'].width = 15
+        ws.column_dimensions['C'].width = 15
+        ws.column_dimensions['D'].width = 15
+        ws.column_dimensions['E'].width = 15
+        excel_styles.format_money_column(ws, 'D')
+        excel_styles.format_money_column(ws, 'E')
+        
+        row = 1
+        
+        # Title
+        ws.merge_cells(f'A{row}:E{row}')
+        ws[f'A{row}'] = "بيانات الفاتورة"
+        ws[f'A{row}'].style = excel_styles.TITLE
+        row += 2
+        
+        # Invoice header info
+        info_data = [
+            ("اسم المورد:", invoice.supplier_name or "غير محدد"),
+            ("الرقم الضريبي:", invoice.tax_number or "غير محدد"),
+            ("رقم الفاتورة:", invoice.invoice_number or "غير محدد"),
+            ("التاريخ:", invoice.invoice_date or "غير محدد"),
+        ]
+        
+        for label, value in info_data:
+            ws[f'A{row}'] = label
+            ws[f'A{row}'].style = excel_styles.LABEL
+            ws[f'B{row}'] = value
+            row += 1
+        
+        row += 1
+        
+        # Items table header
+        headers = ["اسم الصنف", "الكمية", "الوحدة", "سعر الوحدة", "الإجمالي"]
+        for col, header in enumerate(headers, start=1):
+            cell = ws.cell(row=row, column=col, value=header)
+            cell.style = excel_styles.HEADER
+        
+        row += 1
+        
+        # Items data
+        for item in invoice.items:
+            ws[f'A{row}'] = item.name
+            ws[f'B{row}'] = item.quantity
+            ws[f'C{row}'] = item.unit
+            ws[f'D{row}'] = item.unit_price.to_decimal()
+            ws[f'E{row}'] = item.total.to_decimal()
+            
+            # Center align all cells
+            for col in range(1, 6):
+                cell = ws.cell(row=row, column=col)
+                cell.style = excel_styles.MONEY_CELL if col >= 4 else excel_styles.CELL
+            
+            row += 1
+        
+        # Totals
+        totals_data = [
+            ("المجموع الفرعي:", invoice.subtotal),
+            ("الخصم:", invoice.discount),
+            ("الضريبة:", invoice.tax_amount),
+            ("الإجمالي النهائي:", invoice.total_amount),
+        ]
+        
+        for label, value in totals_data:
+            ws[f'D{row}'] = label
+            ws[f'D{row}'].style = excel_styles.LABEL
+            ws[f'E{row}'] = value.to_decimal()
+            ws[f'E{row}'].style = excel_styles.TOTAL if label.startswith("الإجمالي") else excel_styles.MONEY
+            row += 1
+        
+        # Validation message if present
+        if invoice.validation_message:
+            row += 1
+            ws.merge_cells(f'A{row}:E{row}')
+            ws[f'A{row}'] = f"التدقيق: {invoice.validation_message}"
+            ws[f'A{row}'].style = excel_styles.NOTE
+        
+        return wb
 
 
 # Global instance
@@ -0,0 +1,57 @@
+"""
+Excel Styles
+Shared named cell styles for every generated workbook
+"""
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+
+# Style names; cells reference them with `cell.style = HEADER`
+TITLE = "fatoorah_title"
+HEADER = "fatoorah_header"
+CELL = "fatoorah_cell"
+MONEY_CELL = "fatoorah_money_cell"
+MONEY = "fatoorah_money"
+LABEL = "fatoorah_label"
+TOTAL = "fatoorah_total"
+NOTE = "fatoorah_note"
+
+MONEY_FORMAT = "#,##0.00"
+
+_THIN = Side(style='thin')
+_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_CENTER = Alignment(horizontal='center', vertical='center', readingOrder=2)
+
+# Built once per process; each workbook gets its own NamedStyle wrappers,
+# because openpyxl binds a NamedStyle to the workbook it is added to
+STYLE_DEFINITIONS = {
+    TITLE: dict(
+        font=Font(bold=True, size=14),
+        alignment=Alignment(horizontal='center', readingOrder=2)
+    ),
+    HEADER: dict(
+        font=Font(bold=True, color="FFFFFF", size=12),
+        fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+        alignment=_CENTER,
+        border=_BORDER
+    ),
+    CELL: dict(alignment=_CENTER, border=_BORDER),
+    MONEY_CELL: dict(alignment=_CENTER, border=_BORDER, number_format=MONEY_FORMAT),
+    MONEY: dict(number_format=MONEY_FORMAT),
+    LABEL: dict(font=Font(bold=True)),
+    TOTAL: dict(font=Font(bold=True), number_format=MONEY_FORMAT),
+    NOTE: dict(
+        font=Font(italic=True),
+        alignment=Alignment(horizontal='center', readingOrder=2)
+    ),
+}
+
+
+def register_styles(wb: Workbook) -> None:
+    """Add the shared named styles to a new workbook."""
+    for name, definition in STYLE_DEFINITIONS.items():
+        wb.add_named_style(NamedStyle(name=name, **definition))
+
+
+def format_money_column(ws, column: str) -> None:
+    """Column-level money format, so cells typed in later match the report."""
+    ws.column_dimensions[column].number_format = MONEY_FORMAT
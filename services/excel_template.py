@@ -0,0 +1,161 @@
+"""
+Excel Invoice Template
+Precompiled single-invoice workbook: static XML parts are built once, only the sheet is written per invoice
+"""
+import math
+import re
+import zipfile
+from decimal import Decimal
+from io import BytesIO
+from typing import List
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+
+SHEET_PATH = "xl/worksheets/sheet1.xml"
+
+# Cells of the sample invoice (one item, validation note) holding each kind of style
+STYLE_CELLS = {
+    "title": "A1",
+    "label": "A3",
+    "value": "B3",
+    "header": "A8",
+    "cell": "A9",
+    "money_cell": "D9",
+    "money": "E10",
+    "total": "E13",
+    "note": "A15",
+}
+
+HEADERS = ["اسم الصنف", "الكمية", "الوحدة", "سعر الوحدة", "الإجمالي"]
+
+_CELL_STYLE_RE = re.compile(r'<c r="([A-Z]+[0-9]+)"(?: s="([0-9]+)")?')
+_DIMENSION_RE = re.compile(r'<dimension ref="[^"]*" />')
+_MERGE_CELLS_RE = re.compile(r'<mergeCells.*?</mergeCells>')
+
+
+def _cell(ref: str, value, style: str) -> str:
+    """XML of one cell; style is the ready-made ` s="N"` attribute (or "")."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)
+        space = ' xml:space="preserve"' if value != value.strip() else ""
+        return f'<c r="{ref}"{style} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+    if isinstance(value, Decimal):
+        value = format(value, "f")
+    elif isinstance(value, float) and not math.isfinite(value):
+        # nan/inf have no XLSX number form; Excel rejects the whole file
+        return ""
+    return f'<c r="{ref}"{style} t="n"><v>{value}</v></c>'
+
+
+class InvoiceTemplate:
+    """
+    Single-invoice workbook split into precompiled parts.
+    
+    Built from one reference workbook: every part except the sheet is
+    copied as is, and the sheet keeps its layout (view, column widths,
+    page setup) around the rows, which are the only XML written per
+    invoice. Style indexes are read from the reference cells, so the
+    output matches ExcelGenerator.generate_openpyxl cell for cell.
+    """
+    
+    def __init__(self, reference: bytes):
+        """
+        Args:
+            reference: Workbook of the sample invoice (see STYLE_CELLS)
+        """
+        with zipfile.ZipFile(BytesIO(reference)) as archive:
+            self.parts = {name: archive.read(name) for name in archive.namelist()}
+        
+        sheet = self.parts[SHEET_PATH].decode("utf-8")
+        head, rest = sheet.split("<sheetData>", 1)
+        self.head_start, self.head_end = _DIMENSION_RE.split(head, 1)
+        self.tail = _MERGE_CELLS_RE.sub("", rest.split("</sheetData>", 1)[1], count=1)
+        
+        styles = {ref: s for ref, s in _CELL_STYLE_RE.findall(sheet)}
+        self.styles = {
+            kind: f' s="{styles[ref]}"' if styles.get(ref) else ""
+            for kind, ref in STYLE_CELLS.items()
+        }
+    
+    def render(self, invoice: InvoiceData) -> bytes:
+        """Write the workbook of one invoice."""
+        style = self.styles
+        rows: List[str] = []
+        merges = ["A1:E1"]
+        
+        def add_row(number: int, cells: List[str]):
+            rows.append(f'<row r="{number}">{"".join(cells)}</row>')
+        
+        add_row(1, [_cell("A1", "بيانات الفاتورة", style["title"])])
+        
+        row = 3
+        for label, value in (
+            ("اسم المورد:", invoice.supplier_name or "غير محدد"),
+            ("الرقم الضريبي:", invoice.tax_number or "غير محدد"),
+            ("رقم الفاتورة:", invoice.invoice_number or "غير محدد"),
+            ("التاريخ:", invoice.invoice_date or "غير محدد"),
+        ):
+            add_row(row, [_cell(f"A{row}", label, style["label"]), _cell(f"B{row}", value, style["value"])])
+            row += 1
+        
+        row += 1
+        add_row(row, [_cell(f"{column}{row}", header, style["header"]) for column, header in zip("ABCDE", HEADERS)])
+        row += 1
+        
+        for item in invoice.items:
+            add_row(row, [
+                _cell(f"A{row}", item.name, style["cell"]),
+                _cell(f"B{row}", item.quantity, style["cell"]),
+                _cell(f"C{row}", item.unit, style["cell"]),
+                _cell(f"D{row}", item.unit_price.to_decimal(), style["money_cell"]),
+                _cell(f"E{row}", item.total.to_decimal(), style["money_cell"]),
+            ])
+            row += 1
+        
+        for label, value, value_style in (
+            ("المجموع الفرعي:", invoice.subtotal, style["money"]),
+            ("الخصم:", invoice.discount, style["money"]),
+            ("الضريبة:", invoice.tax_amount, style["money"]),
+            ("الإجمالي النهائي:", invoice.total_amount, style["total"]),
+        ):
+            add_row(row, [
+                _cell(f"D{row}", label, style["label"]),
+                _cell(f"E{row}", value.to_decimal(), value_style),
+            ])
+            row += 1
+        
+        last_row = row - 1
+        if invoice.validation_message:
+            last_row = row + 1
+            add_row(last_row, [_cell(f"A{last_row}", f"التدقيق: {invoice.validation_message}", style["note"])])
+            merges.append(f"A{last_row}:E{last_row}")
+        
+        merge_cells = "".join(f'<mergeCell ref="{ref}" />' for ref in merges)
+        sheet = (
+            f'{self.head_start}<dimension ref="A1:E{last_row}" />{self.head_end}'
+            f'<sheetData>{"".join(rows)}</sheetData>'
+            f'<mergeCells count="{len(merges)}">{merge_cells}</mergeCells>{self.tail}'
+        )
+        
+        output = BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in self.parts.items():
+                archive.writestr(name, sheet.encode("utf-8") if name == SHEET_PATH else data)
+        return output.getvalue()
+
+
+def sample_invoice() -> InvoiceData:
+    """Invoice whose reference workbook has a cell of every style at STYLE_CELLS."""
+    return InvoiceData(
+        supplier_name="-", tax_number="-", invoice_number="-", invoice_date="-",
+        items=[InvoiceItem(name="-", quantity=1, unit="-", unit_price=Money(100), total=Money(100))],
+        subtotal=Money(100), discount=Money(0), tax_amount=Money(15), total_amount=Money(115),
+        validation_message="-"
+    )
+
@@ -0,0 +1,57 @@
+"""
+Export Cache
+Remembers the Telegram file of each sent export so unchanged reports are re-sent by file_id
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# (user_id, table, format, start_date, end_date)
+ExportKey = Tuple[int, str, str, Optional[str], Optional[str]]
+
+
+@dataclass
+class CachedExport:
+    """A report already uploaded to Telegram, as one or more documents."""
+    row_count: int
+    # (file_id, caption) of each part, in sending order
+    parts: List[Tuple[str, str]]
+    # Parts already delivered by a re-send that stopped part-way; the next
+    # request continues after them instead of sending them twice
+    sent: int = 0
+
+
+class ExportCache:
+    """
+    LRU map of export requests to uploaded files.
+    
+    Entries are tagged with the user's data version when the report was
+    built; the database bumps the version on every save, so a hit is
+    always a report of the same rows.
+    """
+    
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        # key -> (data version, cached export)
+        self._entries: "OrderedDict[ExportKey, Tuple[int, CachedExport]]" = OrderedDict()
+    
+    def get(self, key: ExportKey, version: int) -> Optional[CachedExport]:
+        """Cached export for key if it was built from this data version."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        
+        self._entries.move_to_end(key)
+        return entry[1]
+    
+    def put(self, key: ExportKey, version: int, export: CachedExport):
+        """Remember the uploaded files for key at this data version."""
+        self._entries[key] = (version, export)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Global instance
+export_cache = ExportCache()
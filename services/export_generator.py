@@ -3,171 +3,413 @@ Export Generator Service
 Generates Excel reports for invoices and items
 """
 import logging
-from io import BytesIO
+import tempfile
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from typing import List
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from typing import BinaryIO, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from models.money import Money, to_riyals
+from services import excel_styles
 
 logger = logging.getLogger(__name__)
 
+# Rows between throughput log lines
+PROGRESS_LOG_ROWS = 10_000
+
+# Reports stay in memory up to this size, then spill to a temporary file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+def spooled_file() -> BinaryIO:
+    """Temporary binary file for a report, in memory until it grows large."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+
+@dataclass
+class ExportResult:
+    """Generated report file (positioned at the start) and the number of data rows written."""
+    file: BinaryIO
+    row_count: int
+    
+    @property
+    def size(self) -> int:
+        """File size in bytes."""
+        position = self.file.tell()
+        size = self.file.seek(0, 2)
+        self.file.seek(position)
+        return size
+
 
 class ExportGenerator:
-    """Service for generating Excel export reports."""
+    """
+    Service for generating Excel export reports.
     
-    def __init__(self):
-        # Define colors
-        self.header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        self.header_font = Font(bold=True, color="FFFFFF", size=12)
-        self.title_font = Font(bold=True, size=14)
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+    Reports are written with openpyxl's write-only mode: rows are
+    serialized as they arrive, so memory stays flat however many rows
+    the database streams in.
+    """
     
-    def generate_invoices_report(self, invoices: List) -> BytesIO:
+    def generate_invoices_report(
+        self,
+        invoices: Iterable[Tuple],
+        output: Optional[BinaryIO] = None
+    ) -> ExportResult:
         """
         Generate Excel report for invoices.
         
-        Columns: # | المورد | الرقم الضريبي | رقم الفاتورة | التاريخ | 
+        Columns: # | المورد | الرقم الضريبي | رقم الفاتورة | التاريخ |
                  المجموع الفرعي | الخصم | الضريبة | الإجمالي
+        
+        Args:
+            invoices: Rows ordered as INVOICE_COLUMNS (any iterable, consumed once)
+            output: File to write to (a new spooled temporary file if omitted)
         """
+        def to_values(idx, invoice):
+            (_, supplier_name, tax_number, invoice_number, invoice_date,
+             subtotal, discount, tax_amount, total_amount) = invoice
+            return [
+                idx,
+                supplier_name,
+                tax_number,
+                invoice_number,
+                invoice_date,
+                to_riyals(subtotal),
+                to_riyals(discount),
+                to_riyals(tax_amount),
+                to_riyals(total_amount)
+            ]
+        
         try:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Invoices"
-            ws.sheet_view.rightToLeft = True
-            
-            # Set column widths
-            column_widths = [5, 30, 20, 15, 12, 15, 12, 12, 15]
-            for i, width in enumerate(column_widths, start=1):
-                ws.column_dimensions[chr(64 + i)].width = width
-            
-            row = 1
-            
-            # Title
-            ws.merge_cells(f'A{row}:I{row}')
-            ws[f'A{row}'] = f"تقرير الفواتير - {datetime.now().strftime('%Y-%m-%d')}"
-            ws[f'A{row}'].font = self.title_font
-            ws[f'A{row}'].alignment = Alignment(horizontal='center', readingOrder=2)
-            row += 2
-            
-            # Headers
-            headers = ["#", "المورد", "الرقم الضريبي", "رقم الفاتورة", "التاريخ", 
-                      "المجموع الفرعي", "الخصم", "الضريبة", "الإجمالي"]
-            
-            for col, header in enumerate(headers, start=1):
-                cell = ws.cell(row=row, column=col, value=header)
-                cell.font = self.header_font
-                cell.fill = self.header_fill
-                cell.alignment = Alignment(horizontal='center', vertical='center', readingOrder=2)
-                cell.border = self.border
-            
-            row += 1
-            
-            # Data rows
-            for idx, invoice in enumerate(invoices, start=1):
-                values = [
-                    idx,
-                    invoice['supplier_name'],
-                    invoice['tax_number'],
-                    invoice['invoice_number'],
-                    invoice['invoice_date'],
-                    invoice['subtotal'],
-                    invoice['discount'],
-                    invoice['tax_amount'],
-                    invoice['total_amount']
-                ]
-                
-                for col, value in enumerate(values, start=1):
-                    cell = ws.cell(row=row, column=col, value=value)
-                    cell.alignment = Alignment(horizontal='center', vertical='center', readingOrder=2)
-                    cell.border = self.border
-                
-                row += 1
-            
-            # Save to BytesIO
-            excel_file = BytesIO()
-            wb.save(excel_file)
-            excel_file.seek(0)
-            
-            logger.info(f"Generated invoices report with {len(invoices)} records")
-            return excel_file
-            
+            return self._write_report(
+                sheet_title="Invoices",
+                title=f"تقرير الفواتير - {datetime.now().strftime('%Y-%m-%d')}",
+                headers=["#", "المورد", "الرقم الضريبي", "رقم الفاتورة", "التاريخ",
+                         "المجموع الفرعي", "الخصم", "الضريبة", "الإجمالي"],
+                column_widths=[5, 30, 20, 15, 12, 15, 12, 12, 15],
+                money_columns="FGHI",
+                rows=invoices,
+                to_values=to_values,
+                output=output
+            )
         except Exception as e:
             logger.error(f"Failed to generate invoices report: {e}")
             raise
     
-    def generate_items_report(self, items: List) -> BytesIO:
+    def generate_items_report(
+        self,
+        items: Iterable[Tuple],
+        output: Optional[BinaryIO] = None
+    ) -> ExportResult:
         """
         Generate Excel report for items.
         
         Columns: اسم الصنف | الكمية | الوحدة | سعر الوحدة | الإجمالي | التاريخ
+        
+        Args:
+            items: Rows ordered as ITEM_COLUMNS (any iterable, consumed once)
+            output: File to write to (a new spooled temporary file if omitted)
         """
+        def to_values(idx, item):
+            _, _, item_name, quantity, unit, unit_price, total, invoice_date = item
+            return [
+                item_name,
+                quantity,
+                unit,
+                to_riyals(unit_price),
+                to_riyals(total),
+                invoice_date
+            ]
+        
         try:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Items"
-            ws.sheet_view.rightToLeft = True
-            
-            # Set column widths
-            column_widths = [40, 12, 12, 15, 15, 15]
-            for i, width in enumerate(column_widths, start=1):
-                ws.column_dimensions[chr(64 + i)].width = width
-            
-            row = 1
-            
-            # Title
-            ws.merge_cells(f'A{row}:F{row}')
-            ws[f'A{row}'] = f"تقرير الأصناف - {datetime.now().strftime('%Y-%m-%d')}"
-            ws[f'A{row}'].font = self.title_font
-            ws[f'A{row}'].alignment = Alignment(horizontal='center', readingOrder=2)
-            row += 2
-            
-            # Headers
-            headers = ["اسم الصنف", "الكمية", "الوحدة", "سعر الوحدة", "الإجمالي", "التاريخ"]
-            
-            for col, header in enumerate(headers, start=1):
-                cell = ws.cell(row=row, column=col, value=header)
-                cell.font = self.header_font
-                cell.fill = self.header_fill
-                cell.alignment = Alignment(horizontal='center', vertical='center', readingOrder=2)
-                cell.border = self.border
-            
-            row += 1
+            return self._write_report(
+                sheet_title="Items",
+                title=f"تقرير الأصناف - {datetime.now().strftime('%Y-%m-%d')}",
+                headers=["اسم الصنف", "الكمية", "الوحدة", "سعر الوحدة", "الإجمالي", "التاريخ"],
+                column_widths=[40, 12, 12, 15, 15, 15],
+                money_columns="DE",
+                rows=items,
+                to_values=to_values,
+                output=output
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate items report: {e}")
+            raise
+    
+    def generate_vat_summary(
+        self,
+        invoices: Iterable[Tuple],
+        period: str,
+        output: Optional[BinaryIO] = None
+    ) -> ExportResult:
+        """
+        Generate the VAT summary of one period: purchases and VAT per supplier.
+        
+        Columns: المورد | الرقم الضريبي | عدد الفواتير | المجموع الفرعي |
+                 الخصم | الضريبة | الإجمالي
+        
+        Args:
+            invoices: Rows ordered as INVOICE_COLUMNS (any iterable, consumed once)
+            period: Period shown in the title (YYYY-MM)
+            output: File to write to (a new spooled temporary file if omitted)
+        
+        Returns:
+            Report whose row_count is the number of suppliers
+        """
+        # (supplier_name, tax_number) -> [invoice count, subtotal, discount, tax, total] in halalas
+        suppliers = {}
+        for _, supplier_name, tax_number, _, _, *amounts in invoices:
+            sums = suppliers.setdefault((supplier_name, tax_number), [0, 0, 0, 0, 0])
+            sums[0] += 1
+            for i, amount in enumerate(amounts, start=1):
+                sums[i] += amount or 0
+        
+        rows = sorted(suppliers.items(), key=lambda entry: entry[1][3], reverse=True)
+        grand = [sum(column) for column in zip(*suppliers.values())] or [0] * 5
+        
+        def to_values(idx, supplier):
+            (supplier_name, tax_number), (count, *amounts) = supplier
+            return [supplier_name or "غير محدد", tax_number, count] + [
+                Money(amount).to_decimal() for amount in amounts
+            ]
+        
+        try:
+            return self._write_report(
+                sheet_title="VAT",
+                title=f"ملخص ضريبة القيمة المضافة - {period}",
+                headers=["المورد", "الرقم الضريبي", "عدد الفواتير", "المجموع الفرعي",
+                         "الخصم", "الضريبة", "الإجمالي"],
+                column_widths=[30, 20, 12, 15, 12, 15, 15],
+                money_columns="DEFG",
+                rows=rows,
+                to_values=to_values,
+                output=output,
+                totals=["الإجمالي", None, grand[0]] + [Money(amount).to_decimal() for amount in grand[1:]]
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate VAT summary: {e}")
+            raise
+    
+    def generate_combined_report(
+        self,
+        lines: Iterable[Tuple],
+        monthly: Iterable[Tuple],
+        suppliers: Iterable[Tuple],
+        output: Optional[BinaryIO] = None
+    ) -> ExportResult:
+        """
+        Generate the combined workbook: invoices, items with their invoice, and summaries.
+        
+        The invoices and items sheets are filled together in one pass over
+        the joined rows; the summaries arrive already aggregated.
+        
+        Args:
+            lines: Rows ordered as INVOICE_LINE_COLUMNS, each invoice followed by its items
+            monthly: Rows ordered as MONTHLY_SUMMARY_COLUMNS
+            suppliers: Rows ordered as SUPPLIER_SUMMARY_COLUMNS
+            output: File to write to (a new spooled temporary file if omitted)
+        
+        Returns:
+            Report whose row_count is the number of invoices
+        """
+        started = time.perf_counter()
+        date = datetime.now().strftime('%Y-%m-%d')
+        summary_headers = ["عدد الفواتير", "المجموع الفرعي", "الخصم", "الضريبة", "الإجمالي"]
+        
+        try:
+            wb = Workbook(write_only=True)
+            excel_styles.register_styles(wb)
+            invoices_ws, invoice_styles = self._add_sheet(
+                wb, "Invoices", f"تقرير الفواتير - {date}",
+                headers=["#", "المورد", "الرقم الضريبي", "رقم الفاتورة", "التاريخ",
+                         "المجموع الفرعي", "الخصم", "الضريبة", "الإجمالي"],
+                column_widths=[5, 30, 20, 15, 12, 15, 12, 12, 15],
+                money_columns="FGHI"
+            )
+            items_ws, item_styles = self._add_sheet(
+                wb, "Items", f"أصناف الفواتير - {date}",
+                headers=["رقم الفاتورة", "المورد", "التاريخ", "اسم الصنف", "الكمية",
+                         "الوحدة", "سعر الوحدة", "الإجمالي"],
+                column_widths=[15, 30, 12, 40, 12, 12, 15, 15],
+                money_columns="GH"
+            )
             
-            # Data rows
-            for item in items:
-                values = [
-                    item['item_name'],
-                    item['quantity'],
-                    item['unit'],
-                    item['unit_price'],
-                    item['total'],
-                    item['invoice_date']
-                ]
+            invoice_count = item_count = 0
+            last_invoice_id = None
+            for line in lines:
+                (invoice_id, supplier_name, tax_number, invoice_number, invoice_date,
+                 subtotal, discount, tax_amount, total_amount,
+                 item_id, item_name, quantity, unit, unit_price, item_total) = line
                 
-                for col, value in enumerate(values, start=1):
-                    cell = ws.cell(row=row, column=col, value=value)
-                    cell.alignment = Alignment(horizontal='center', vertical='center', readingOrder=2)
-                    cell.border = self.border
+                if invoice_id != last_invoice_id:
+                    last_invoice_id = invoice_id
+                    invoice_count += 1
+                    self._append_row(invoices_ws, [
+                        invoice_count, supplier_name, tax_number, invoice_number, invoice_date,
+                        to_riyals(subtotal), to_riyals(discount),
+                        to_riyals(tax_amount), to_riyals(total_amount)
+                    ], invoice_styles)
                 
-                row += 1
+                if item_id is not None:
+                    item_count += 1
+                    self._append_row(items_ws, [
+                        invoice_number, supplier_name, invoice_date, item_name, quantity, unit,
+                        to_riyals(unit_price), to_riyals(item_total)
+                    ], item_styles)
             
-            # Save to BytesIO
-            excel_file = BytesIO()
-            wb.save(excel_file)
-            excel_file.seek(0)
+            monthly_ws, monthly_styles = self._add_sheet(
+                wb, "Monthly", "الملخص الشهري",
+                headers=["الشهر"] + summary_headers,
+                column_widths=[12, 12, 15, 12, 15, 15],
+                money_columns="CDEF"
+            )
+            self._append_summary(monthly_ws, monthly_styles, monthly, label_columns=1)
             
-            logger.info(f"Generated items report with {len(items)} records")
-            return excel_file
+            suppliers_ws, supplier_styles = self._add_sheet(
+                wb, "Suppliers", "ملخص الموردين",
+                headers=["المورد", "الرقم الضريبي"] + summary_headers,
+                column_widths=[30, 20, 12, 15, 12, 15, 15],
+                money_columns="DEFG"
+            )
+            self._append_summary(suppliers_ws, supplier_styles, suppliers, label_columns=2)
             
+            excel_file, size = self._save(wb, output)
         except Exception as e:
-            logger.error(f"Failed to generate items report: {e}")
+            logger.error(f"Failed to generate combined report: {e}")
             raise
-
+        
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Generated combined report with {invoice_count} invoices and {item_count} items "
+            f"in {elapsed:.2f}s ({size / 1e6:.1f} MB)"
+        )
+        return ExportResult(excel_file, invoice_count)
+    
+    def _write_report(
+        self,
+        sheet_title: str,
+        title: str,
+        headers: List[str],
+        column_widths: List[int],
+        money_columns: Sequence[str],
+        rows: Iterable[Tuple],
+        to_values: Callable[[int, Tuple], list],
+        output: Optional[BinaryIO] = None,
+        totals: Optional[list] = None
+    ) -> ExportResult:
+        """Stream rows into a single-sheet write-only workbook, optionally ending with a totals row."""
+        started = time.perf_counter()
+        
+        wb = Workbook(write_only=True)
+        excel_styles.register_styles(wb)
+        ws, column_styles = self._add_sheet(wb, sheet_title, title, headers, column_widths, money_columns)
+        
+        # Data rows
+        row_count = 0
+        for row_count, row in enumerate(rows, start=1):
+            self._append_row(ws, to_values(row_count, row), column_styles)
+            
+            if row_count % PROGRESS_LOG_ROWS == 0:
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"{sheet_title} report: {row_count} rows in {elapsed:.2f}s "
+                    f"({row_count / elapsed:.0f} rows/s)"
+                )
+        
+        if totals is not None:
+            self._append_row(ws, totals, [excel_styles.TOTAL] * len(totals))
+        
+        excel_file, size = self._save(wb, output)
+        
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Generated {sheet_title.lower()} report with {row_count} records "
+            f"in {elapsed:.2f}s ({size / 1e6:.1f} MB)"
+        )
+        return ExportResult(excel_file, row_count)
+    
+    @staticmethod
+    def _add_sheet(
+        wb: Workbook,
+        sheet_title: str,
+        title: str,
+        headers: List[str],
+        column_widths: List[int],
+        money_columns: Sequence[str]
+    ) -> Tuple[object, List[str]]:
+        """
+        Add a write-only sheet with its title and header rows.
+        
+        Returns:
+            (worksheet, style name of each data column)
+        """
+        ws = wb.create_sheet(sheet_title)
+        ws.sheet_view.rightToLeft = True
+        
+        # Layout must be set before the first row is written
+        for i, width in enumerate(column_widths, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+        for column in money_columns:
+            excel_styles.format_money_column(ws, column)
+        ws.merged_cells.add(f"A1:{get_column_letter(len(headers))}1")
+        
+        # Title
+        title_cell = WriteOnlyCell(ws, value=title)
+        title_cell.style = excel_styles.TITLE
+        ws.append([title_cell])
+        ws.append([])
+        
+        # Headers
+        ExportGenerator._append_row(ws, headers, [excel_styles.HEADER] * len(headers))
+        
+        column_styles = [
+            excel_styles.MONEY_CELL if get_column_letter(i) in money_columns else excel_styles.CELL
+            for i in range(1, len(headers) + 1)
+        ]
+        return ws, column_styles
+    
+    @staticmethod
+    def _append_row(ws, values: Sequence, styles: Sequence[str]):
+        """Append one row of styled cells to a write-only sheet."""
+        cells = []
+        for value, style in zip(values, styles):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style
+            cells.append(cell)
+        ws.append(cells)
+    
+    @staticmethod
+    def _append_summary(ws, styles: Sequence[str], rows: Iterable[Tuple], label_columns: int):
+        """
+        Append summary rows (labels, invoice count, money totals in halalas) and a totals row.
+        
+        Args:
+            label_columns: Number of leading label columns before the invoice count
+        """
+        grand = [0] * 5
+        for row in rows:
+            labels, counts = row[:label_columns], row[label_columns:]
+            grand = [total + (value or 0) for total, value in zip(grand, counts)]
+            ExportGenerator._append_row(ws, [label or "غير محدد" for label in labels] + [counts[0]] + [
+                to_riyals(amount) for amount in counts[1:]
+            ], styles)
+        
+        totals = ["الإجمالي"] + [None] * (label_columns - 1) + [grand[0]] + [
+            Money(amount).to_decimal() for amount in grand[1:]
+        ]
+        ExportGenerator._append_row(ws, totals, [excel_styles.TOTAL] * len(totals))
+    
+    @staticmethod
+    def _save(wb: Workbook, output: Optional[BinaryIO]) -> Tuple[BinaryIO, int]:
+        """Save the workbook and rewind the file; returns (file, size in bytes)."""
+        excel_file = output if output is not None else spooled_file()
+        wb.save(excel_file)
+        size = excel_file.tell()
+        excel_file.seek(0)
+        return excel_file, size
 
 # Global instance
 export_generator = ExportGenerator()
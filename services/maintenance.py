@@ -0,0 +1,53 @@
+"""
+Maintenance Service
+Periodic archival of old invoices and incremental vacuum of the hot database
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+
+from config.settings import settings
+from services.database import DatabaseService, db_service
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceService:
+    """Keeps the hot SQLite tables small enough to stay in page cache."""
+    
+    def __init__(self, db: DatabaseService, archive_after_days: int, vacuum_pages: int):
+        """
+        Args:
+            db: Database service to maintain
+            archive_after_days: Archive invoices older than this (0 = never)
+            vacuum_pages: Pages released per incremental vacuum (0 = all)
+        """
+        self.db = db
+        self.archive_after_days = archive_after_days
+        self.vacuum_pages = vacuum_pages
+    
+    def run_once(self):
+        """Archive invoices past the horizon, then release freed pages."""
+        if self.archive_after_days > 0:
+            cutoff = (date.today() - timedelta(days=self.archive_after_days)).isoformat()
+            self.db.archive_old_invoices(cutoff)
+        
+        self.db.incremental_vacuum(self.vacuum_pages)
+    
+    async def run_forever(self, interval_seconds: float):
+        """Run maintenance now and then every interval until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Maintenance run failed: {e}")
+            
+            await asyncio.sleep(interval_seconds)
+
+
+# Global instance
+maintenance_service = MaintenanceService(
+    db_service,
+    archive_after_days=settings.ARCHIVE_AFTER_DAYS,
+    vacuum_pages=settings.VACUUM_MAX_PAGES
+)
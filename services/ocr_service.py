@@ -8,6 +8,8 @@ import google.generativeai as genai
 
 from config.settings import settings
 from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from utils.dates import iso_date
 
 logger = logging.getLogger(__name__)
 
@@ -64,9 +66,9 @@ class OCRService:
     - أرجع JSON فقط بدون أي شرح
     
     📅 **صياغة التاريخ (مهم جداً):**
-    - مهما كانت صياغة التاريخ في الفاتورة، أرجعه دائماً بصيغة: DD/MM/YYYY
-    - مثال: إذا كان "2024-01-15" أو "15/1/24" → أرجعه "15/01/2024"
-    - تأكد أن اليوم أولاً، ثم الشهر، ثم السنة كاملة (4 أرقام)
+    - مهما كانت صياغة التاريخ في الفاتورة، أرجعه دائماً بصيغة: YYYY-MM-DD
+    - مثال: إذا كان "15/01/2024" أو "15/1/24" → أرجعه "2024-01-15"
+    - السنة كاملة (4 أرقام) أولاً، ثم الشهر، ثم اليوم
 
     📦 **تعليمات خاصة بالوحدات (مهم جداً):**
     
@@ -125,25 +127,26 @@ class OCRService:
             
             # Convert to InvoiceData
             invoice = InvoiceData(
-                supplier_name=data.get("supplier_name", ""),
-                tax_number=data.get("tax_number", ""),
-                invoice_number=data.get("invoice_number", ""),
-                invoice_date=data.get("invoice_date", ""),
-                subtotal=float(data.get("subtotal", 0)),
-                discount=float(data.get("discount", 0)),
-                tax_rate=float(data.get("tax_rate", 0)),
-                tax_amount=float(data.get("tax_amount", 0)),
-                total_amount=float(data.get("total_amount", 0)),
+                supplier_name=data.get("supplier_name") or "",
+                tax_number=data.get("tax_number") or "",
+                invoice_number=data.get("invoice_number") or "",
+                # Stored as YYYY-MM-DD; anything unrecognized is kept for the user to fix
+                invoice_date=iso_date(data.get("invoice_date")) or data.get("invoice_date") or "",
+                subtotal=Money.of(data.get("subtotal", 0)),
+                discount=Money.of(data.get("discount", 0)),
+                tax_rate=float(data.get("tax_rate") or 0),
+                tax_amount=Money.of(data.get("tax_amount", 0)),
+                total_amount=Money.of(data.get("total_amount", 0)),
             )
             
             # Convert items
-            for item_data in data.get("items", []):
+            for item_data in data.get("items") or []:
                 item = InvoiceItem(
-                    name=item_data.get("name", ""),
-                    quantity=float(item_data.get("quantity", 0)),
-                    unit=item_data.get("unit", ""),
-                    unit_price=float(item_data.get("unit_price", 0)),
-                    total=float(item_data.get("total", 0)),
+                    name=item_data.get("name") or "",
+                    quantity=float(item_data.get("quantity") or 0),
+                    unit=item_data.get("unit") or "",
+                    unit_price=Money.of(item_data.get("unit_price", 0)),
+                    total=Money.of(item_data.get("total", 0)),
                 )
                 invoice.items.append(item)
             
@@ -0,0 +1,190 @@
+"""
+ZATCA QR Service
+Reads the e-invoice QR code of Saudi tax invoices to prefill and cross-check OCR results
+"""
+import base64
+import binascii
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from models.invoice import InvoiceData
+from models.money import Money
+from utils.dates import iso_date
+
+logger = logging.getLogger(__name__)
+
+# TLV tags of the ZATCA QR payload (phase 2 adds hash/signature tags, ignored here)
+TAG_SELLER_NAME = 1
+TAG_VAT_NUMBER = 2
+TAG_TIMESTAMP = 3
+TAG_TOTAL = 4
+TAG_VAT_AMOUNT = 5
+
+# Photos are downscaled to this longest side when the QR is not found at full size
+QR_RETRY_MAX_SIDE = 1200
+
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
+
+
+@dataclass
+class ZatcaQR:
+    """Fields of a ZATCA e-invoice QR code."""
+    seller_name: str = ""
+    vat_number: str = ""
+    timestamp: str = ""
+    total: Money = Money(0)
+    vat_amount: Money = Money(0)
+    
+    @property
+    def invoice_date(self) -> str:
+        """Invoice date as YYYY-MM-DD (the stored format), or "" if unreadable."""
+        return iso_date(self.timestamp) or ""
+
+
+def _normalize_number(value: str) -> str:
+    """Digits only, with Arabic-Indic digits converted."""
+    return "".join(ch for ch in value.translate(_ARABIC_DIGITS) if ch.isdigit())
+
+
+def parse_tlv(payload: str) -> Optional[ZatcaQR]:
+    """
+    Parse the base64 TLV payload of a ZATCA QR code.
+    
+    Args:
+        payload: Text decoded from the QR code
+    
+    Returns:
+        ZatcaQR, or None if the payload is not a ZATCA invoice QR
+    """
+    try:
+        data = base64.b64decode(payload.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    
+    values = {}
+    pos = 0
+    while pos + 2 <= len(data):
+        # One tag byte and one length byte (0-255): 128+ byte values are not BER long lengths
+        tag, length = data[pos], data[pos + 1]
+        pos += 2
+        if pos + length > len(data):
+            return None
+        values[tag] = data[pos:pos + length]
+        pos += length
+    
+    if TAG_TOTAL not in values or TAG_VAT_AMOUNT not in values:
+        return None
+    
+    try:
+        return ZatcaQR(
+            seller_name=values.get(TAG_SELLER_NAME, b"").decode("utf-8").strip(),
+            vat_number=_normalize_number(values.get(TAG_VAT_NUMBER, b"").decode("utf-8")),
+            timestamp=values.get(TAG_TIMESTAMP, b"").decode("utf-8").strip(),
+            total=Money.of(values[TAG_TOTAL].decode("utf-8")),
+            vat_amount=Money.of(values[TAG_VAT_AMOUNT].decode("utf-8")),
+        )
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def read_qr(image_bytes: bytes) -> Optional[ZatcaQR]:
+    """
+    Find and parse the ZATCA QR code of an invoice photo.
+    
+    CPU-bound; run it in the render pool (see RenderPool.read_qr).
+    
+    Returns:
+        ZatcaQR, or None if the photo has no readable ZATCA QR code
+    """
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    
+    detector = cv2.QRCodeDetector()
+    payload, _, _ = detector.detectAndDecode(image)
+    
+    # Large photos of long receipts often decode only once scaled down
+    longest = max(image.shape[:2])
+    if not payload and longest > QR_RETRY_MAX_SIDE:
+        scale = QR_RETRY_MAX_SIDE / longest
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        payload, _, _ = detector.detectAndDecode(image)
+    
+    return parse_tlv(payload) if payload else None
+
+
+class QRService:
+    """Reconciles OCR results with the invoice's ZATCA QR code."""
+    
+    def __init__(self, tolerance: float = 0.5):
+        """
+        Args:
+            tolerance: Maximum allowed difference in riyals (default 0.5)
+        """
+        self.tolerance = Money.of(tolerance)
+    
+    def apply(self, invoice: InvoiceData, qr: ZatcaQR) -> List[str]:
+        """
+        Prefill and correct invoice header fields from the QR code.
+        
+        The QR is machine-readable, so its VAT number, date and totals
+        replace what OCR read; the supplier name is only filled in when
+        missing, since invoices often print a trade name in the header.
+        
+        Returns:
+            Notes describing each OCR value that disagreed with the QR
+        """
+        notes = []
+        
+        if qr.seller_name and not invoice.supplier_name:
+            invoice.supplier_name = qr.seller_name
+        
+        if qr.vat_number:
+            if invoice.tax_number and _normalize_number(invoice.tax_number) != qr.vat_number:
+                notes.append(f"الرقم الضريبي المقروء ({invoice.tax_number}) يختلف عن رمز QR ({qr.vat_number})")
+            invoice.tax_number = qr.vat_number
+        
+        qr_date = qr.invoice_date
+        if qr_date:
+            if invoice.invoice_date and iso_date(invoice.invoice_date) != qr_date:
+                notes.append(f"التاريخ المقروء ({invoice.invoice_date}) يختلف عن رمز QR ({qr_date})")
+            invoice.invoice_date = qr_date
+        
+        for label, field, qr_value in (
+            ("الإجمالي", "total_amount", qr.total),
+            ("الضريبة", "tax_amount", qr.vat_amount),
+        ):
+            ocr_value = getattr(invoice, field)
+            if ocr_value and abs(ocr_value - qr_value) > self.tolerance:
+                notes.append(f"{label} المقروء ({ocr_value:.2f}) يختلف عن رمز QR ({qr_value:.2f})")
+            setattr(invoice, field, qr_value)
+        
+        if notes:
+            logger.info(f"QR cross-check corrected {len(notes)} field(s) of invoice {invoice.invoice_number}")
+        return notes
+    
+    def settles_totals(self, invoice: InvoiceData) -> bool:
+        """
+        Whether the items agree with the QR totals applied by apply().
+        
+        Σ(item.total) - discount + QR VAT must equal the QR total; if so
+        the subtotal is taken from the items and no further audit of the
+        totals is needed.
+        """
+        if not invoice.total_amount:
+            return False
+        
+        items_total = Money(sum(item.total for item in invoice.items))
+        if abs(items_total - invoice.discount + invoice.tax_amount - invoice.total_amount) > self.tolerance:
+            return False
+        
+        invoice.subtotal = items_total
+        return True
+
+
+# Global instance
+qr_service = QRService()
@@ -0,0 +1,264 @@
+"""
+Render Pool
+Builds Excel workbooks and decodes invoice QR codes in worker processes so CPU work never blocks the bot
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from config.settings import settings
+from models.invoice import InvoiceData
+from services.excel_generator import excel_generator
+from services.export_generator import ExportResult, export_generator
+from services.qr_service import ZatcaQR, read_qr
+
+logger = logging.getLogger(__name__)
+
+
+class RowSpool:
+    """
+    Temporary file of rows on their way to a worker.
+    
+    The bot appends rows chunk by chunk as they stream from the database
+    and the worker reads them back the same way, so neither process
+    holds a whole export in memory and only the file path is pickled.
+    Use as a context manager: the file is removed on exit.
+    """
+    
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="fatoorah-rows-", suffix=".pickle")
+        self._file = os.fdopen(fd, "wb")
+        self.row_count = 0
+    
+    async def write(self, chunk: List[Tuple]):
+        """Append a chunk of rows."""
+        await asyncio.to_thread(pickle.dump, chunk, self._file, pickle.HIGHEST_PROTOCOL)
+        self.row_count += len(chunk)
+    
+    def close(self):
+        """Finish writing; the worker opens the file by path."""
+        self._file.close()
+    
+    def read(self) -> Iterator[Tuple]:
+        """Finish writing and read the rows back chunk by chunk, in this process."""
+        return iter(_read_rows(_spool_source(self)))
+    
+    def __enter__(self) -> "RowSpool":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._file.close()
+        # A worker still reading keeps its open handle
+        os.unlink(self.path)
+
+
+# Rows handed to a render: a list for small reports, a RowSpool for exports
+Rows = Union[List[Tuple], RowSpool]
+
+
+def _spool_source(rows: Rows) -> Union[List[Tuple], str]:
+    """What crosses the process boundary for rows: the list itself or the spool's path."""
+    if isinstance(rows, RowSpool):
+        rows.close()
+        return rows.path
+    return rows
+
+
+# Worker-side functions: module level so they pickle by reference. Reports
+# are written to a temporary file and only its path crosses the process
+# boundary, so large workbooks are never held in memory on either side
+
+def _read_rows(source: Union[List[Tuple], str]) -> Iterable[Tuple]:
+    """Rows of a render: a list as is, or a RowSpool path read chunk by chunk."""
+    if not isinstance(source, str):
+        return source
+    
+    def spooled() -> Iterator[Tuple]:
+        with open(source, "rb") as spool:
+            while True:
+                try:
+                    chunk = pickle.load(spool)
+                except EOFError:
+                    return
+                yield from chunk
+    
+    return spooled()
+
+
+def _render_to_file(generate, rows: Union[List[Tuple], str]) -> Tuple[str, int]:
+    fd, path = tempfile.mkstemp(prefix="fatoorah-report-", suffix=".xlsx")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            report = generate(_read_rows(rows), output=output)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path, report.row_count
+
+
+def _render_invoices_report(rows: Union[List[Tuple], str]) -> Tuple[str, int]:
+    return _render_to_file(export_generator.generate_invoices_report, rows)
+
+
+def _render_items_report(rows: Union[List[Tuple], str]) -> Tuple[str, int]:
+    return _render_to_file(export_generator.generate_items_report, rows)
+
+
+def _render_vat_summary(rows: Union[List[Tuple], str], period: str) -> Tuple[str, int]:
+    return _render_to_file(partial(export_generator.generate_vat_summary, period=period), rows)
+
+
+def _render_combined_report(
+    lines: Union[List[Tuple], str],
+    monthly: List[Tuple],
+    suppliers: List[Tuple]
+) -> Tuple[str, int]:
+    generate = partial(export_generator.generate_combined_report, monthly=monthly, suppliers=suppliers)
+    return _render_to_file(generate, lines)
+
+
+def _render_invoice(invoice: InvoiceData) -> bytes:
+    return excel_generator.generate(invoice).getvalue()
+
+
+def _discard_report(future: "asyncio.Future"):
+    """Remove the file of a render nobody is waiting for any more."""
+    if not future.cancelled() and future.exception() is None:
+        os.unlink(future.result()[0])
+
+
+class RenderPool:
+    """
+    Process pool for CPU-bound workbook rendering.
+    
+    Callers fetch rows as plain tuples (INVOICE_COLUMNS / ITEM_COLUMNS)
+    and await the rendered file; exports from different users build in
+    parallel on separate cores. Until start() is called, or with
+    max_workers=0, rendering falls back to the default thread pool.
+    """
+    
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+    
+    def start(self):
+        """
+        Start the worker processes.
+        
+        Call once at startup, before other threads exist: workers are
+        forked, and forking a process that already runs threads can copy
+        a lock in its held state.
+        """
+        if self._executor is not None or self.max_workers <= 0:
+            return
+        
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("fork")
+        )
+        # The first submit forks every worker up front
+        self._executor.submit(int)
+        logger.info(f"Render pool started with {self.max_workers} workers")
+    
+    def shutdown(self):
+        """Stop the workers, cancelling queued renders."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    async def _run(self, func, *args):
+        """Run func(*args) in the pool (or a thread if the pool is not running)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+    
+    async def _run_report(self, func, *args) -> ExportResult:
+        """
+        Render a report to a temporary file and open it.
+        
+        The opened file is already unlinked and lives until closed. If the
+        caller is cancelled mid-render, the worker still finishes, so its
+        file is removed once it is done.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(func, *args))
+        try:
+            path, row_count = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(_discard_report)
+            raise
+        
+        file = open(path, "rb")
+        os.unlink(path)
+        return ExportResult(file, row_count)
+    
+    async def invoices_report(self, rows: Rows) -> ExportResult:
+        """
+        Render the invoices report.
+        
+        Args:
+            rows: Invoice tuples ordered as INVOICE_COLUMNS, or a RowSpool of them
+        """
+        return await self._run_report(_render_invoices_report, _spool_source(rows))
+    
+    async def items_report(self, rows: Rows) -> ExportResult:
+        """
+        Render the items report.
+        
+        Args:
+            rows: Item tuples ordered as ITEM_COLUMNS, or a RowSpool of them
+        """
+        return await self._run_report(_render_items_report, _spool_source(rows))
+    
+    async def vat_summary(self, rows: Rows, period: str) -> ExportResult:
+        """
+        Render the per-supplier VAT summary of a period.
+        
+        Args:
+            rows: Invoice tuples ordered as INVOICE_COLUMNS, or a RowSpool of them
+            period: Period shown in the title (YYYY-MM)
+        """
+        return await self._run_report(_render_vat_summary, _spool_source(rows), period)
+    
+    async def combined_report(
+        self,
+        lines: Rows,
+        monthly: List[Tuple],
+        suppliers: List[Tuple]
+    ) -> ExportResult:
+        """
+        Render the combined invoices + items workbook with its summary sheets.
+        
+        Args:
+            lines: Joined tuples ordered as INVOICE_LINE_COLUMNS, or a RowSpool of them
+            monthly: Summary tuples ordered as MONTHLY_SUMMARY_COLUMNS
+            suppliers: Summary tuples ordered as SUPPLIER_SUMMARY_COLUMNS
+        """
+        return await self._run_report(_render_combined_report, _spool_source(lines), monthly, suppliers)
+    
+    async def invoice_workbook(self, invoice: InvoiceData) -> BytesIO:
+        """Render a single invoice as an Excel file."""
+        return BytesIO(await self._run(_render_invoice, invoice))
+    
+    async def read_qr(self, image_bytes: bytes) -> Optional[ZatcaQR]:
+        """
+        Decode the ZATCA QR code of an invoice photo.
+        
+        Returns:
+            ZatcaQR, or None if there is none or decoding failed
+        """
+        try:
+            return await self._run(read_qr, image_bytes)
+        except Exception as e:
+            logger.warning(f"QR decoding failed: {e}")
+            return None
+
+
+# Global instance
+render_pool = RenderPool(max_workers=settings.RENDER_WORKERS)
@@ -0,0 +1,28 @@
+"""
+Storage Backends
+Select the invoice repository configured by STORAGE_BACKEND
+"""
+from config.settings import settings
+from services.database import DuplicateInvoiceError
+from services.storage.base import InvoiceRepository
+
+
+def create_repository() -> InvoiceRepository:
+    """Create the invoice repository for the configured backend."""
+    if settings.STORAGE_BACKEND == "postgres":
+        from services.storage.postgres import PostgresInvoiceRepository
+        return PostgresInvoiceRepository(
+            settings.DATABASE_URL,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE
+        )
+    
+    from services.database import db_service
+    from services.storage.sqlite import SQLiteInvoiceRepository
+    return SQLiteInvoiceRepository(db_service)
+
+
+# Global instance
+repository = create_repository()
+
+__all__ = ["DuplicateInvoiceError", "InvoiceRepository", "create_repository", "repository"]
@@ -0,0 +1,211 @@
+"""
+Invoice Repository Interface
+Storage operations the bot handlers depend on, independent of the database engine
+"""
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional, Tuple
+
+from models.invoice import InvoiceData
+from services.database import STREAM_CHUNK_SIZE, page_cursor
+
+
+class InvoiceRepository(ABC):
+    """
+    Async invoice storage.
+    
+    Streaming methods yield plain tuples ordered as INVOICE_COLUMNS /
+    ITEM_COLUMNS (services.database), newest invoice date first, with
+    money columns in halalas.
+    """
+    
+    # True when db_service (stats, price history, search) reads the same data
+    local_reports = False
+    
+    async def connect(self) -> None:
+        """Open connections / create schema. Called once at startup."""
+    
+    async def close(self) -> None:
+        """Release connections. Called once at shutdown."""
+    
+    @abstractmethod
+    async def save_invoice(self, user_id: int, invoice: InvoiceData, allow_duplicate: bool = False) -> int:
+        """
+        Save invoice with its items and return the new invoice ID.
+        
+        Raises:
+            DuplicateInvoiceError: If the user already saved this normalized
+                invoice number + tax number and allow_duplicate is False
+        """
+    
+    @abstractmethod
+    async def check_duplicate_invoice(self, user_id: int, invoice_number: str, tax_number: str) -> bool:
+        """Check if user already saved an invoice with this (normalized) number + tax number."""
+    
+    @abstractmethod
+    async def get_invoice_count(self, user_id: int) -> int:
+        """Get total number of invoices for user."""
+    
+    @abstractmethod
+    async def get_data_version(self, user_id: int) -> int:
+        """Get user's data version; it changes whenever their invoices change."""
+    
+    @abstractmethod
+    async def get_page(
+        self,
+        table: str,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        """
+        Fetch one keyset page of "invoices" or "invoice_items".
+        
+        Args:
+            after: page_cursor() of the last row of the previous page
+        """
+    
+    @abstractmethod
+    async def get_invoice_lines_page(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        """
+        Fetch up to limit invoices joined with their items (INVOICE_LINE_COLUMNS).
+        
+        Args:
+            after: page_cursor("invoices", ...) of the last invoice of the previous page
+        """
+    
+    @abstractmethod
+    async def get_monthly_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        """Get user's totals per month, newest first (MONTHLY_SUMMARY_COLUMNS)."""
+    
+    @abstractmethod
+    async def get_supplier_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        """Get user's totals per supplier, largest first (SUPPLIER_SUMMARY_COLUMNS)."""
+    
+    @abstractmethod
+    async def add_subscription(self, user_id: int, chat_id: int, report: str, last_period: str) -> bool:
+        """
+        Subscribe user to a scheduled report; False if already subscribed.
+        
+        Args:
+            last_period: Period (YYYY-MM) treated as already delivered
+        """
+    
+    @abstractmethod
+    async def delete_subscriptions(self, user_id: int, report: Optional[str] = None) -> int:
+        """Unsubscribe user from one report type (all if None); returns subscriptions removed."""
+    
+    @abstractmethod
+    async def get_user_subscriptions(self, user_id: int) -> List[str]:
+        """Get the report types user is subscribed to."""
+    
+    @abstractmethod
+    async def get_due_subscriptions(self, period: str) -> List[Tuple[int, int, str]]:
+        """Get (user_id, chat_id, report) of subscriptions not yet delivered for period, sorted by user."""
+    
+    @abstractmethod
+    async def mark_subscription_sent(self, user_id: int, report: str, period: str) -> None:
+        """Record that user's report for period (YYYY-MM) was delivered."""
+    
+    @abstractmethod
+    async def get_period_invoices(self, user_ids: List[int], start_date: str, end_date: str) -> List[Tuple]:
+        """
+        Fetch the invoices of several users for one date range in a single query.
+        
+        Returns:
+            (user_id, *INVOICE_COLUMNS) tuples sorted by user, newest first per user
+        """
+    
+    async def _iter_pages(
+        self,
+        table: str,
+        user_id: int,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        chunk_size: int
+    ) -> AsyncIterator[Tuple]:
+        after = None
+        while True:
+            rows = await self.get_page(table, user_id, start_date, end_date, after, chunk_size)
+            for row in rows:
+                yield row
+            
+            if len(rows) < chunk_size:
+                break
+            
+            after = page_cursor(table, rows[-1])
+    
+    def iter_user_invoices(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> AsyncIterator[Tuple]:
+        """Stream user's invoices as INVOICE_COLUMNS tuples."""
+        return self._iter_pages("invoices", user_id, start_date, end_date, chunk_size)
+    
+    def iter_user_items(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> AsyncIterator[Tuple]:
+        """Stream user's invoice items as ITEM_COLUMNS tuples."""
+        return self._iter_pages("invoice_items", user_id, start_date, end_date, chunk_size)
+    
+    async def iter_invoice_lines(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> AsyncIterator[Tuple]:
+        """Stream user's invoices, each followed by its items, as INVOICE_LINE_COLUMNS tuples."""
+        after = None
+        while True:
+            rows = await self.get_invoice_lines_page(user_id, start_date, end_date, after, chunk_size)
+            for row in rows:
+                yield row
+            
+            if len({row[0] for row in rows}) < chunk_size:
+                break
+            
+            after = page_cursor("invoices", rows[-1])
+    
+    async def get_user_invoices(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        """Get all of user's invoices as INVOICE_COLUMNS tuples."""
+        return [row async for row in self.iter_user_invoices(user_id, start_date, end_date)]
+    
+    async def get_user_items(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        """Get all of user's invoice items as ITEM_COLUMNS tuples."""
+        return [row async for row in self.iter_user_items(user_id, start_date, end_date)]
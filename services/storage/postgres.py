@@ -0,0 +1,449 @@
+"""
+PostgreSQL Invoice Repository
+Shared storage for running several bot instances, over an asyncpg pool
+"""
+import logging
+from typing import List, Optional, Tuple
+
+from models.invoice import InvoiceData
+from models.money import Money
+from services.database import INVOICE_COLUMNS, KEYSET_COLUMNS, MONEY_COLUMNS, STREAM_CHUNK_SIZE, DuplicateInvoiceError, invoice_key
+from services.storage.base import InvoiceRepository
+from utils.dates import iso_date
+from utils.text_normalization import normalize_text
+
+try:
+    import asyncpg
+except ImportError:  # Only needed when STORAGE_BACKEND=postgres
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# YYYY-MM-DD of a stored invoice date, for YYYY-MM-DD / YYYY/MM/DD and OCR's DD/MM/YYYY (NULL if unknown)
+ISO_DATE_SQL = """(CASE
+    WHEN invoice_date ~ '^[0-9]{4}[-/][0-9]{2}[-/][0-9]{2}'
+        THEN substr(invoice_date, 1, 4) || '-' || substr(invoice_date, 6, 2) || '-' || substr(invoice_date, 9, 2)
+    WHEN invoice_date ~ '^[0-9]{2}[-/][0-9]{2}[-/][0-9]{4}'
+        THEN substr(invoice_date, 7, 4) || '-' || substr(invoice_date, 4, 2) || '-' || substr(invoice_date, 1, 2)
+END)"""
+
+# YYYY-MM of a stored invoice date, for YYYY-MM-DD / YYYY/MM/DD and OCR's DD/MM/YYYY ('' if unknown)
+MONTH_SQL = """(CASE
+    WHEN invoice_date ~ '^[0-9]{4}[-/][0-9]{2}[-/][0-9]{2}'
+        THEN substr(invoice_date, 1, 4) || '-' || substr(invoice_date, 6, 2)
+    WHEN invoice_date ~ '^[0-9]{2}[-/][0-9]{2}[-/][0-9]{4}'
+        THEN substr(invoice_date, 7, 4) || '-' || substr(invoice_date, 4, 2)
+    ELSE ''
+END)"""
+
+# Sort key of invoice and item rows: YYYY-MM-DD, or '' for undated rows (see services.database.date_key_sql)
+DATE_KEY_SQL = f"(COALESCE({ISO_DATE_SQL}, '') COLLATE \"C\")"
+
+
+# Same layout as the SQLite schema; money columns hold BIGINT halalas
+SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS invoices (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        supplier_name TEXT,
+        tax_number TEXT,
+        invoice_number TEXT,
+        invoice_date TEXT,
+        subtotal BIGINT DEFAULT 0,
+        discount BIGINT DEFAULT 0,
+        tax_amount BIGINT DEFAULT 0,
+        total_amount BIGINT DEFAULT 0,
+        created_at TIMESTAMPTZ DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS items_catalog (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        normalized_name TEXT NOT NULL,
+        unit_key TEXT NOT NULL DEFAULT '',
+        canonical_name TEXT,
+        unit TEXT,
+        created_at TIMESTAMPTZ DEFAULT now(),
+        UNIQUE (user_id, normalized_name, unit_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoice_items (
+        id BIGSERIAL PRIMARY KEY,
+        invoice_id BIGINT NOT NULL REFERENCES invoices (id) ON DELETE CASCADE,
+        user_id BIGINT NOT NULL,
+        item_name TEXT,
+        quantity DOUBLE PRECISION DEFAULT 0,
+        unit TEXT,
+        unit_price BIGINT DEFAULT 0,
+        total BIGINT DEFAULT 0,
+        invoice_date TEXT,
+        catalog_id BIGINT REFERENCES items_catalog (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoice_keys (
+        user_id BIGINT NOT NULL,
+        tax_key TEXT NOT NULL,
+        invoice_key TEXT NOT NULL,
+        invoice_id BIGINT NOT NULL REFERENCES invoices (id) ON DELETE CASCADE,
+        PRIMARY KEY (user_id, tax_key, invoice_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        user_id BIGINT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS report_subscriptions (
+        user_id BIGINT NOT NULL,
+        report TEXT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        last_period TEXT NOT NULL DEFAULT '',
+        created_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (user_id, report)
+    )
+    """,
+    # Every invoice write bumps the owner's data version, as the SQLite triggers do
+    """
+    CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+    DECLARE
+        owner BIGINT := CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END;
+    BEGIN
+        INSERT INTO data_versions (user_id, version) VALUES (owner, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = data_versions.version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_data_versions ON invoices",
+    """
+    CREATE TRIGGER trg_data_versions
+    AFTER INSERT OR UPDATE OR DELETE ON invoices
+    FOR EACH ROW EXECUTE FUNCTION bump_data_version()
+    """,
+    "DROP INDEX IF EXISTS idx_invoices_user_date",
+    "DROP INDEX IF EXISTS idx_items_user_date",
+    f"CREATE INDEX IF NOT EXISTS idx_invoices_user_day ON invoices (user_id, ({DATE_KEY_SQL}), id)",
+    f"CREATE INDEX IF NOT EXISTS idx_items_user_day ON invoice_items (user_id, ({DATE_KEY_SQL}), id)",
+    "CREATE INDEX IF NOT EXISTS idx_items_catalog_date ON invoice_items (catalog_id, invoice_date)",
+    "CREATE INDEX IF NOT EXISTS idx_items_invoice ON invoice_items (invoice_id)",
+)
+
+class PostgresInvoiceRepository(InvoiceRepository):
+    """Repository backed by a PostgreSQL server."""
+    
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+    
+    async def connect(self) -> None:
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is required for STORAGE_BACKEND=postgres")
+        
+        self.pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.min_size, max_size=self.max_size
+        )
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                keys_exist = await conn.fetchval("SELECT to_regclass('invoice_keys') IS NOT NULL")
+                for statement in SCHEMA_SQL:
+                    await conn.execute(statement)
+                # Dates are stored as YYYY-MM-DD; a no-op once older rows are rewritten
+                for table in ("invoices", "invoice_items"):
+                    await conn.execute(
+                        f"UPDATE {table} SET invoice_date = {ISO_DATE_SQL} WHERE {ISO_DATE_SQL} <> invoice_date"
+                    )
+                if not keys_exist:
+                    await self._backfill_invoice_keys(conn)
+        
+        logger.info(f"PostgreSQL pool ready ({self.min_size}-{self.max_size} connections)")
+    
+    @staticmethod
+    async def _backfill_invoice_keys(conn):
+        """Give the oldest invoice of each normalized key its duplicate-detection key."""
+        rows = await conn.fetch(
+            "SELECT id, user_id, invoice_number, tax_number FROM invoices ORDER BY id"
+        )
+        keys = []
+        for row in rows:
+            key = invoice_key(row["invoice_number"], row["tax_number"])
+            if key:
+                keys.append((row["user_id"], *key, row["id"]))
+        
+        await conn.executemany("""
+            INSERT INTO invoice_keys (user_id, tax_key, invoice_key, invoice_id)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT DO NOTHING
+        """, keys)
+    
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+    
+    async def save_invoice(self, user_id: int, invoice: InvoiceData, allow_duplicate: bool = False) -> int:
+        key = invoice_key(invoice.invoice_number, invoice.tax_number)
+        invoice_date = iso_date(invoice.invoice_date) or invoice.invoice_date
+        
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                invoice_id = await conn.fetchval("""
+                    INSERT INTO invoices (
+                        user_id, supplier_name, tax_number, invoice_number,
+                        invoice_date, subtotal, discount, tax_amount, total_amount
+                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                    RETURNING id
+                """,
+                    user_id,
+                    invoice.supplier_name,
+                    invoice.tax_number,
+                    invoice.invoice_number,
+                    invoice_date,
+                    Money.of(invoice.subtotal),
+                    Money.of(invoice.discount),
+                    Money.of(invoice.tax_amount),
+                    Money.of(invoice.total_amount)
+                )
+                
+                if key:
+                    claimed = await conn.fetchval("""
+                        INSERT INTO invoice_keys (user_id, tax_key, invoice_key, invoice_id)
+                        VALUES ($1, $2, $3, $4)
+                        ON CONFLICT DO NOTHING
+                        RETURNING invoice_id
+                    """, user_id, *key, invoice_id)
+                    
+                    if claimed is None and not allow_duplicate:
+                        # Raising inside the transaction block rolls the invoice back
+                        raise DuplicateInvoiceError(await conn.fetchval("""
+                            SELECT invoice_id FROM invoice_keys
+                            WHERE user_id = $1 AND tax_key = $2 AND invoice_key = $3
+                        """, user_id, *key))
+                
+                items = []
+                for item in invoice.items:
+                    catalog_id = await self._get_catalog_id(conn, user_id, item.name, item.unit)
+                    items.append((
+                        invoice_id,
+                        user_id,
+                        item.name,
+                        item.quantity,
+                        item.unit,
+                        Money.of(item.unit_price),
+                        Money.of(item.total),
+                        invoice_date,
+                        catalog_id
+                    ))
+                
+                await conn.executemany("""
+                    INSERT INTO invoice_items (
+                        invoice_id, user_id, item_name, quantity,
+                        unit, unit_price, total, invoice_date, catalog_id
+                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                """, items)
+        
+        logger.info(f"Saved invoice {invoice_id} for user {user_id}")
+        return invoice_id
+    
+    @staticmethod
+    async def _get_catalog_id(conn, user_id: int, name: str, unit: str) -> int:
+        """Get catalog ID for an item name/unit, creating the entry on first sight."""
+        # The no-op update makes RETURNING yield the existing row's ID too
+        return await conn.fetchval("""
+            INSERT INTO items_catalog (
+                user_id, normalized_name, unit_key, canonical_name, unit
+            ) VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id, normalized_name, unit_key)
+            DO UPDATE SET unit_key = EXCLUDED.unit_key
+            RETURNING id
+        """, user_id, normalize_text(name), normalize_text(unit), name, unit)
+    
+    async def check_duplicate_invoice(self, user_id: int, invoice_number: str, tax_number: str) -> bool:
+        key = invoice_key(invoice_number, tax_number)
+        if not key:
+            return False
+        
+        # No in-memory filter here: other bot instances write to the same tables
+        return await self.pool.fetchval("""
+            SELECT EXISTS (
+                SELECT 1 FROM invoice_keys
+                WHERE user_id = $1 AND tax_key = $2 AND invoice_key = $3
+            )
+        """, user_id, *key)
+    
+    async def get_invoice_count(self, user_id: int) -> int:
+        return await self.pool.fetchval(
+            "SELECT COUNT(*) FROM invoices WHERE user_id = $1", user_id
+        )
+    
+    async def get_data_version(self, user_id: int) -> int:
+        version = await self.pool.fetchval(
+            "SELECT version FROM data_versions WHERE user_id = $1", user_id
+        )
+        return version or 0
+    
+    async def get_page(
+        self,
+        table: str,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        columns = KEYSET_COLUMNS[table]
+        params = [user_id]
+        query = self._range_filter(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = $1",
+            params, start_date, end_date
+        )
+        
+        if after is not None:
+            params.extend(after)
+            query += f" AND ({DATE_KEY_SQL}, id) < (${len(params) - 1}, ${len(params)})"
+        
+        params.append(limit)
+        query += f" ORDER BY {DATE_KEY_SQL} DESC, id DESC LIMIT ${len(params)}"
+        
+        rows = await self.pool.fetch(query, *params)
+        return [tuple(row) for row in rows]
+    
+    @staticmethod
+    def _range_filter(query: str, params: list, start_date: Optional[str], end_date: Optional[str]) -> str:
+        """
+        Append the optional date range conditions to query and their values to params.
+        
+        Undated rows only match when there is no range.
+        """
+        if start_date:
+            params.append(start_date)
+            query += f" AND {DATE_KEY_SQL} >= ${len(params)}"
+        
+        if end_date:
+            params.append(end_date)
+            # '0' is above the '' key of undated rows
+            query += f" AND {DATE_KEY_SQL} BETWEEN '0' AND ${len(params)}"
+        
+        return query
+    
+    async def get_invoice_lines_page(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        params = [user_id]
+        query = self._range_filter(
+            f"SELECT {', '.join(INVOICE_COLUMNS)}, {DATE_KEY_SQL} AS date_key FROM invoices WHERE user_id = $1",
+            params, start_date, end_date
+        )
+        
+        if after is not None:
+            params.extend(after)
+            query += f" AND ({DATE_KEY_SQL}, id) < (${len(params) - 1}, ${len(params)})"
+        
+        params.append(limit)
+        query += f" ORDER BY {DATE_KEY_SQL} DESC, id DESC LIMIT ${len(params)}"
+        
+        invoice_columns = ", ".join(f"page.{col}" for col in INVOICE_COLUMNS)
+        rows = await self.pool.fetch(f"""
+            WITH page AS ({query})
+            SELECT {invoice_columns},
+                   it.id, it.item_name, it.quantity, it.unit, it.unit_price, it.total
+            FROM page
+            LEFT JOIN invoice_items it ON it.invoice_id = page.id
+            ORDER BY page.date_key DESC, page.id DESC, it.id
+        """, *params)
+        return [tuple(row) for row in rows]
+    
+    async def _get_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        group_columns: str,
+        order_by: str
+    ) -> List[Tuple]:
+        sums = ", ".join(f"SUM({col})" for col in MONEY_COLUMNS["invoices"])
+        params = [user_id]
+        query = self._range_filter(
+            f"SELECT {group_columns}, COUNT(*), {sums} FROM invoices WHERE user_id = $1",
+            params, start_date, end_date
+        )
+        rows = await self.pool.fetch(f"{query} GROUP BY 1 ORDER BY {order_by}", *params)
+        return [tuple(row) for row in rows]
+    
+    async def get_monthly_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        return await self._get_summary(user_id, start_date, end_date, MONTH_SQL, "1 COLLATE \"C\" DESC")
+    
+    async def get_supplier_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        return await self._get_summary(
+            user_id, start_date, end_date,
+            "COALESCE(supplier_name, ''), MAX(tax_number)", "SUM(total_amount) DESC"
+        )
+    
+    async def add_subscription(self, user_id: int, chat_id: int, report: str, last_period: str) -> bool:
+        status = await self.pool.execute("""
+            INSERT INTO report_subscriptions (user_id, report, chat_id, last_period)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (user_id, report) DO NOTHING
+        """, user_id, report, chat_id, last_period)
+        return status != "INSERT 0 0"
+    
+    async def delete_subscriptions(self, user_id: int, report: Optional[str] = None) -> int:
+        if report is None:
+            status = await self.pool.execute(
+                "DELETE FROM report_subscriptions WHERE user_id = $1", user_id
+            )
+        else:
+            status = await self.pool.execute(
+                "DELETE FROM report_subscriptions WHERE user_id = $1 AND report = $2", user_id, report
+            )
+        return int(status.split()[-1])
+    
+    async def get_user_subscriptions(self, user_id: int) -> List[str]:
+        rows = await self.pool.fetch(
+            "SELECT report FROM report_subscriptions WHERE user_id = $1 ORDER BY report", user_id
+        )
+        return [row["report"] for row in rows]
+    
+    async def get_due_subscriptions(self, period: str) -> List[Tuple[int, int, str]]:
+        rows = await self.pool.fetch("""
+            SELECT user_id, chat_id, report FROM report_subscriptions
+            WHERE last_period < $1
+            ORDER BY user_id, report
+        """, period)
+        return [tuple(row) for row in rows]
+    
+    async def mark_subscription_sent(self, user_id: int, report: str, period: str) -> None:
+        await self.pool.execute(
+            "UPDATE report_subscriptions SET last_period = $1 WHERE user_id = $2 AND report = $3",
+            period, user_id, report
+        )
+    
+    async def get_period_invoices(self, user_ids: List[int], start_date: str, end_date: str) -> List[Tuple]:
+        rows = await self.pool.fetch(f"""
+            SELECT user_id, {', '.join(INVOICE_COLUMNS)} FROM invoices
+            WHERE user_id = ANY($1::bigint[]) AND {ISO_DATE_SQL} BETWEEN $2 AND $3
+            ORDER BY user_id, {ISO_DATE_SQL} DESC, id DESC
+        """, user_ids, start_date, end_date)
+        return [tuple(row) for row in rows]
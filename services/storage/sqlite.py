@@ -0,0 +1,92 @@
+"""
+SQLite Invoice Repository
+Async adapter over DatabaseService; each call runs in a worker thread
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from models.invoice import InvoiceData
+from services.database import DatabaseService, STREAM_CHUNK_SIZE
+from services.storage.base import InvoiceRepository
+
+
+class SQLiteInvoiceRepository(InvoiceRepository):
+    """Repository backed by the local SQLite file."""
+    
+    local_reports = True
+    
+    def __init__(self, db: DatabaseService):
+        self.db = db
+    
+    async def save_invoice(self, user_id: int, invoice: InvoiceData, allow_duplicate: bool = False) -> int:
+        return await asyncio.to_thread(self.db.save_invoice, user_id, invoice, allow_duplicate)
+    
+    async def check_duplicate_invoice(self, user_id: int, invoice_number: str, tax_number: str) -> bool:
+        return await asyncio.to_thread(
+            self.db.check_duplicate_invoice, user_id, invoice_number, tax_number
+        )
+    
+    async def get_invoice_count(self, user_id: int) -> int:
+        return await asyncio.to_thread(self.db.get_invoice_count, user_id)
+    
+    async def get_data_version(self, user_id: int) -> int:
+        return await asyncio.to_thread(self.db.get_data_version, user_id)
+    
+    async def get_page(
+        self,
+        table: str,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        return await asyncio.to_thread(
+            self.db.get_keyset_page, table, user_id, start_date, end_date, after, limit
+        )
+    
+    async def get_invoice_lines_page(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple] = None,
+        limit: int = STREAM_CHUNK_SIZE
+    ) -> List[Tuple]:
+        return await asyncio.to_thread(
+            self.db.get_invoice_lines_page, user_id, start_date, end_date, after, limit
+        )
+    
+    async def get_monthly_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        return await asyncio.to_thread(self.db.get_monthly_summary, user_id, start_date, end_date)
+    
+    async def get_supplier_summary(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple]:
+        return await asyncio.to_thread(self.db.get_supplier_summary, user_id, start_date, end_date)
+    
+    async def add_subscription(self, user_id: int, chat_id: int, report: str, last_period: str) -> bool:
+        return await asyncio.to_thread(self.db.add_subscription, user_id, chat_id, report, last_period)
+    
+    async def delete_subscriptions(self, user_id: int, report: Optional[str] = None) -> int:
+        return await asyncio.to_thread(self.db.delete_subscriptions, user_id, report)
+    
+    async def get_user_subscriptions(self, user_id: int) -> List[str]:
+        return await asyncio.to_thread(self.db.get_user_subscriptions, user_id)
+    
+    async def get_due_subscriptions(self, period: str) -> List[Tuple[int, int, str]]:
+        return await asyncio.to_thread(self.db.get_due_subscriptions, period)
+    
+    async def mark_subscription_sent(self, user_id: int, report: str, period: str) -> None:
+        await asyncio.to_thread(self.db.mark_subscription_sent, user_id, report, period)
+    
+    async def get_period_invoices(self, user_ids: List[int], start_date: str, end_date: str) -> List[Tuple]:
+        return await asyncio.to_thread(self.db.get_period_invoices, user_ids, start_date, end_date)
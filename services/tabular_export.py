@@ -0,0 +1,167 @@
+"""
+Tabular Export Service
+Streams invoices and items to compressed CSV or Parquet for pandas and BI tools
+"""
+import csv
+import gzip
+import io
+import logging
+import time
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from models.money import to_riyals
+from services.database import KEYSET_COLUMNS, MONEY_COLUMNS
+from services.export_generator import ExportResult, spooled_file
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for Parquet exports
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Export formats and the file extension each is delivered with
+EXPORT_FORMATS = {
+    "xlsx": "xlsx",
+    "csv": "csv.gz",
+    "parquet": "parquet",
+}
+
+# Rows per Parquet row group; each group is built and written in one go
+PARQUET_ROW_GROUP_SIZE = 50_000
+
+# Columns that are not plain text, by name (money columns become decimals)
+_INTEGER_COLUMNS = ("id", "invoice_id")
+_FLOAT_COLUMNS = ("quantity",)
+
+
+def _chunks(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    """Split an iterable of rows into lists of at most size rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class TabularExporter:
+    """
+    Writes raw keyset rows ("invoices" or "invoice_items") as data files.
+    
+    Columns keep their database names and money is exported in riyals
+    with exact two-decimal precision. Rows are consumed once, chunk by
+    chunk, so any row iterator can be passed straight from the database.
+    """
+    
+    def write_csv(
+        self,
+        table: str,
+        rows: Iterable[Tuple],
+        output: Optional[BinaryIO] = None
+    ) -> ExportResult:
+        """
+        Write rows as gzip-compressed UTF-8 CSV with a header line.
+        
+        Args:
+            table: "invoices" or "invoice_items"
+            rows: Tuples ordered as KEYSET_COLUMNS[table]
+            output: File to write to (a new spooled temporary file if omitted)
+        """
+        started = time.perf_counter()
+        columns = KEYSET_COLUMNS[table]
+        money_indexes = [columns.index(name) for name in MONEY_COLUMNS[table]]
+        
+        output = output if output is not None else spooled_file()
+        row_count = 0
+        with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=6) as gz:
+            text = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow(columns)
+            
+            for row in rows:
+                values = list(row)
+                for i in money_indexes:
+                    values[i] = to_riyals(values[i])
+                writer.writerow(values)
+                row_count += 1
+            
+            text.flush()
+            text.detach()
+        
+        self._finish(table, "csv", row_count, output, started)
+        return ExportResult(output, row_count)
+    
+    def write_parquet(
+        self,
+        table: str,
+        rows: Iterable[Tuple],
+        output: Optional[BinaryIO] = None
+    ) -> ExportResult:
+        """
+        Write rows as a zstd-compressed Parquet file, one row group per chunk.
+        
+        Args:
+            table: "invoices" or "invoice_items"
+            rows: Tuples ordered as KEYSET_COLUMNS[table]
+            output: File to write to (a new spooled temporary file if omitted)
+        
+        Raises:
+            RuntimeError: If pyarrow is not installed
+        """
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet exports")
+        
+        started = time.perf_counter()
+        columns = KEYSET_COLUMNS[table]
+        schema = self._parquet_schema(table)
+        money = set(MONEY_COLUMNS[table])
+        
+        output = output if output is not None else spooled_file()
+        row_count = 0
+        with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+            for chunk in _chunks(rows, PARQUET_ROW_GROUP_SIZE):
+                arrays = []
+                for i, (name, values) in enumerate(zip(columns, zip(*chunk))):
+                    if name in money:
+                        values = [to_riyals(value) for value in values]
+                    arrays.append(pa.array(values, type=schema.field(i).type))
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                row_count += len(chunk)
+        
+        self._finish(table, "parquet", row_count, output, started)
+        return ExportResult(output, row_count)
+    
+    @staticmethod
+    def _parquet_schema(table: str) -> "pa.Schema":
+        """Arrow schema for a keyset table."""
+        money = MONEY_COLUMNS[table]
+        fields = []
+        for name in KEYSET_COLUMNS[table]:
+            if name in money:
+                field_type = pa.decimal128(18, 2)
+            elif name in _INTEGER_COLUMNS:
+                field_type = pa.int64()
+            elif name in _FLOAT_COLUMNS:
+                field_type = pa.float64()
+            else:
+                field_type = pa.string()
+            fields.append(pa.field(name, field_type))
+        return pa.schema(fields)
+    
+    @staticmethod
+    def _finish(table: str, file_format: str, row_count: int, output: BinaryIO, started: float):
+        """Rewind the written file for reading and log the export."""
+        size = output.tell()
+        output.seek(0)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Exported {row_count} {table} rows as {file_format} "
+            f"in {elapsed:.2f}s ({size / 1e6:.1f} MB)"
+        )
+
+
+# Global instance
+tabular_exporter = TabularExporter()
@@ -5,6 +5,7 @@ Validates invoice data for arithmetic accuracy
 import logging
 from typing import Tuple
 from models.invoice import InvoiceData
+from models.money import Money
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +18,9 @@ class ValidationService:
         Initialize validator.
         
         Args:
-            tolerance: Maximum allowed difference for validation (default 0.5)
+            tolerance: Maximum allowed difference in riyals (default 0.5)
         """
-        self.tolerance = tolerance
+        self.tolerance = Money.of(tolerance)
     
     def validate(self, invoice: InvoiceData) -> Tuple[bool, str]:
         """
@@ -32,9 +33,9 @@ class ValidationService:
         """
         try:
             # Sum item totals (extracted from invoice, not calculated)
-            calculated_subtotal = sum(
+            calculated_subtotal = Money(sum(
                 item.total for item in invoice.items
-            )
+            ))
             
             # Calculate expected total (subtotal - discount + tax)
             calculated_total = calculated_subtotal - invoice.discount + invoice.tax_amount
@@ -0,0 +1,13 @@
+"""
+Test setup
+The services open their SQLite files under data/ of the working directory
+when imported, so tests run from a scratch directory instead of the repo
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+scratch = tempfile.mkdtemp(prefix="fatoorah-tests-")
+os.chdir(scratch)
+atexit.register(shutil.rmtree, scratch, ignore_errors=True)
@@ -0,0 +1,132 @@
+"""
+Archive Tests
+Moving old invoices to the attached archive and reading across the horizon
+"""
+import threading
+
+import pytest
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from services.database import DatabaseService
+
+USER_ID = 7
+
+DATES = ["2025-09-05", "2025-03-01", "2024-12-31", "2024-06-15", "2023-01-10", ""]
+
+
+@pytest.fixture
+def db(tmp_path) -> DatabaseService:
+    db = DatabaseService(str(tmp_path / "invoices.db"))
+    for number, date in enumerate(DATES, 1):
+        db.save_invoice(USER_ID, InvoiceData(
+            supplier_name="مؤسسة التموين", tax_number="300000000000003",
+            invoice_number=f"A-{number}", invoice_date=date,
+            items=[InvoiceItem("أرز", 1.0, "كيس", Money(1000), Money(1000))],
+            subtotal=Money(1000), total_amount=Money(1000)
+        ))
+    return db
+
+
+def hot_and_archived(db: DatabaseService):
+    conn = db.get_connection(with_archive=True)
+    try:
+        return tuple(
+            conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+            for schema in ("main", "archive") for table in ("invoices", "invoice_items")
+        )
+    finally:
+        conn.close()
+
+
+def numbers(rows):
+    return [row[3] for row in rows]
+
+
+def all_pages(db: DatabaseService, start_date=None, end_date=None, limit=2):
+    return list(db._iter_keyset("invoices", USER_ID, start_date, end_date, limit))
+
+
+def test_archive_moves_invoices_with_items(db):
+    before = numbers(all_pages(db))
+    
+    assert db.archive_old_invoices("2025-01-01", batch_size=2) == 3
+    assert hot_and_archived(db) == (3, 3, 3, 3)
+    
+    conn = db.get_connection()
+    assert db.get_archive_horizon(conn) == "2025-01-01"
+    conn.close()
+    
+    # Undated invoices stay hot; every invoice is still read exactly once
+    assert numbers(all_pages(db)) == before
+    assert db.get_invoice_count(USER_ID) == len(DATES)
+
+
+def test_horizon_only_moves_forward(db):
+    db.archive_old_invoices("2025-01-01")
+    assert db.archive_old_invoices("2024-01-01") == 0
+    
+    conn = db.get_connection()
+    assert db.get_archive_horizon(conn) == "2025-01-01"
+    conn.close()
+
+
+@pytest.mark.parametrize("start_date, end_date, expected", [
+    ("2025-01-01", None, ["A-1", "A-2"]),
+    ("2024-06-01", "2025-06-30", ["A-2", "A-3", "A-4"]),
+    (None, "2024-12-31", ["A-3", "A-4", "A-5"]),
+])
+def test_ranges_across_horizon(db, start_date, expected, end_date):
+    db.archive_old_invoices("2025-01-01")
+    
+    assert numbers(all_pages(db, start_date, end_date)) == expected
+    assert [row["invoice_number"] for row in db.get_user_invoices(USER_ID, start_date, end_date)] == expected
+    assert len(db.get_user_items(USER_ID, start_date, end_date)) == len(expected)
+
+
+def test_range_after_horizon_reads_hot_tables(db):
+    db.archive_old_invoices("2025-01-01")
+    
+    conn, invoices, items = db._open_range("2025-01-01")
+    conn.close()
+    assert (invoices, items) == ("invoices", "invoice_items")
+    
+    conn, invoices, items = db._open_range("2024-12-01")
+    conn.close()
+    assert (invoices, items) == ("invoices_all", "invoice_items_all")
+
+
+def test_paging_during_archive_run(db):
+    before = numbers(all_pages(db))
+    pages = db._iter_keyset("invoices", USER_ID, None, None, 2)
+    
+    seen = [next(pages)[3] for _ in range(2)]
+    db.archive_old_invoices("2025-01-01", batch_size=1)
+    seen.extend(row[3] for row in pages)
+    
+    assert seen == before
+
+
+def test_archive_waits_for_open_read(db):
+    db.archive_old_invoices("2024-01-01")
+    conn, invoices, _ = db._open_range()
+    assert invoices == "invoices_all"
+    
+    def counts():
+        return [
+            conn.execute(f"SELECT COUNT(*) FROM {source} WHERE user_id = ?", (USER_ID,)).fetchone()[0]
+            for source in (invoices, "main.invoices")
+        ]
+    assert counts() == [len(DATES), 5]
+    
+    archiver = threading.Thread(target=db.archive_old_invoices, args=("2025-01-01",))
+    archiver.start()
+    archiver.join(0.3)
+    
+    # The archive run cannot commit under an open read, which keeps one consistent view
+    assert archiver.is_alive()
+    assert counts() == [len(DATES), 5]
+    conn.close()
+    
+    archiver.join()
+    assert hot_and_archived(db) == (3, 3, 3, 3)
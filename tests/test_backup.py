@@ -0,0 +1,103 @@
+"""
+Backup Tests
+Snapshot, verify, rotate and restore against a scratch database
+"""
+import gzip
+
+import pytest
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from services.backup import BackupService
+from services.database import DatabaseService
+
+USER_ID = 7
+
+
+def save(db: DatabaseService, number: str, date: str = "2025-09-05") -> int:
+    return db.save_invoice(USER_ID, InvoiceData(
+        supplier_name="مؤسسة التموين", tax_number="300000000000003",
+        invoice_number=number, invoice_date=date,
+        items=[InvoiceItem("أرز", 1.0, "كيس", Money(1000), Money(1000))],
+        subtotal=Money(1000), total_amount=Money(1000)
+    ))
+
+
+@pytest.fixture
+def db(tmp_path) -> DatabaseService:
+    db = DatabaseService(str(tmp_path / "invoices.db"))
+    for number in range(20):
+        save(db, f"A-{number}")
+    save(db, "OLD-1", "2020-01-01")
+    db.archive_old_invoices("2025-01-01")
+    return db
+
+
+@pytest.fixture
+def backups(db, tmp_path) -> BackupService:
+    return BackupService(db, backup_dir=str(tmp_path / "backups"), keep=2, pages_per_step=1, step_sleep=0)
+
+
+def test_snapshot_verify_restore(db, backups):
+    result = backups.create_snapshot()
+    
+    snapshot_dir = backups.backup_dir / result.name
+    assert sorted(path.name for path in snapshot_dir.iterdir()) == ["invoices.db.gz", "invoices_archive.db.gz"]
+    assert result.pages > 0 and result.bytes_copied > 0 and result.compressed_bytes > 0
+    assert backups.list_snapshots() == [result.name]
+    assert backups.verify_snapshot(result.name)
+    
+    save(db, "NEW-1")
+    assert db.get_invoice_count(USER_ID) == 22
+    
+    backups.restore_snapshot(result.name)
+    
+    # Both files come back, and the duplicate filter is reloaded from them
+    assert db.get_invoice_count(USER_ID) == 21
+    assert not db.check_duplicate_invoice(USER_ID, "NEW-1", "300000000000003")
+    assert db.check_duplicate_invoice(USER_ID, "OLD-1", "300000000000003")
+    assert [row["invoice_number"] for row in db.get_user_invoices(USER_ID, None, "2024-12-31")] == ["OLD-1"]
+    assert not list(snapshot_dir.glob(".*"))
+
+
+def test_rotation_keeps_newest(backups):
+    for name in ("20200101-000000", "20200102-000000", "20200103-000000"):
+        (backups.backup_dir / name).mkdir(parents=True)
+    
+    result = backups.create_snapshot()
+    
+    assert backups.list_snapshots() == [result.name, "20200103-000000"]
+
+
+def test_verify_detects_corruption(backups):
+    name = backups.create_snapshot().name
+    gz_path = backups.backup_dir / name / "invoices.db.gz"
+    with gzip.open(gz_path, "rb") as src:
+        data = bytearray(src.read())
+    data[100:4096] = b"\xff" * (4096 - 100)
+    with gzip.open(gz_path, "wb") as dst:
+        dst.write(bytes(data))
+    
+    assert not backups.verify_snapshot(name)
+    with pytest.raises(RuntimeError):
+        backups.restore_snapshot(name)
+    assert backups.db.get_invoice_count(USER_ID) == 21
+
+
+def test_failed_integrity_check_removes_snapshot(backups, monkeypatch):
+    def fail(path):
+        raise RuntimeError(f"Integrity check failed for {path.name}: page 2 is never used")
+    
+    monkeypatch.setattr(BackupService, "_check_integrity", staticmethod(fail))
+    
+    with pytest.raises(RuntimeError):
+        backups.create_snapshot()
+    assert backups.list_snapshots() == []
+
+
+def test_unknown_snapshot(backups):
+    assert backups.list_snapshots() == []
+    with pytest.raises(FileNotFoundError):
+        backups.verify_snapshot("20200101-000000")
+    with pytest.raises(FileNotFoundError):
+        backups.restore_snapshot("20200101-000000")
@@ -0,0 +1,50 @@
+"""
+Date Normalization Tests
+utils.dates.iso_date must agree with its SQL twin iso_date_sql
+"""
+import sqlite3
+
+import pytest
+
+from services.database import date_key_sql, iso_date_sql
+from utils.dates import iso_date
+
+SAMPLES = [
+    ("2025-09-05", "2025-09-05"),
+    ("2025/09/05", "2025-09-05"),
+    ("05/09/2025", "2025-09-05"),
+    ("05-09-2025", "2025-09-05"),
+    ("2025-09-05T10:30:00Z", "2025-09-05"),
+    ("05/09/2025 10:30", "2025-09-05"),
+    ("5/9/2025", None),
+    ("غير محدد", None),
+    ("", None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize("value, expected", SAMPLES)
+def test_iso_date(value, expected):
+    assert iso_date(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", SAMPLES)
+def test_matches_sql(value, expected):
+    conn = sqlite3.connect(":memory:")
+    iso, key = conn.execute(
+        f"SELECT {iso_date_sql('?1')}, {date_key_sql('?1')}", (value,)
+    ).fetchone()
+    assert iso == iso_date(value)
+    assert key == (iso_date(value) or "")
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    ("2024-01-01", "2024-12-31", ("2024-01-01", "2024-12-31")),
+    ("01/02/2024", "2024/03/31", ("2024-02-01", "2024-03-31")),
+    ("2024-13-01", "2024-12-31", None),
+    ("2024-02-30", "2024-12-31", None),
+    ("أمس", "2024-12-31", None),
+])
+def test_parse_date_range(start, end, expected):
+    from bot.handlers.export import parse_date_range
+    assert parse_date_range(start, end) == expected
@@ -0,0 +1,138 @@
+"""
+Draft Sweeper Tests
+Expiring abandoned drafts and deleting their messages in batches
+"""
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.methods import DeleteMessages
+
+from bot.draft_sweeper import DELETE_BATCH_SIZE, DraftSweeper, draft_message_ids
+from bot.fsm_storage import SQLiteStorage, TimedMemoryStorage, encode_data
+
+
+class FakeBot:
+    """Records delete_messages calls; raises the queued errors first."""
+    
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+    
+    async def delete_messages(self, chat_id, message_ids):
+        self.calls.append((chat_id, list(message_ids)))
+        if self.errors:
+            raise self.errors.pop(0)
+        return True
+
+
+def key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+def test_draft_message_ids():
+    data = {
+        "message_id": 10, "prompt_message_id": None, "photo_message_id": 9,
+        "confirmation_messages": [11, 12], "related_messages": [13],
+    }
+    # The user's photo stays in the chat
+    assert draft_message_ids(data) == [10, 11, 12, 13]
+    assert draft_message_ids({}) == []
+
+
+def test_sweep_deletes_in_batches():
+    related = list(range(1000, 1000 + 2 * DELETE_BATCH_SIZE + 50))
+    
+    async def scenario():
+        storage = TimedMemoryStorage()
+        await storage.set_data(key(42), {"message_id": 5, "related_messages": related + [5]})
+        await storage.set_data(key(43), {"editing_field": "المورد"})
+        bot = FakeBot()
+        
+        expired = await DraftSweeper(ttl_seconds=-1).run_once(bot, storage)
+        return expired, bot.calls
+    
+    expired, calls = asyncio.run(scenario())
+    
+    assert expired == 2
+    assert [len(ids) for _, ids in calls] == [DELETE_BATCH_SIZE, DELETE_BATCH_SIZE, 51]
+    assert {chat_id for chat_id, _ in calls} == {42}
+    assert sorted(sum((ids for _, ids in calls), [])) == [5] + related
+
+
+def test_sweep_keeps_fresh_drafts():
+    async def scenario():
+        storage = TimedMemoryStorage()
+        await storage.set_data(key(42), {"message_id": 5})
+        bot = FakeBot()
+        
+        expired = await DraftSweeper(ttl_seconds=3600).run_once(bot, storage)
+        return expired, bot.calls, await storage.get_data(key(42))
+    
+    assert asyncio.run(scenario()) == (0, [], {"message_id": 5})
+
+
+def test_sweep_survives_telegram_errors():
+    method = DeleteMessages(chat_id=42, message_ids=[1])
+    related = list(range(1, DELETE_BATCH_SIZE + 2))
+    
+    async def scenario():
+        storage = TimedMemoryStorage()
+        await storage.set_data(key(42), {"related_messages": related})
+        bot = FakeBot(
+            TelegramRetryAfter(method, "Flood control exceeded", retry_after=0),
+            TelegramBadRequest(method, "message can't be deleted"),
+        )
+        
+        expired = await DraftSweeper(ttl_seconds=-1).run_once(bot, storage)
+        return expired, bot.calls
+    
+    expired, calls = asyncio.run(scenario())
+    
+    # The first batch is retried after the flood wait, the failed second batch is skipped
+    assert expired == 1
+    assert [len(ids) for _, ids in calls] == [DELETE_BATCH_SIZE, DELETE_BATCH_SIZE, 1]
+
+
+def test_draft_stats_counters(tmp_path):
+    first = {"message_id": 5, "confirmation_messages": [6, 7]}
+    second = {"editing_field": "المورد"}
+    
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        assert await storage.draft_stats() == (0, 0)
+        
+        await storage.set_data(key(42), first)
+        await storage.set_data(key(43), second)
+        await storage.flush()
+        stats = await storage.draft_stats()
+        
+        await DraftSweeper(ttl_seconds=-1).run_once(FakeBot(), storage)
+        after_sweep = await storage.draft_stats()
+        await storage.close()
+        return stats, after_sweep
+    
+    stats, after_sweep = asyncio.run(scenario())
+    
+    assert stats == (2, len(encode_data(first)) + len(encode_data(second)))
+    assert after_sweep == (0, 0)
+
+
+def test_sweep_of_sqlite_storage_uses_last_change(tmp_path, monkeypatch):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        await storage.set_data(key(42), {"message_id": 5})
+        await storage.flush()
+        sweeper = DraftSweeper(ttl_seconds=60)
+        
+        kept = await sweeper.run_once(FakeBot(), storage)
+        
+        # An hour later the untouched draft is abandoned
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 3600)
+        expired = await sweeper.run_once(FakeBot(), storage)
+        await storage.close()
+        return kept, expired
+    
+    assert asyncio.run(scenario()) == (0, 1)
@@ -0,0 +1,134 @@
+"""
+Duplicate Detection Tests
+The invoice key claimed inside save_invoice and the in-memory filter in front of it
+"""
+import threading
+
+import pytest
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from services.database import DatabaseService, DuplicateInvoiceError
+
+USER_ID = 7
+
+
+def make_invoice(number: str = "INV-001", tax_number: str = "300000000000003", date: str = "2025-09-05") -> InvoiceData:
+    return InvoiceData(
+        supplier_name="مؤسسة التموين", tax_number=tax_number,
+        invoice_number=number, invoice_date=date,
+        items=[InvoiceItem("أرز", 1.0, "كيس", Money(1000), Money(1000))],
+        subtotal=Money(1000), total_amount=Money(1000)
+    )
+
+
+@pytest.fixture
+def db(tmp_path) -> DatabaseService:
+    return DatabaseService(str(tmp_path / "invoices.db"))
+
+
+def stored_keys(db: DatabaseService) -> dict:
+    conn = db.get_connection()
+    try:
+        keys = {}
+        for user_id, tax_key, number_key in conn.execute(
+            "SELECT user_id, tax_key, invoice_key FROM invoice_keys"
+        ):
+            keys.setdefault(user_id, set()).add((tax_key, number_key))
+        return keys
+    finally:
+        conn.close()
+
+
+def test_same_key_is_rejected(db):
+    first = db.save_invoice(USER_ID, make_invoice())
+    version = db.get_data_version(USER_ID)
+    
+    # Same numbers once normalized: case, separators and Arabic-Indic digits
+    with pytest.raises(DuplicateInvoiceError) as error:
+        db.save_invoice(USER_ID, make_invoice("inv ٠٠١", "300-000-000-000-003"))
+    
+    assert error.value.invoice_id == first
+    assert db.get_invoice_count(USER_ID) == 1
+    assert len(db.get_user_items(USER_ID)) == 1
+    assert db.get_data_version(USER_ID) == version
+    assert db.check_duplicate_invoice(USER_ID, "INV/001", "300000000000003")
+
+
+def test_allowed_duplicate_is_saved(db):
+    first = db.save_invoice(USER_ID, make_invoice())
+    second = db.save_invoice(USER_ID, make_invoice(), allow_duplicate=True)
+    
+    assert second != first
+    assert db.get_invoice_count(USER_ID) == 2
+    
+    # The key stays with the first invoice
+    with pytest.raises(DuplicateInvoiceError) as error:
+        db.save_invoice(USER_ID, make_invoice())
+    assert error.value.invoice_id == first
+
+
+def test_keys_are_per_user_and_need_both_numbers(db):
+    db.save_invoice(USER_ID, make_invoice())
+    db.save_invoice(USER_ID + 1, make_invoice())
+    db.save_invoice(USER_ID, make_invoice(number=""))
+    db.save_invoice(USER_ID, make_invoice(number=""))
+    db.save_invoice(USER_ID, make_invoice(tax_number="غير محدد"))
+    
+    assert db.get_invoice_count(USER_ID) == 4
+    assert not db.check_duplicate_invoice(USER_ID, "", "300000000000003")
+    assert not db.check_duplicate_invoice(USER_ID, "INV-002", "300000000000003")
+
+
+def test_filter_matches_table_after_restart(db):
+    db.save_invoice(USER_ID, make_invoice())
+    db.save_invoice(USER_ID, make_invoice("INV-002"))
+    db.save_invoice(USER_ID + 1, make_invoice("INV-003"))
+    
+    restarted = DatabaseService(db.db_path)
+    
+    assert restarted._known_keys == stored_keys(db) == db._known_keys
+    assert restarted.check_duplicate_invoice(USER_ID, "INV-002", "300000000000003")
+    with pytest.raises(DuplicateInvoiceError):
+        restarted.save_invoice(USER_ID + 1, make_invoice("INV-003"))
+
+
+def test_deleted_invoice_frees_its_key(db):
+    invoice_id = db.save_invoice(USER_ID, make_invoice())
+    conn = db.get_connection()
+    conn.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
+    conn.commit()
+    conn.close()
+    
+    # The filter still holds the key; the table has the final say
+    assert not db.check_duplicate_invoice(USER_ID, "INV-001", "300000000000003")
+    db.save_invoice(USER_ID, make_invoice())
+
+
+def test_archived_invoice_keeps_its_key(db):
+    db.save_invoice(USER_ID, make_invoice(date="2020-01-01"))
+    assert db.archive_old_invoices("2025-01-01") == 1
+    
+    with pytest.raises(DuplicateInvoiceError):
+        db.save_invoice(USER_ID, make_invoice(date="2020-01-01"))
+
+
+def test_concurrent_saves_claim_the_key_once(db):
+    results = []
+    
+    def save():
+        try:
+            results.append(db.save_invoice(USER_ID, make_invoice()))
+        except DuplicateInvoiceError as e:
+            results.append(e)
+    
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    saved = [result for result in results if isinstance(result, int)]
+    assert len(saved) == 1
+    assert all(result.invoice_id == saved[0] for result in results if not isinstance(result, int))
+    assert db.get_invoice_count(USER_ID) == 1
@@ -0,0 +1,191 @@
+"""
+Export Delivery Tests
+Reports cut into Telegram-sized parts while the rows stream
+"""
+import asyncio
+import csv
+import gzip
+import io
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import bot.export_delivery as export_delivery
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from services.database import DatabaseService
+from services.export_cache import ExportCache
+from services.storage.sqlite import SQLiteInvoiceRepository
+
+USER_ID = 5
+INVOICE_COUNT = 120
+
+
+class FakeTarget:
+    """Message that records the documents answered to it."""
+    
+    def __init__(self):
+        self.sent = []
+    
+    async def answer_document(self, document, caption):
+        document.file.seek(0)
+        data = document.file.read()
+        with gzip.open(io.BytesIO(data), "rt", encoding="utf-8", newline="") as text:
+            rows = list(csv.DictReader(text))
+        self.sent.append(SimpleNamespace(filename=document.filename, caption=caption, size=len(data), rows=rows))
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"file{len(self.sent)}"))
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory) -> DatabaseService:
+    """Database with INVOICE_COUNT invoices, a few of them undated."""
+    db = DatabaseService(str(tmp_path_factory.mktemp("export") / "invoices.db"))
+    repo = SQLiteInvoiceRepository(db)
+    
+    async def fill():
+        for i in range(INVOICE_COUNT):
+            # Random supplier names keep the gzip output from shrinking to nothing
+            supplier = random.Random(i).randbytes(8).hex()
+            date = "" if i % 25 == 0 else f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}"
+            await repo.save_invoice(USER_ID, InvoiceData(
+                supplier_name=supplier, tax_number="300000000000003",
+                invoice_number=f"INV-{i}", invoice_date=date,
+                items=[InvoiceItem("أرز", 1.0, "كيس", Money(100), Money(100))],
+                subtotal=Money(100), total_amount=Money(115)
+            ))
+    
+    asyncio.run(fill())
+    return db
+
+
+@pytest.fixture
+def repository(database, monkeypatch):
+    repo = SQLiteInvoiceRepository(database)
+    monkeypatch.setattr(export_delivery, "repository", repo)
+    monkeypatch.setattr(export_delivery, "export_cache", ExportCache())
+    return repo
+
+
+def send(monkeypatch, limit: int) -> FakeTarget:
+    """Send the invoices CSV export with parts limited to limit bytes."""
+    monkeypatch.setattr(export_delivery, "part_limit_bytes", lambda: limit)
+    target = FakeTarget()
+    
+    async def scenario():
+        return await export_delivery.send_export(
+            target, USER_ID, "invoices", "csv", "invoices.csv",
+            caption=lambda count: f"count {count}"
+        )
+    
+    assert asyncio.run(scenario()) == INVOICE_COUNT
+    return target
+
+
+def sent_numbers(target: FakeTarget) -> list:
+    return [row["invoice_number"] for document in target.sent for row in document.rows]
+
+
+def test_small_report_sent_whole(repository, monkeypatch):
+    target = send(monkeypatch, 10 * 1024 * 1024)
+    
+    assert len(target.sent) == 1
+    document = target.sent[0]
+    assert document.filename == "invoices.csv"
+    assert document.caption == f"count {INVOICE_COUNT}"
+    assert len(document.rows) == INVOICE_COUNT
+
+
+def test_parts_cover_every_row_once(repository, monkeypatch):
+    limit = 1200
+    target = send(monkeypatch, limit)
+    
+    assert len(target.sent) > 2
+    numbers = sent_numbers(target)
+    assert len(numbers) == INVOICE_COUNT
+    assert set(numbers) == {f"INV-{i}" for i in range(INVOICE_COUNT)}
+    
+    for number, document in enumerate(target.sent, 1):
+        assert document.size <= limit
+        assert document.filename == f"invoices_part{number}.csv"
+        assert document.caption.startswith(f"count {len(document.rows)}\n\n📎 الجزء {number}: ")
+    # Undated invoices come last
+    assert target.sent[-1].caption.endswith("فواتير بدون تاريخ")
+
+
+def test_oversized_part_is_read_again_in_pieces(repository, monkeypatch):
+    # Estimate far too low: the first part is the whole report and comes out too large
+    monkeypatch.setitem(export_delivery.ROW_BYTES_ESTIMATE, "csv", 1)
+    calls = []
+    get_page = repository.get_page
+    
+    async def counting_get_page(*args):
+        calls.append(args)
+        return await get_page(*args)
+    
+    monkeypatch.setattr(repository, "get_page", counting_get_page)
+    limit = 1200
+    target = send(monkeypatch, limit)
+    
+    assert len(target.sent) > 2
+    assert all(document.size <= limit for document in target.sent)
+    numbers = sent_numbers(target)
+    assert sorted(numbers) == sorted(f"INV-{i}" for i in range(INVOICE_COUNT))
+    assert len(numbers) == len(set(numbers))
+    # Pieces start after the last sent row, not at the top of the report
+    assert any(call[4] is not None for call in calls)
+
+
+def test_cancel_stops_between_pages(repository):
+    progress = export_delivery.ExportProgress(cancelled=True)
+    
+    async def scenario():
+        await export_delivery.send_export(
+            FakeTarget(), USER_ID, "invoices", "csv", "invoices.csv",
+            caption=str, progress=progress
+        )
+    
+    with pytest.raises(export_delivery.ExportCancelled):
+        asyncio.run(scenario())
+
+
+class DroppingTarget(FakeTarget):
+    """Target whose connection drops before the given document."""
+    
+    def __init__(self, fail_at: int):
+        super().__init__()
+        self.fail_at = fail_at
+    
+    async def answer_document(self, document, caption):
+        if len(self.sent) + 1 == self.fail_at:
+            raise RuntimeError("Connection reset")
+        if isinstance(document, str):
+            self.sent.append(SimpleNamespace(file_id=document, caption=caption))
+            return SimpleNamespace(document=SimpleNamespace(file_id=document))
+        return await super().answer_document(document, caption)
+
+
+def test_interrupted_resend_continues_after_delivered_parts(repository, monkeypatch):
+    first = send(monkeypatch, 1200)
+    file_ids = [f"file{number}" for number in range(1, len(first.sent) + 1)]
+    
+    async def resend(target):
+        return await export_delivery.send_export(
+            target, USER_ID, "invoices", "csv", "invoices.csv",
+            caption=lambda count: f"count {count}"
+        )
+    
+    dropped = DroppingTarget(fail_at=3)
+    with pytest.raises(RuntimeError):
+        asyncio.run(resend(dropped))
+    assert [document.file_id for document in dropped.sent] == file_ids[:2]
+    
+    retry = DroppingTarget(fail_at=0)
+    assert asyncio.run(resend(retry)) == INVOICE_COUNT
+    assert [document.file_id for document in retry.sent] == file_ids[2:]
+    assert [document.caption for document in retry.sent] == [document.caption for document in first.sent[2:]]
+    
+    # Once complete, the next request gets the whole report again
+    again = DroppingTarget(fail_at=0)
+    asyncio.run(resend(again))
+    assert [document.file_id for document in again.sent] == file_ids
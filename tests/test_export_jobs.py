@@ -0,0 +1,40 @@
+"""
+Export Job Tests
+The progress ticker of a running export
+"""
+import asyncio
+
+from bot.export_jobs import ExportJob, ExportJobManager, ExportRequest
+
+
+class FlakyStatus:
+    """Status message whose first edit fails like a flood-control reply."""
+    
+    def __init__(self):
+        self.texts = []
+        self.failed = False
+    
+    async def edit_text(self, text, reply_markup=None):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("Flood control exceeded")
+        self.texts.append(text)
+
+
+def test_progress_survives_edit_errors():
+    async def scenario():
+        manager = ExportJobManager(progress_interval=0.01)
+        request = ExportRequest("invoices", "xlsx", "invoices.xlsx", str, "")
+        job = ExportJob("job1", 1, request, status=FlakyStatus())
+        
+        ticker = asyncio.create_task(manager._report_progress(job))
+        await asyncio.sleep(0.05)
+        job.progress.rows = 10
+        await asyncio.sleep(0.05)
+        assert not ticker.done()
+        ticker.cancel()
+        return job.status.texts
+    
+    texts = asyncio.run(scenario())
+    assert len(texts) == 2
+    assert "10" in texts[-1]
@@ -0,0 +1,268 @@
+"""
+FSM Storage Tests
+The binary encoding of conversation data and the write-behind SQLite storage
+"""
+import asyncio
+import sqlite3
+import struct
+import time
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.fsm_storage import DATA_FORMAT_VERSION, SQLiteStorage, TimedMemoryStorage, decode_data, encode_data
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=43, user_id=43)
+
+
+def make_invoice() -> InvoiceData:
+    return InvoiceData(
+        supplier_name="مؤسسة التموين", tax_number="300000000000003",
+        invoice_number="INV-7", invoice_date="2025-09-05",
+        items=[InvoiceItem("أرز بسمتي", 2.5, "كيس", Money(1250), Money(3125))],
+        subtotal=Money(3125), tax_rate=15.0, tax_amount=Money(469), total_amount=Money(3594)
+    )
+
+
+def draft_data() -> dict:
+    return {
+        "invoice_data": make_invoice(),
+        "message_id": 17,
+        "confirmation_messages": [18, 19],
+        "editing_field": "المورد",
+        "is_duplicate": False,
+        "note": None,
+    }
+
+
+def test_codec_round_trip():
+    data = draft_data()
+    decoded = decode_data(encode_data(data))
+    
+    assert decoded == data
+    assert isinstance(decoded["invoice_data"], InvoiceData)
+    assert isinstance(decoded["invoice_data"].total_amount, Money)
+    assert decode_data(encode_data({})) == {}
+
+
+def test_codec_rejects_unknown_values():
+    with pytest.raises(TypeError):
+        encode_data({"when": object()})
+
+
+@pytest.mark.parametrize("blob", [
+    b"",
+    struct.pack("<BH", DATA_FORMAT_VERSION + 1, 0),
+    encode_data(draft_data())[:-5],
+    struct.pack("<BH", DATA_FORMAT_VERSION, 1) + struct.pack("<HBI", 1, 9, 2) + b"k{}",
+])
+def test_codec_rejects_corrupt_data(blob):
+    with pytest.raises(ValueError):
+        decode_data(blob)
+
+
+def stored_rows(path) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT key, version FROM fsm_records").fetchall())
+    finally:
+        conn.close()
+
+
+def test_writes_behind_until_flush(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        storage = SQLiteStorage(path, flush_interval=60)
+        await storage.set_state(KEY, "InvoiceStates:waiting_confirmation")
+        for message_id in range(5):
+            await storage.update_data(KEY, {"message_id": message_id})
+        assert stored_rows(path) == {}
+        
+        await storage.flush()
+        assert list(stored_rows(path).values()) == [1]
+        
+        # Clearing a key removes its row on the next write
+        await storage.set_state(OTHER_KEY, "InvoiceStates:editing")
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+        assert len(stored_rows(path)) == 1
+        
+        reopened = SQLiteStorage(path)
+        assert await reopened.get_state(OTHER_KEY) == "InvoiceStates:editing"
+        assert await reopened.get_data(KEY) == {}
+        await reopened.close()
+    
+    asyncio.run(scenario())
+
+
+def test_invoice_draft_survives_restart(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        storage = SQLiteStorage(path)
+        await storage.set_data(KEY, draft_data())
+        await storage.close()
+        
+        reopened = SQLiteStorage(path)
+        data = await reopened.get_data(KEY)
+        await reopened.close()
+        return data
+    
+    assert asyncio.run(scenario()) == draft_data()
+
+
+def test_clean_keys_served_from_memory(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        storage = SQLiteStorage(path, recheck_interval=60)
+        await storage.set_data(KEY, {"message_id": 1})
+        await storage.flush()
+        
+        reads = []
+        read_version = storage._read_version
+        storage._read_version = lambda name: reads.append(name) or read_version(name)
+        for _ in range(10):
+            await storage.get_data(KEY)
+        await storage.close()
+        return reads
+    
+    assert asyncio.run(scenario()) == []
+
+
+def test_other_process_changes_seen_after_recheck(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        first = SQLiteStorage(path, recheck_interval=0.05)
+        second = SQLiteStorage(path)
+        await first.set_data(KEY, {"step": 1})
+        await first.flush()
+        assert await second.get_data(KEY) == {"step": 1}
+        
+        await second.set_data(KEY, {"step": 2})
+        await second.flush()
+        # Trusted from memory within the interval, re-read after it
+        assert await first.get_data(KEY) == {"step": 1}
+        await asyncio.sleep(0.06)
+        assert await first.get_data(KEY) == {"step": 2}
+        
+        await first.close()
+        await second.close()
+    
+    asyncio.run(scenario())
+
+
+def test_expire_returns_stale_drafts(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        storage = SQLiteStorage(path)
+        await storage.set_data(KEY, draft_data())
+        await storage.flush()
+        cutoff = time.time() + 1
+        await storage.set_data(OTHER_KEY, {"message_id": 5})
+        await storage.flush()
+        
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE fsm_records SET updated_at = updated_at + 10 WHERE key LIKE '1:43:%'")
+        conn.commit()
+        conn.close()
+        
+        expired = await storage.expire(cutoff)
+        assert [(state.chat_id, state.data) for state in expired] == [(42, draft_data())]
+        assert await storage.get_data(KEY) == {}
+        assert await storage.get_data(OTHER_KEY) == {"message_id": 5}
+        await storage.close()
+    
+    asyncio.run(scenario())
+
+
+class EditAfterSelect:
+    """Connection proxy: another process edits the draft right after the sweep selects it."""
+    
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+    
+    def execute(self, sql, *args):
+        cursor = self.conn.execute(sql, *args)
+        if not sql.startswith("SELECT key, data, version"):
+            return cursor
+        
+        rows = cursor.fetchall()
+        other = sqlite3.connect(self.path)
+        other.execute("UPDATE fsm_records SET version = version + 1")
+        other.commit()
+        other.close()
+        return type("Rows", (), {"fetchall": lambda _: rows})()
+    
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_expire_keeps_concurrently_edited_draft(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        storage = SQLiteStorage(path)
+        await storage.set_data(KEY, draft_data())
+        await storage.flush()
+        
+        storage._conn = EditAfterSelect(storage._conn, path)
+        assert await storage.expire(time.time() + 1) == []
+        storage._conn = storage._conn.conn
+        
+        assert stored_rows(path) != {}
+        await storage.close()
+    
+    asyncio.run(scenario())
+
+
+def test_expire_keeps_draft_edited_in_memory(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    
+    async def scenario():
+        storage = SQLiteStorage(path, flush_interval=60)
+        await storage.set_data(KEY, draft_data())
+        await storage.flush()
+        
+        # Edited after expire() flushed but before its rows were deleted
+        expire_rows = storage._expire
+        
+        def edit_then_expire(older_than):
+            rows = expire_rows(older_than)
+            storage._cache[storage._key(KEY)].dirty = True
+            return rows
+        
+        storage._expire = edit_then_expire
+        assert await storage.expire(time.time() + 1) == []
+        await storage.close()
+        
+        reopened = SQLiteStorage(path)
+        data = await reopened.get_data(KEY)
+        await reopened.close()
+        return data
+    
+    assert asyncio.run(scenario()) == draft_data()
+
+
+def test_memory_storage_expire_and_stats():
+    async def scenario():
+        storage = TimedMemoryStorage()
+        await storage.set_data(KEY, draft_data())
+        cutoff = time.time() + 1
+        await storage.get_data(OTHER_KEY)  # reads leave an empty record behind
+        
+        assert await storage.draft_stats() == (1, len(encode_data(draft_data())))
+        expired = await storage.expire(cutoff)
+        assert [state.chat_id for state in expired] == [42]
+        assert await storage.draft_stats() == (0, 0)
+        assert storage.storage == {}
+    
+    asyncio.run(scenario())
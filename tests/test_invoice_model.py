@@ -0,0 +1,100 @@
+"""
+Invoice Model Tests
+Round trips of the slotted invoice model through its codecs, pickle and copies
+"""
+import copy
+import pickle
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+
+
+def make_invoice(**overrides) -> InvoiceData:
+    """Small invoice with Arabic text, for round trips."""
+    invoice = InvoiceData(
+        supplier_name="مؤسسة التموين", tax_number="300000000000003",
+        invoice_number="INV-7", invoice_date="2025-09-05",
+        items=[
+            InvoiceItem("أرز بسمتي", 2.5, "كيس", Money(1250), Money(3125)),
+            InvoiceItem("سكر", 1.0, "كجم", Money(400), Money(400)),
+        ],
+        subtotal=Money(3525), discount=Money(25), tax_rate=15.0,
+        tax_amount=Money(525), total_amount=Money(4025),
+        is_valid=True, validation_message="✅"
+    )
+    for name, value in overrides.items():
+        setattr(invoice, name, value)
+    return invoice
+
+
+def with_null_fields() -> InvoiceData:
+    """Invoice as parsed from OCR JSON with null strings (before coercion)."""
+    invoice = make_invoice(supplier_name=None, tax_number=None, invoice_date=None)
+    invoice.items.append(InvoiceItem(None, 1.0, None, Money(100), Money(100)))
+    return invoice
+
+
+@pytest.mark.parametrize("round_trip", [
+    lambda invoice: InvoiceData.from_bytes(invoice.to_bytes()),
+    lambda invoice: pickle.loads(pickle.dumps(invoice)),
+    copy.deepcopy,
+    lambda invoice: InvoiceData.from_dict(invoice.to_dict()),
+])
+def test_round_trip(round_trip):
+    invoice = make_invoice()
+    assert round_trip(invoice) == invoice
+
+
+@pytest.mark.parametrize("round_trip", [
+    lambda invoice: InvoiceData.from_bytes(invoice.to_bytes()),
+    lambda invoice: pickle.loads(pickle.dumps(invoice)),
+    copy.deepcopy,
+    lambda invoice: InvoiceData.from_dict(invoice.to_dict()),
+])
+def test_null_strings_become_empty(round_trip):
+    decoded = round_trip(with_null_fields())
+    assert decoded.supplier_name == ""
+    assert decoded.tax_number == ""
+    assert decoded.invoice_date == ""
+    assert decoded.items[-1].name == ""
+    assert decoded.items[-1].unit == ""
+    assert decoded.items[0] == make_invoice().items[0]
+
+
+def test_copy_is_shallow():
+    invoice = make_invoice()
+    copied = copy.copy(invoice)
+    assert copied == invoice
+    assert copied.items is invoice.items
+
+
+def test_from_dict_accepts_nulls():
+    invoice = InvoiceData.from_dict({
+        "supplier_name": None, "subtotal": None, "tax_rate": None, "items": None,
+    })
+    assert invoice == InvoiceData()
+
+
+def test_render_pool_renders_null_fields():
+    from services.render_pool import _render_invoice
+    
+    # The pool pickles the invoice on its way to the worker
+    invoice = pickle.loads(pickle.dumps(with_null_fields()))
+    with zipfile.ZipFile(BytesIO(_render_invoice(invoice))) as archive:
+        assert archive.testzip() is None
+
+
+@pytest.mark.parametrize("quantity", [float("nan"), float("inf")])
+def test_render_pool_skips_non_finite_numbers(quantity):
+    from openpyxl import load_workbook
+    from services.render_pool import _render_invoice
+    
+    invoice = make_invoice()
+    invoice.items[0].quantity = quantity
+    sheet = load_workbook(BytesIO(_render_invoice(invoice))).active
+    assert sheet["B9"].value is None
+    assert sheet["B10"].value == 1
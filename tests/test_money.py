@@ -0,0 +1,43 @@
+"""
+Money Tests
+Arithmetic rules of the halala-based Money type
+"""
+from decimal import Decimal
+
+import pytest
+
+from models.money import Money, to_riyals
+
+
+def test_adds_money():
+    assert Money(150) + Money(25) == Money(175)
+    assert isinstance(Money(150) - Money(25), Money)
+
+
+@pytest.mark.parametrize("other", [5, 2.5, Decimal("1.5"), True])
+def test_rejects_plain_numbers(other):
+    with pytest.raises(TypeError):
+        Money(100) + other
+    with pytest.raises(TypeError):
+        Money(100) - other
+
+
+def test_rejects_plain_int_on_the_left():
+    # Money subclasses int, so its reflected methods take precedence
+    with pytest.raises(TypeError):
+        5 + Money(100)
+    with pytest.raises(TypeError):
+        5 - Money(100)
+
+
+def test_sum_starts_from_zero():
+    total = sum([Money(100), Money(250)])
+    assert total == Money(350)
+    assert isinstance(total, Money)
+    assert sum([], Money(0)) == Money(0)
+
+
+def test_to_riyals():
+    assert to_riyals(1250) == Decimal("12.50")
+    assert to_riyals(0) == Decimal("0.00")
+    assert to_riyals(None) is None
@@ -0,0 +1,125 @@
+"""
+ZATCA QR Tests
+TLV parsing and the cross-check of OCR results against the QR code
+"""
+import base64
+
+import pytest
+
+from models.invoice import InvoiceData, InvoiceItem
+from models.money import Money
+from services.qr_service import QRService, ZatcaQR, parse_tlv
+
+
+def tlv(*fields) -> str:
+    """Base64 TLV payload of (tag, text) fields."""
+    data = b""
+    for tag, text in fields:
+        value = text.encode("utf-8")
+        data += bytes([tag, len(value)]) + value
+    return base64.b64encode(data).decode("ascii")
+
+
+FIELDS = [
+    (1, "مؤسسة التموين"),
+    (2, "300000000000003"),
+    (3, "2025-09-05T10:30:00Z"),
+    (4, "115.00"),
+    (5, "15.00"),
+]
+
+
+def test_parse_payload():
+    qr = parse_tlv(tlv(*FIELDS))
+    
+    assert qr == ZatcaQR("مؤسسة التموين", "300000000000003", "2025-09-05T10:30:00Z", Money(11500), Money(1500))
+    assert qr.invoice_date == "2025-09-05"
+
+
+def test_parse_long_field():
+    # 70 Arabic letters are 140 UTF-8 bytes: the length byte has its high bit set
+    name = "م" * 70
+    qr = parse_tlv(tlv((1, name), *FIELDS[1:]))
+    
+    assert qr.seller_name == name
+    assert qr.vat_number == "300000000000003"
+    assert qr.total == Money(11500)
+
+
+def test_parse_truncated_payload():
+    data = base64.b64decode(tlv(*FIELDS))
+    
+    assert parse_tlv(base64.b64encode(data[:-3]).decode("ascii")) is None
+
+
+@pytest.mark.parametrize("payload", ["https://example.com/invoice/7", "not base64!", ""])
+def test_parse_not_base64(payload):
+    assert parse_tlv(payload) is None
+
+
+def test_parse_without_totals():
+    assert parse_tlv(tlv(*FIELDS[:3])) is None
+
+
+def make_invoice(**fields) -> InvoiceData:
+    invoice = InvoiceData(
+        supplier_name="", tax_number="300000000000003", invoice_number="INV-7",
+        invoice_date="05/09/2025",
+        items=[
+            InvoiceItem("أرز", 2.0, "كيس", Money(2500), Money(5000)),
+            InvoiceItem("سكر", 1.0, "كجم", Money(5000), Money(5000)),
+        ],
+        subtotal=Money(10000), tax_amount=Money(1500), total_amount=Money(11500)
+    )
+    for name, value in fields.items():
+        setattr(invoice, name, value)
+    return invoice
+
+
+def test_apply_matching_ocr():
+    invoice = make_invoice()
+    notes = QRService().apply(invoice, parse_tlv(tlv(*FIELDS)))
+    
+    assert notes == []
+    assert invoice.supplier_name == "مؤسسة التموين"
+    assert invoice.invoice_date == "2025-09-05"
+
+
+def test_apply_corrects_ocr():
+    invoice = make_invoice(
+        supplier_name="التموين", tax_number="300000000000008",
+        invoice_date="2025-09-06", total_amount=Money(11800)
+    )
+    notes = QRService().apply(invoice, parse_tlv(tlv(*FIELDS)))
+    
+    assert len(notes) == 3
+    assert invoice.supplier_name == "التموين"  # a trade name read by OCR is kept
+    assert invoice.tax_number == "300000000000003"
+    assert invoice.invoice_date == "2025-09-05"
+    assert invoice.total_amount == Money(11500)
+
+
+def test_apply_within_tolerance():
+    invoice = make_invoice(tax_amount=Money(1530))
+    
+    assert QRService().apply(invoice, parse_tlv(tlv(*FIELDS))) == []
+    assert invoice.tax_amount == Money(1500)
+
+
+def test_settles_totals_skips_audit():
+    service = QRService()
+    invoice = make_invoice(subtotal=Money(0))
+    service.apply(invoice, parse_tlv(tlv(*FIELDS)))
+    
+    assert service.settles_totals(invoice)
+    assert invoice.subtotal == Money(10000)
+
+
+def test_settles_totals_needs_audit():
+    service = QRService()
+    invoice = make_invoice()
+    invoice.items.pop()
+    service.apply(invoice, parse_tlv(tlv(*FIELDS)))
+    
+    assert not service.settles_totals(invoice)
+    assert not service.settles_totals(make_invoice(total_amount=Money(0)))
@@ -3,12 +3,16 @@ Auto-Calculation Utility
 Automatically calculates invoice totals
 """
 from models.invoice import InvoiceData
+from models.money import Money
 
 
 def recalculate_invoice(invoice: InvoiceData) -> InvoiceData:
     """
     Recalculate all auto-calculated fields in invoice.
     
+    All amounts are Money (integer halalas); each product is rounded
+    half up once, so sums are exact.
+    
     Auto-calculated fields:
     - item.total = item.quantity * item.unit_price
     - invoice.subtotal = sum of all item totals
@@ -17,19 +21,16 @@ def recalculate_invoice(invoice: InvoiceData) -> InvoiceData:
     """
     # Recalculate each item total
     for item in invoice.items:
-        item.total = round(item.quantity * item.unit_price, 2)
+        item.total = item.unit_price * item.quantity
     
     # Recalculate subtotal
-    invoice.subtotal = round(sum(item.total for item in invoice.items), 2)
+    invoice.subtotal = Money(sum(item.total for item in invoice.items))
     
     # Recalculate tax amount based on tax_rate
     taxable_amount = invoice.subtotal - invoice.discount
-    invoice.tax_amount = round(taxable_amount * invoice.tax_rate / 100, 2)
+    invoice.tax_amount = taxable_amount.percent(invoice.tax_rate)
     
     # Recalculate total amount
-    invoice.total_amount = round(
-        invoice.subtotal - invoice.discount + invoice.tax_amount,
-        2
-    )
+    invoice.total_amount = invoice.subtotal - invoice.discount + invoice.tax_amount
     
     return invoice
@@ -0,0 +1,29 @@
+"""
+Date Utility
+Normalizes the invoice date formats seen on receipts and in OCR output
+"""
+import re
+from typing import Optional
+
+# YYYY-MM-DD / YYYY/MM/DD and DD/MM/YYYY (OCR), optionally followed by a time
+_YEAR_FIRST = re.compile(r"([0-9]{4})[-/]([0-9]{2})[-/]([0-9]{2})")
+_DAY_FIRST = re.compile(r"([0-9]{2})[-/]([0-9]{2})[-/]([0-9]{4})")
+
+
+def iso_date(value: Optional[str]) -> Optional[str]:
+    """
+    Invoice date as YYYY-MM-DD, or None if it is in no known format.
+    
+    Python twin of services.database.iso_date_sql: both must accept
+    the same inputs and give the same results.
+    """
+    if not value:
+        return None
+    match = _YEAR_FIRST.match(value)
+    if match:
+        return "-".join(match.groups())
+    match = _DAY_FIRST.match(value)
+    if match:
+        day, month, year = match.groups()
+        return f"{year}-{month}-{day}"
+    return None
@@ -0,0 +1,53 @@
+"""
+Text Normalization Utility
+Arabic-aware normalization for matching item names and search terms
+"""
+import re
+import unicodedata
+
+# Harakat, tanween, shadda, sukun, superscript alef and Quranic marks
+_DIACRITICS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+_WHITESPACE = re.compile(r"\s+")
+_NON_ALNUM = re.compile(r"[\W_]+")
+
+_CHAR_MAP = str.maketrans({
+    # Alef variants -> bare alef
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0622": "\u0627", "\u0671": "\u0627",
+    # Alef maqsura -> yaa
+    "\u0649": "\u064A",
+    # Taa marbuta -> haa
+    "\u0629": "\u0647",
+    # Arabic-Indic and Eastern Arabic-Indic digits -> ASCII
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+})
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for matching.
+    
+    - Folds presentation forms and case
+    - Strips diacritics and tatweel
+    - Unifies alef / yaa / taa marbuta variants
+    - Converts Arabic-Indic digits to ASCII
+    - Collapses whitespace
+    """
+    if not text:
+        return ""
+    
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    text = _DIACRITICS.sub("", text).replace(_TATWEEL, "")
+    text = text.translate(_CHAR_MAP)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def normalize_identifier(text: str) -> str:
+    """
+    Normalize an invoice or tax number for exact matching.
+    
+    Applies normalize_text and drops spaces, dashes, slashes and other
+    separators, so "INV-٠٠١" and "inv 001" compare equal.
+    """
+    return _NON_ALNUM.sub("", normalize_text(text))